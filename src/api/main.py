@@ -1,13 +1,35 @@
 """Module provides inference API"""
 
-from fastapi import FastAPI
-from src.utils.functions import load_params, get_abs_path, load_pickle
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from src.utils.config import get_config, reload_config
+from src.utils.functions import (
+    get_project_dir,
+    load_params,
+    setup_logging,
+)
+from src.utils.logs import log_context
+from src.utils.profiling import get_profile_path, profiled
+from src.utils.threads import apply_thread_limits, get_thread_budget
 from src.data.functions import clean_features
-from src.features.functions import restore_target
-from typing import List, Any
-from pydantic import BaseModel, validator
+from src.features.comparables import ComparablesIndex
+from src.features.drift import DriftMonitor, FeatureProfile
+from src.features.encoder import ColumnEncoder
+from src.models.functions import predict_grid, predict_prices
+from src.models.jobs import JobRunner, JobStore
+from src.models.store import get_serving_paths
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
+from pydantic import BaseModel, ValidationError, validator
 import pandas as pd
+import numpy as np
 import lightgbm as lgb
+import itertools
+import os
+import random
+import threading
+import time
+import uuid
 
 
 class PredictRequest(BaseModel):
@@ -38,6 +60,65 @@ class PredictResponse(BaseModel):
     data: List[float]
 
 
+class JobResponse(BaseModel):
+    """Batch job
+    - id: job id
+    - status: `queued`, `running`, `done` or `failed`
+    - rows: number of objects to predict
+    - rows_done: number of predicted objects
+    - progress: share of predicted objects
+    - error: error of a failed job
+    """
+
+    id: str
+    status: str
+    rows: int
+    rows_done: int
+    progress: float
+    error: Optional[str]
+
+
+class ComparablesResponse(BaseModel):
+    """Comparable listings
+    - data: the nearest training listings for each given object with their
+     price, distance and features, empty for invalid objects
+    """
+
+    data: List[List[Dict[str, Any]]]
+
+
+class WhatIfRequest(BaseModel):
+    """Variations of an object to predict
+    - base: feature values of the object
+    - variations: list of values of each varied feature, all combinations
+     of the values are predicted
+    """
+
+    base: Dict[str, Any]
+    variations: Dict[str, List[Any]]
+
+    # check if each varied feature has values
+    @validator("variations")
+    def check_variations(cls, v):
+        if not v:
+            raise ValueError("At least one feature must be varied")
+        empty = [feature for feature, values in v.items() if not values]
+        if empty:
+            raise ValueError(f"No values are given for {', '.join(empty)}")
+        return v
+
+
+class WhatIfResponse(BaseModel):
+    """Predictions of the variations
+    - columns: varied feature names and `price`
+    - data: values of the varied features and the per night price for each
+     combination, -1 for invalid ones
+    """
+
+    columns: List[str]
+    data: List[List[Any]]
+
+
 PARAMS = load_params()
 
 INFO = {
@@ -48,6 +129,127 @@ INFO = {
 
 app = FastAPI(**INFO)
 
+# the prediction threads of the worker are its share of the cores
+THREAD_BUDGET = get_thread_budget(PARAMS)
+
+
+def load_serving_artifacts(
+    params: dict,
+) -> Tuple[
+    Dict[str, str], lgb.Booster, ColumnEncoder, Optional[ComparablesIndex]
+]:
+    """Loads the model, the encoder and the comparables index, if it is
+    built, right after their paths are verified. They are kept in memory
+    and served until the next reload, so the served artifacts are the
+    verified ones even if the files are replaced later.
+    """
+    paths = get_serving_paths(params)
+    model = lgb.Booster(model_file=paths["model_file"])
+    encoder = ColumnEncoder.load(paths["column_transformer_file"])
+    path = paths["comparables_file"]
+    comparables = ComparablesIndex.load(path) if os.path.exists(path) else None
+    return paths, model, encoder, comparables
+
+
+SERVING_PATHS, MODEL, ENCODER, COMPARABLES = load_serving_artifacts(PARAMS)
+
+logger = setup_logging(logname=__name__, loglevel="INFO", stage="api")
+
+# drift of the served features is monitored when the training features
+# profile is built
+DRIFT_MONITOR = (
+    DriftMonitor(
+        FeatureProfile.load(get_config().feature_profile_path),
+        PARAMS["drift"]["max_unseen"],
+    )
+    if os.path.exists(get_config().feature_profile_path)
+    else None
+)
+
+
+# batch jobs are scored in the background by worker processes with the
+# model loaded at startup
+JOBS_DIR = os.path.join(get_project_dir(), PARAMS["jobs"]["path"])
+JOB_STORE = JobStore(os.path.join(JOBS_DIR, PARAMS["jobs"]["db_file"]))
+JOB_RUNNER = JobRunner(
+    JOB_STORE,
+    SERVING_PATHS["model_file"],
+    SERVING_PATHS["column_transformer_file"],
+    get_config().features,
+    PARAMS["jobs"]["chunk_size"],
+    PARAMS["jobs"]["workers"],
+    PARAMS["jobs"]["nice"],
+    PARAMS["jobs"]["poll_interval"],
+    PARAMS["jobs"]["stale_after"],
+    PARAMS["jobs"]["retain_for"],
+)
+MAX_JOB_BODY_BYTES = int(PARAMS["jobs"]["max_body_mb"] * 2**20)
+
+
+@app.on_event("startup")
+def limit_threads() -> None:
+    """Limits the BLAS and OpenMP thread pools of the worker and of the job
+    runner processes it starts to the thread budget.
+    """
+    apply_thread_limits(THREAD_BUDGET)
+
+
+@app.on_event("startup")
+def start_job_runner() -> None:
+    """Starts scoring the queued jobs in the background."""
+    JOB_RUNNER.start()
+
+
+@app.on_event("shutdown")
+def stop_job_runner() -> None:
+    """Stops scoring the jobs, the running job is queued again."""
+    JOB_RUNNER.stop()
+
+
+# the profiler hook is per thread, so overlapping requests on the event
+# loop would share it, only one request is profiled at a time
+PROFILE_LOCK = threading.Lock()
+
+if PARAMS["profiling"]["api"]:
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Profiles requests with the `X-Profile: 1` header, the `profile=1`
+        query parameter, or sampled with the `api_sample_rate`. The profile
+        covers only the event loop thread, and all its work during the
+        request, also for the other requests handled meanwhile. Requests
+        started while another one is profiled aren't profiled.
+        """
+        if (
+            request.headers.get("x-profile") == "1"
+            or request.query_params.get("profile") == "1"
+            or random.random() < PARAMS["profiling"]["api_sample_rate"]
+        ) and PROFILE_LOCK.acquire(blocking=False):
+            try:
+                with profiled(get_profile_path(PARAMS, "api")):
+                    return await call_next(request)
+            finally:
+                PROFILE_LOCK.release()
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def log_request(request: Request, call_next):
+    """Logs requests with their id, taken from the `X-Request-ID` header or
+    generated. The id is added to all records logged while the request is
+    handled, and returned in the `X-Request-ID` response header.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        start = time.perf_counter()
+        response = await call_next(request)
+        logger.info(
+            f"{request.method} {request.url.path} {response.status_code} "
+            f"{(time.perf_counter() - start) * 1e3:.1f} ms"
+        )
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 
 @app.get("/")
 def get_info() -> dict:
@@ -59,9 +261,53 @@ def get_info() -> dict:
     return INFO
 
 
+@app.post("/reload")
+def reload_params() -> dict:
+    """Reloads params.yaml, which is parsed once per process otherwise, and
+    the current bundle of the artifact store, and returns general
+    information about API. The drift monitor and the profiling settings
+    keep the parameters loaded at startup. Invalid parameters are rejected
+    and the loaded ones are kept.
+    """
+    global PARAMS, SERVING_PATHS, MODEL, ENCODER, COMPARABLES
+    try:
+        reload_config()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    params = load_params()
+    # the globals are swapped only when all the artifacts are loaded
+    artifacts = load_serving_artifacts(params)
+    PARAMS = params
+    SERVING_PATHS, MODEL, ENCODER, COMPARABLES = artifacts
+    INFO.update(
+        title=PARAMS["title"],
+        description=PARAMS["description"],
+        version=PARAMS["version"],
+    )
+    return INFO
+
+
+@app.get("/drift")
+def get_drift() -> dict:
+    """Returns drift scores of the served features against the training
+    features:
+    - rows: number of monitored valid rows
+    - features: PSI per feature, and the share and the most frequent names
+      of unseen categories for categorical features
+    """
+    if DRIFT_MONITOR is None:
+        raise HTTPException(
+            status_code=404, detail="Feature profile isn't built"
+        )
+    return DRIFT_MONITOR.scores()
+
+
 @app.post("/predict", response_model=PredictResponse)
-async def make_predictions(payload: PredictRequest):
-    """Predicts per night price for Airbnb apartment for given objects
+async def make_predictions(
+    payload: PredictRequest, background_tasks: BackgroundTasks
+):
+    """Predicts per night price for Airbnb apartment for given objects.
+    The valid features update the drift monitor after the response is sent.
 
     Params:
         PredictRequest - list of object features to predict,
@@ -71,34 +317,261 @@ async def make_predictions(payload: PredictRequest):
         PredictResponse - list of predictions
     """
 
-    model_path = get_abs_path(
-        PARAMS["model"]["path"],
-        PARAMS["model"]["model_file"],
+    config = get_config()
+    dataset = clean_features(
+        pd.DataFrame(payload.data[1:], columns=payload.data[0])
     )
-    column_transformer_path = get_abs_path(
-        PARAMS["model"]["path"],
-        PARAMS["model"]["column_transformer_file"],
+
+    valid_features = dataset[dataset.is_valid]
+    logger.debug(
+        f"Predicting {valid_features.shape[0]} valid of "
+        f"{dataset.shape[0]} rows"
+    )
+    if DRIFT_MONITOR is not None and valid_features.shape[0]:
+        background_tasks.add_task(DRIFT_MONITOR.update, valid_features)
+    predictions = predict_prices(
+        MODEL,
+        ENCODER,
+        dataset,
+        config.features,
+        THREAD_BUDGET.predict_threads,
     )
 
-    model = lgb.Booster(model_file=model_path)
-    column_transformer = load_pickle(column_transformer_path)
+    return PredictResponse(data=predictions.tolist())
 
-    dataset = clean_features(
-        pd.DataFrame(payload.data[1:], columns=payload.data[0])
+
+@app.post("/predict/whatif", response_model=WhatIfResponse)
+async def make_whatif_predictions(payload: WhatIfRequest):
+    """Predicts per night price for all combinations of the variations of
+    an object in one batch
+
+    Params:
+        WhatIfRequest - features of the object and values of the varied
+            features, the number of combinations is limited by
+            `whatif.max_grid_size` of params.yaml
+
+    Returns:
+        WhatIfResponse - table of the combinations and their predictions
+    """
+
+    config = get_config()
+    unknown = set(payload.variations) - set(config.features)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown varied features {', '.join(sorted(unknown))}",
+        )
+    missing = (
+        set(config.features) - set(payload.base) - set(payload.variations)
     )
+    if missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Missing base features {', '.join(sorted(missing))}",
+        )
+    grid_size = int(np.prod([len(_) for _ in payload.variations.values()]))
+    if grid_size > PARAMS["whatif"]["max_grid_size"]:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{grid_size} combinations exceed the limit of "
+            f"{PARAMS['whatif']['max_grid_size']}",
+        )
 
-    valid_features = dataset[dataset.is_valid]
-    if valid_features.shape[0]:
-        features = column_transformer.transform(valid_features)
-        predictions = model.predict(features)
-        predictions = restore_target(predictions)
-        dataset = dataset.join(
-            pd.DataFrame(
-                {"predictions": predictions}, index=valid_features.index
+    predictions = predict_grid(
+        MODEL,
+        ENCODER,
+        payload.base,
+        payload.variations,
+        config.features,
+        THREAD_BUDGET.predict_threads,
+    )
+
+    return WhatIfResponse(
+        columns=list(payload.variations) + ["price"],
+        data=[
+            list(values) + [price]
+            for values, price in zip(
+                itertools.product(*payload.variations.values()),
+                predictions.tolist(),
             )
+        ],
+    )
+
+
+def get_job_response(job: dict) -> JobResponse:
+    """Returns the job status from the job store record."""
+    return JobResponse(
+        id=job["id"],
+        status=job["status"],
+        rows=job["n_rows"],
+        rows_done=job["rows_done"],
+        progress=job["rows_done"] / job["n_rows"] if job["n_rows"] else 1.0,
+        error=job["error"],
+    )
+
+
+async def iter_body(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    """Streams the request body, and raises 413 HTTPException when it
+    exceeds the size limit.
+    """
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(
+            status_code=413, detail=f"Body exceeds {max_bytes} bytes"
+        )
+    n_bytes = 0
+    async for chunk in request.stream():
+        n_bytes += len(chunk)
+        if n_bytes > max_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"Body exceeds {max_bytes} bytes"
+            )
+        yield chunk
+
+
+def count_job_rows(input_path: str, features: List[str]) -> int:
+    """Checks that the job input file has the features and returns its
+    number of rows.
+    """
+    columns = pd.read_csv(input_path, nrows=0).columns
+    missing = set(features) - set(columns)
+    if missing:
+        raise ValueError(f"Missing features {', '.join(sorted(missing))}")
+    with open(input_path, "rb") as f:
+        # the header is the only line without a row
+        return sum(1 for _ in f) - 1
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: Request):
+    """Submits a batch job to predict per night price for Airbnb apartment
+    for given objects in the background. The objects are sent as a CSV
+    file with the feature columns in the request body, or as
+    a PredictRequest JSON body. The body is streamed to the job input file,
+    and is limited by `jobs.max_body_mb` of params.yaml. The files and the
+    job store are written in a thread pool, so the event loop isn't
+    blocked.
+
+    Returns:
+        JobResponse - the queued job with its id
+    """
+
+    config = get_config()
+    job_id = uuid.uuid4().hex
+    input_path = os.path.join(JOBS_DIR, f"{job_id}.csv")
+    output_path = os.path.join(JOBS_DIR, f"{job_id}.predictions.csv")
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        body = b"".join(
+            [_ async for _ in iter_body(request, MAX_JOB_BODY_BYTES)]
+        )
+        try:
+            payload = PredictRequest.parse_raw(body)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors())
+        await run_in_threadpool(
+            pd.DataFrame(payload.data[1:], columns=payload.data[0]).to_csv,
+            input_path,
+            index=False,
         )
-        dataset.predictions.fillna(-1.0, inplace=True)
     else:
-        dataset["predictions"] = -1.0
+        try:
+            with open(input_path, "wb") as f:
+                async for chunk in iter_body(request, MAX_JOB_BODY_BYTES):
+                    await run_in_threadpool(f.write, chunk)
+        except Exception:
+            # a partial body isn't kept, when it's too large or cut off
+            os.remove(input_path)
+            raise
+
+    try:
+        n_rows = await run_in_threadpool(
+            count_job_rows, input_path, config.features
+        )
+    except (ValueError, pd.errors.ParserError) as e:
+        os.remove(input_path)
+        raise HTTPException(status_code=422, detail=str(e))
+
+    job = await run_in_threadpool(
+        JOB_STORE.create, job_id, input_path, output_path, n_rows
+    )
+    JOB_RUNNER.notify()
+    logger.info(f"Submitted job {job_id} with {n_rows} rows")
+    return get_job_response(job)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    """Returns the status and the progress of a batch job."""
+    job = JOB_STORE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return get_job_response(job)
+
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """Returns the CSV file of predictions of a done batch job, in the
+    order of the input objects, -1 for invalid ones.
+    """
+    job = JOB_STORE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(
+        job["output_path"],
+        media_type="text/csv",
+        filename=f"{job_id}.csv",
+    )
+
+
+@app.post("/comparables", response_model=ComparablesResponse)
+async def find_comparables(
+    payload: PredictRequest,
+    k: Optional[int] = Query(None, ge=1),
+):
+    """Finds the k training listings nearest to each given object, in one
+    lookup for all the objects
+
+    Params:
+        PredictRequest - list of object features,
+            first element shall be feature names
+        k - number of listings per object, defaults to `comparables.k` and
+            is limited by `comparables.max_k` of params.yaml
+
+    Returns:
+        ComparablesResponse - list of comparable listings per object
+    """
+
+    if COMPARABLES is None:
+        raise HTTPException(
+            status_code=404, detail="Comparables index isn't built"
+        )
+    k = k or PARAMS["comparables"]["k"]
+    if k > PARAMS["comparables"]["max_k"]:
+        raise HTTPException(
+            status_code=422,
+            detail=f"k must not exceed {PARAMS['comparables']['max_k']}",
+        )
+
+    dataset = clean_features(
+        pd.DataFrame(payload.data[1:], columns=payload.data[0])
+    )
+    valid = dataset["is_valid"].to_numpy(dtype=bool)
+
+    data: List[List[Dict[str, Any]]] = [[] for _ in range(dataset.shape[0])]
+    if valid.any():
+        distances, indices = COMPARABLES.query(
+            ENCODER.transform(dataset[valid]), k
+        )
+        listings = COMPARABLES.listings.iloc[indices.ravel()].assign(
+            price=COMPARABLES.prices[indices.ravel()],
+            distance=distances.ravel(),
+        )
+        records = listings.to_dict("records")
+        n_found = indices.shape[1]
+        for i, row in enumerate(np.flatnonzero(valid)):
+            data[row] = records[i * n_found : (i + 1) * n_found]  # noqa: E203
 
-    return PredictResponse(data=dataset.predictions.tolist())
+    return ComparablesResponse(data=data)
@@ -0,0 +1,50 @@
+"""
+This module provides a command-line interface for serving the inference
+API with the thread budget of the `threads` section of params.yaml.
+
+The API runs in one uvicorn worker process per budgeted worker, one per
+available core by default. The BLAS and OpenMP thread limits are set
+before the workers start, so they apply to the libraries the workers load,
+and each worker predicts with its share of the cores.
+
+Usage:
+    $ python serve.py
+    $ python serve.py --host 0.0.0.0 --port 8000
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import load_params, setup_logging
+from src.utils.threads import apply_thread_limits, get_thread_budget
+import logging
+import uvicorn
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+def main(host: str, port: int) -> None:
+    """
+    Serves the API with the budgeted number of workers.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    budget = get_thread_budget(load_params())
+    apply_thread_limits(budget)
+    logger.info(
+        f"Serve the API with {budget.workers} workers x "
+        f"{budget.predict_threads} prediction threads "
+        f"on {budget.cpus} available cores"
+    )
+    uvicorn.run(
+        "src.api.main:app", host=host, port=port, workers=budget.workers
+    )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
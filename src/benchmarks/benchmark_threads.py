@@ -0,0 +1,207 @@
+"""
+This module provides a command-line interface for benchmarking the
+throughput and the tail latency of the model prediction with different
+allocations of the cores to worker processes and their threads.
+
+Each allocation runs `workers` processes, like the API workers, which load
+the model and predict the same batch of transformed features with
+`predict_threads` LightGBM threads, for `requests` calls each, all at the
+same time. The batches are synthetic raw listings sampled from the raw test
+dataset, cleaned and transformed as in the API. The throughput in rows per
+second over all the workers and the median and p99 latency of the calls
+are logged and saved to a CSV file in the report path, along with the
+threads per available core, which is above 1 for oversubscribed
+allocations.
+
+The allocations, the batch sizes and the number of calls are set in the
+`threads.benchmark` section of params.yaml.
+
+Usage:
+    $ python benchmark_threads.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.config import get_config
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.utils.threads import (
+    apply_thread_limits,
+    get_available_cpus,
+    get_thread_budget,
+)
+from src.benchmarks.run_benchmarks import make_raw_batch
+from src.data.functions import clean_features
+from src.features.encoder import ColumnEncoder
+from multiprocessing.synchronize import Barrier
+import itertools
+import logging
+import multiprocessing
+import time
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+
+def _run_worker(
+    model_path: str,
+    features: np.ndarray,
+    num_threads: int,
+    requests: int,
+    barrier: Barrier,
+    results: multiprocessing.Queue,
+) -> None:
+    """
+    Predicts the features `requests` times after all the workers are ready
+    and puts the start and end times and the latencies to the results.
+    """
+
+    model = lgb.Booster(model_file=model_path)
+    model.predict(features, num_threads=num_threads)
+    barrier.wait()
+
+    # perf_counter is a system-wide monotonic clock on Linux, so the times
+    # of the workers are comparable
+    start = time.perf_counter()
+    latencies = []
+    for _ in range(requests):
+        call_start = time.perf_counter()
+        model.predict(features, num_threads=num_threads)
+        latencies.append(time.perf_counter() - call_start)
+    results.put((start, time.perf_counter(), latencies))
+
+
+def run_allocation(
+    model_path: str,
+    features: np.ndarray,
+    workers: int,
+    num_threads: int,
+    requests: int,
+) -> dict:
+    """
+    Runs concurrent predictions in worker processes.
+
+    Params:
+        model_path: str
+            The path to the model file.
+        features: numpy.ndarray
+            The batch of transformed features in the model order.
+        workers: int
+            The number of worker processes.
+        num_threads: int
+            The number of prediction threads per worker.
+        requests: int
+            The number of prediction calls per worker.
+
+    Returns:
+        dict
+            The throughput in rows per second, and the median and p99
+            latency of the calls in milliseconds.
+    """
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_run_worker,
+            args=(
+                model_path,
+                features,
+                num_threads,
+                requests,
+                barrier,
+                results,
+            ),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    elapsed = max(_[1] for _ in outputs) - min(_[0] for _ in outputs)
+    latencies = np.concatenate([_[2] for _ in outputs])
+    return {
+        "rows_per_sec": workers * requests * features.shape[0] / elapsed,
+        "median_ms": np.median(latencies) * 1e3,
+        "p99_ms": np.percentile(latencies, 99) * 1e3,
+    }
+
+
+@click.command()
+def main() -> None:
+    """
+    Runs the prediction benchmark for the allocations of the cores and saves
+    the results.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    config = get_config()
+    settings = params["threads"]["benchmark"]
+    cpus = get_available_cpus()
+    apply_thread_limits(get_thread_budget(params))
+    logger.info(f"Benchmark thread allocations on {cpus} available cores")
+
+    raw_data = pd.read_csv(
+        get_abs_path(
+            params["data"]["raw_data_path"], params["data"]["test_data_file"]
+        )
+    )
+    encoder = ColumnEncoder.load(config.column_transformer_path)
+
+    results = []
+    for batch_size in settings["batch_sizes"]:
+        dataset = clean_features(
+            make_raw_batch(raw_data, batch_size, params["random_seed"])[
+                config.features
+            ]
+        )
+        features = pd.DataFrame(
+            encoder.transform(dataset), columns=encoder.feature_names_out
+        )[config.features].to_numpy()
+        for workers, num_threads in itertools.product(
+            settings["workers"], settings["predict_threads"]
+        ):
+            result = {
+                "batch_size": batch_size,
+                "workers": workers,
+                "predict_threads": num_threads,
+                "threads_per_core": workers * num_threads / cpus,
+                **run_allocation(
+                    config.model_path,
+                    features,
+                    workers,
+                    num_threads,
+                    settings["requests"],
+                ),
+            }
+            results.append(result)
+            logger.info(
+                f"batch {batch_size:>6}, {workers} workers x "
+                f"{num_threads} threads: "
+                f"{result['rows_per_sec']:>10.0f} rows/s, "
+                f"median {result['median_ms']:>8.3f} ms, "
+                f"p99 {result['p99_ms']:>8.3f} ms"
+            )
+
+    path = get_abs_path(
+        params["model"]["report_path"], params["threads"]["benchmark_file"]
+    )
+    pd.DataFrame(results).to_csv(path, index=False)
+    logger.info(f"Saved the benchmark results to {path}")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
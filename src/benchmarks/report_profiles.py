@@ -0,0 +1,118 @@
+"""
+This module provides a command-line interface for summarizing profiles
+written by the `--profile` option of the pipeline stages and by the
+profiled API requests.
+
+The profiles are merged, and the top functions are logged with the number
+of calls, the time spent in the function itself and the cumulative time
+with the functions it calls. By default, all the profiles in the profiles
+path of params.yaml are merged; the `--name` option selects the profiles
+of one stage, for example `api` or `train_model`.
+
+Usage:
+    $ python report_profiles.py
+    $ python report_profiles.py --name clean_dataset --sort tottime
+    $ python report_profiles.py reports/profiles/api-20230301-120000-1.prof
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_project_dir,
+    setup_logging,
+)
+from src.utils.profiling import PROFILE_EXTENSION
+from typing import List, Optional, Tuple
+import glob
+import logging
+import os
+import pstats
+import pandas as pd
+
+
+def summarize_profiles(paths: List[str]) -> pd.DataFrame:
+    """
+    Merges profiles and returns the statistics of all profiled functions.
+
+    Params:
+        paths: List[str]
+            The paths to the profile files.
+
+    Returns:
+        pandas.DataFrame
+            The function name, the number of calls, the total time in the
+            function itself and the cumulative time in seconds per function.
+    """
+
+    stats = pstats.Stats(*paths)
+    records = []
+    for (filename, line, function), values in stats.stats.items():
+        _, calls, tottime, cumtime, _ = values
+        records.append(
+            {
+                "function": f"{os.path.basename(filename)}:{line}({function})"
+                if line
+                else function,
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+@click.command()
+@click.argument(
+    "paths", nargs=-1, type=click.Path(exists=True, dir_okay=False)
+)
+@click.option("-n", "--name", help="stage name of the profiles to merge")
+@click.option(
+    "-s",
+    "--sort",
+    type=click.Choice(["cumtime", "tottime", "calls"]),
+    default="cumtime",
+    show_default=True,
+    help="column to sort the functions by",
+)
+@click.option("-t", "--top", type=int, help="number of functions to show")
+def main(
+    paths: Tuple[str], name: Optional[str], sort: str, top: Optional[int]
+) -> None:
+    """
+    Logs the top functions of the merged profiles.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    if not paths:
+        directory = os.path.join(
+            get_project_dir(), params["profiling"]["path"]
+        )
+        pattern = f"{name}-*" if name else "*"
+        paths = sorted(
+            glob.glob(os.path.join(directory, pattern + PROFILE_EXTENSION))
+        )
+    if not paths:
+        raise click.ClickException("No profiles found")
+
+    summary = summarize_profiles(list(paths))
+    summary = summary.sort_values(sort, ascending=False).head(
+        top or params["profiling"]["top"]
+    )
+    logger.info(f"Merged {len(paths)} profiles")
+    logger.info(f"{'calls':>10} {'tottime':>10} {'cumtime':>10}  function")
+    for _, row in summary.iterrows():
+        logger.info(
+            f"{row['calls']:>10} {row['tottime']:>10.4f} "
+            f"{row['cumtime']:>10.4f}  {row['function']}"
+        )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
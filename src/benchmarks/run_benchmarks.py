@@ -0,0 +1,429 @@
+"""
+This module provides a command-line interface for benchmarking the hot
+paths of the inference pipeline and detecting performance regressions.
+
+The benchmarks are run on synthetic batches of raw listings, which columns
+are sampled independently from the raw test dataset with the project
+random seed:
+
+- `price_to_int`: parsing of the price strings,
+- `clean_features`: cleaning and validation of the raw features,
+- `encoder_transform`: transformation of the cleaned features by the
+  column encoder,
+- `booster_predict`: prediction of the model on the transformed features,
+- `comparables_query`: the k nearest training listings of the transformed
+  features found with the KD-tree of the comparables index,
+- `comparables_brute_force`: the same listings found by computing the
+  distances to all the training listings,
+- `api_predict`: the `/predict` endpoint called end to end with the
+  FastAPI test client.
+
+The batch sizes, the number of repeats and the time limits are set in the
+`benchmarks` section of params.yaml. Each benchmark is called once to warm
+up, then up to `repeats` times while the calls take less than
+`max_seconds` in total. The larger batches of a benchmark are skipped when
+their time, projected linearly from the previous batch, exceeds
+`max_seconds`.
+
+The `run` command saves the results to a JSON file in the report path, or
+to the baseline file kept in the repository with the `--baseline` option.
+The `compare` command compares the results with the baseline, and fails if
+the minimum time of any benchmark grows by more than `max_regression`, or
+a benchmark of the baseline has no current result, as it crashed or was
+skipped. The minimum is less sensitive to the noise of other processes
+than the median. Benchmarks missing from the baseline are reported as new.
+
+Usage:
+    $ python run_benchmarks.py run
+    $ python run_benchmarks.py run --baseline
+    $ python run_benchmarks.py compare --threshold 0.3
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.data.functions import clean_features, price_to_int
+from src.features.comparables import ComparablesIndex, brute_force_query
+from src.features.encoder import ColumnEncoder
+from typing import Callable, Dict, List, Optional
+import json
+import logging
+import os
+import platform
+import time
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+
+def make_raw_batch(
+    data: pd.DataFrame, batch_size: int, seed: int
+) -> pd.DataFrame:
+    """
+    Generates a batch of raw listings with each column sampled with
+    replacement from the values of the dataset.
+
+    Params:
+        data: pandas.DataFrame
+            The raw dataset to sample the values from.
+        batch_size: int
+            The number of listings.
+        seed: int
+            The random seed.
+
+    Returns:
+        pandas.DataFrame
+            The synthetic raw listings.
+    """
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            column: data[column].to_numpy()[
+                rng.integers(0, len(data), batch_size)
+            ]
+            for column in data.columns
+        }
+    )
+
+
+def time_calls(
+    call: Callable, repeats: int, max_seconds: float
+) -> Dict[str, float]:
+    """
+    Times calls of a function after one warm-up call. The calls stop after
+    `repeats` calls or when their total time exceeds `max_seconds`.
+
+    Params:
+        call: Callable
+            The function without arguments to time.
+        repeats: int
+            The maximum number of timed calls.
+        max_seconds: float
+            The time limit of the timed calls.
+
+    Returns:
+        Dict[str, float]
+            The minimum, median and 99th percentile of the call time in
+            milliseconds and the number of timed calls.
+    """
+
+    call()
+    timings: List[float] = []
+    while len(timings) < repeats and sum(timings) < max_seconds:
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "min_ms": float(np.min(timings) * 1e3),
+        "median_ms": float(np.median(timings) * 1e3),
+        "p99_ms": float(np.percentile(timings, 99) * 1e3),
+        "repeats": len(timings),
+    }
+
+
+def get_benchmarks(params: dict) -> Dict[str, Callable]:
+    """
+    Returns the benchmark factories. Each factory takes a batch of raw
+    listings and returns the function to time.
+
+    Params:
+        params: dict
+            The project parameters.
+
+    Returns:
+        Dict[str, Callable]
+            The benchmark factories by name.
+    """
+
+    from fastapi.testclient import TestClient
+    from src.api.main import app
+
+    model = lgb.Booster(
+        model_file=get_abs_path(
+            params["model"]["path"], params["model"]["model_file"]
+        )
+    )
+    encoder = ColumnEncoder.load(
+        get_abs_path(
+            params["model"]["path"],
+            params["model"]["column_transformer_file"],
+        )
+    )
+    comparables = ComparablesIndex.load(
+        get_abs_path(
+            params["model"]["path"], params["model"]["comparables_file"]
+        )
+    )
+    k = params["comparables"]["k"]
+    client = TestClient(app)
+    features = params["data"]["features"]
+    target = params["data"]["target"]
+
+    def _clean(batch: pd.DataFrame) -> pd.DataFrame:
+        # vectorized setup, so the other benchmarks don't depend on
+        # the speed of clean_features
+        return batch[features].assign(
+            host_is_superhost=batch["host_is_superhost"].map(
+                {"t": 1.0, "f": 0.0}
+            )
+        )
+
+    def _price_to_int(batch: pd.DataFrame) -> Callable:
+        prices = batch[target]
+        return lambda: prices.map(price_to_int)
+
+    def _clean_features(batch: pd.DataFrame) -> Callable:
+        return lambda: clean_features(batch[features].copy())
+
+    def _encoder_transform(batch: pd.DataFrame) -> Callable:
+        cleaned = _clean(batch)
+        return lambda: encoder.transform(cleaned)
+
+    def _booster_predict(batch: pd.DataFrame) -> Callable:
+        encoded = pd.DataFrame(
+            encoder.transform(_clean(batch)),
+            columns=encoder.feature_names_out,
+        )[features].to_numpy()
+        return lambda: model.predict(encoded)
+
+    def _comparables_query(batch: pd.DataFrame) -> Callable:
+        encoded = encoder.transform(_clean(batch))
+        return lambda: comparables.query(encoded, k)
+
+    def _comparables_brute_force(batch: pd.DataFrame) -> Callable:
+        encoded = encoder.transform(_clean(batch))
+        return lambda: brute_force_query(
+            comparables.points, comparables.transform(encoded), k
+        )
+
+    def _api_predict(batch: pd.DataFrame) -> Callable:
+        rows = batch[features].astype(object).to_numpy().tolist()
+        payload = {"data": [features] + rows}
+        return lambda: client.post("/predict", json=payload).raise_for_status()
+
+    return {
+        "price_to_int": _price_to_int,
+        "clean_features": _clean_features,
+        "encoder_transform": _encoder_transform,
+        "booster_predict": _booster_predict,
+        "comparables_query": _comparables_query,
+        "comparables_brute_force": _comparables_brute_force,
+        "api_predict": _api_predict,
+    }
+
+
+def compare_results(
+    results: List[dict], baseline: List[dict], max_regression: float
+) -> pd.DataFrame:
+    """
+    Compares benchmark results with the baseline.
+
+    Params:
+        results: List[dict]
+            The current results.
+        baseline: List[dict]
+            The baseline results.
+        max_regression: float
+            The allowed relative growth of the minimum time.
+
+    Returns:
+        pandas.DataFrame
+            The minimum times, their ratio and the regression flag of the
+            benchmarks of both results, with the `missing` flag of the
+            baseline benchmarks without a current result, like crashed or
+            skipped ones, and the `new` flag of the current benchmarks
+            without a baseline.
+    """
+
+    keys = ["benchmark", "batch_size"]
+    comparison = pd.merge(
+        pd.DataFrame(baseline)[keys + ["min_ms"]],
+        pd.DataFrame(results)[keys + ["min_ms"]],
+        how="outer",
+        on=keys,
+        suffixes=("_baseline", "_current"),
+        indicator=True,
+    )
+    comparison["missing"] = comparison["_merge"] == "left_only"
+    comparison["new"] = comparison["_merge"] == "right_only"
+    comparison["ratio"] = (
+        comparison["min_ms_current"] / comparison["min_ms_baseline"]
+    )
+    comparison["regressed"] = comparison["ratio"] > 1 + max_regression
+    return comparison.drop(columns="_merge")
+
+
+def _get_paths(params: dict) -> Dict[str, str]:
+    """
+    Returns the paths to the results and baseline files.
+    """
+
+    settings = params["benchmarks"]
+    return {
+        _: get_abs_path(params["model"]["report_path"], settings[f"{_}_file"])
+        for _ in ("results", "baseline")
+    }
+
+
+@click.group()
+def cli() -> None:
+    """
+    Benchmarks the inference pipeline.
+    """
+
+
+@cli.command()
+@click.option(
+    "-b",
+    "--baseline",
+    is_flag=True,
+    help="save the results as the new baseline",
+)
+def run(baseline: bool) -> None:
+    """
+    Runs the benchmarks and saves the results.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    settings = params["benchmarks"]
+    raw_data = pd.read_csv(
+        get_abs_path(
+            params["data"]["raw_data_path"], params["data"]["test_data_file"]
+        )
+    )
+
+    benchmarks = get_benchmarks(params)
+    batches = {
+        _: make_raw_batch(raw_data, _, params["random_seed"])
+        for _ in settings["batch_sizes"]
+    }
+
+    results = []
+    for name, factory in benchmarks.items():
+        previous: Optional[dict] = None
+        for batch_size, batch in batches.items():
+            if previous is not None:
+                projected = (
+                    previous["median_ms"]
+                    / 1e3
+                    * batch_size
+                    / previous["batch_size"]
+                )
+                if projected > settings["max_seconds"]:
+                    logger.info(
+                        f"{name:<18} batch {batch_size:>8}: skipped, "
+                        f"projected {projected:.0f} s"
+                    )
+                    break
+
+            timing = time_calls(
+                factory(batch), settings["repeats"], settings["max_seconds"]
+            )
+            previous = {
+                "benchmark": name,
+                "batch_size": batch_size,
+                **timing,
+                "rows_per_sec": batch_size / timing["median_ms"] * 1e3,
+            }
+            results.append(previous)
+            logger.info(
+                f"{name:<18} batch {batch_size:>8}: "
+                f"median {timing['median_ms']:>10.3f} ms, "
+                f"p99 {timing['p99_ms']:>10.3f} ms, "
+                f"{previous['rows_per_sec']:>12.0f} rows/s"
+            )
+
+    path = _get_paths(params)["baseline" if baseline else "results"]
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "environment": {
+                    "python": platform.python_version(),
+                    "lightgbm": lgb.__version__,
+                    "numpy": np.__version__,
+                    "pandas": pd.__version__,
+                    "cpu_count": os.cpu_count(),
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info(f"Saved benchmark results to {path}")
+
+
+@cli.command()
+@click.option(
+    "-t",
+    "--threshold",
+    type=float,
+    help="allowed relative growth of the minimum time, "
+    "defaults to benchmarks.max_regression of params.yaml",
+)
+def compare(threshold: Optional[float]) -> None:
+    """
+    Compares the results with the baseline and fails on a regression.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    if threshold is None:
+        threshold = params["benchmarks"]["max_regression"]
+
+    paths = _get_paths(params)
+    with open(paths["results"], "r") as f:
+        results = json.load(f)["results"]
+    with open(paths["baseline"], "r") as f:
+        baseline = json.load(f)["results"]
+
+    comparison = compare_results(results, baseline, threshold)
+    for _, row in comparison.iterrows():
+        name = f"{row['benchmark']:<18} batch {row['batch_size']:>8}"
+        if row["missing"]:
+            logger.info(f"{name}: MISSING, no current result")
+        elif row["new"]:
+            logger.info(
+                f"{name}: current {row['min_ms_current']:>10.3f} ms, "
+                "new, not in the baseline"
+            )
+        else:
+            logger.info(
+                f"{name}: "
+                f"baseline {row['min_ms_baseline']:>10.3f} ms, "
+                f"current {row['min_ms_current']:>10.3f} ms, "
+                f"ratio {row['ratio']:>6.2f}"
+                + (" REGRESSED" if row["regressed"] else "")
+            )
+
+    n_regressed = comparison["regressed"].sum()
+    n_missing = comparison["missing"].sum()
+    if n_regressed or n_missing:
+        raise click.ClickException(
+            f"{n_regressed} benchmarks regressed by more than "
+            f"{threshold:.0%}, {n_missing} baseline benchmarks have no "
+            "current result"
+        )
+    n_new = comparison["new"].sum()
+    if n_new:
+        logger.info(
+            f"{n_new} benchmarks aren't gated, run with --baseline to add "
+            "them to the baseline"
+        )
+    logger.info("No regressions")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    cli()
@@ -7,7 +7,8 @@ The module includes the following functions:
       stage (train or test) by dropping duplicates and null values, converting
       the 'price' column to integer, applying custom feature cleaning
       functions, filtering out invalid rows, and saving the cleaned dataset
-      to the interim data path.
+      to the interim data path. The dataset is loaded with categorical text
+      columns and downcast numerical columns.
 
 Usage:
 To clean the train dataset, run the script with the '-s' or '--stage'
@@ -19,24 +20,34 @@ To clean the test dataset, run the script with the '-s' or '--stage'
 option set to 'test':
 
     python clean_dataset.py -s test
+
+With the `--profile` option the stage is profiled and the profile is saved
+to the profiles path.
 """
 
 import click
 from os import path
 from src.utils.functions import load_params, get_project_dir, setup_logging
+from src.utils.profiling import profile_option
 from src.data.datatypes import DatasetStage
 from src.data.functions import (
     price_to_int,
     clean_features,
 )
+from src.data.schema import (
+    get_categorical_columns,
+    read_dataset,
+    optimize_dtypes,
+    memory_usage_mb,
+)
 import logging
-import pandas as pd
 
 
 @click.command()
 @click.option(
     "-s", "--stage", type=DatasetStage, help="train or test dataset to clean"
 )
+@profile_option("clean_dataset")
 def main(stage: DatasetStage) -> None:
     """
     Cleans features of the specified dataset stage (train or test) by dropping
@@ -67,8 +78,11 @@ def main(stage: DatasetStage) -> None:
     )
     logger.info(f"Clean dataset {source_dataset_path}")
 
-    df = pd.read_csv(source_dataset_path)
+    df = read_dataset(source_dataset_path, get_categorical_columns(params))
     logger.info(f"Loaded dataset shape {df.shape}")
+    logger.info(f"Memory footprint {memory_usage_mb(df):.2f} MB")
+    df = optimize_dtypes(df)
+    logger.info(f"Optimized memory footprint {memory_usage_mb(df):.2f} MB")
 
     # drop duplicates and rows with missing values
     df = df.drop_duplicates().dropna(axis=0)
@@ -83,8 +97,10 @@ def main(stage: DatasetStage) -> None:
     # and then drop is_valid column
     price_limit = params["data_cleaning"]["target_limit"]
     df = df[(df.is_valid) & (df.price < price_limit)].drop("is_valid", axis=1)
+    df = optimize_dtypes(df)
 
     logger.info(f"Cleaned dataset shape {df.shape}")
+    logger.info(f"Cleaned memory footprint {memory_usage_mb(df):.2f} MB")
     df.to_csv(dest_dataset_path, index=False)
     logger.info(f"Cleaning {stage.value} is done")
 
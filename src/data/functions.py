@@ -7,6 +7,8 @@ This module contains three functions:
 - is_features_valid: Validates whether feature values are within a valid range.
 - clean_features: Cleans and transforms feature values in a Pandas DataFrame
   based on settings in params.yaml.
+- stratified_sample: Samples rows in proportion to the combinations of
+  the strata columns.
 
 The module requires the Pandas library to be installed.
 
@@ -23,7 +25,8 @@ Example usage:
 
 import numpy as np
 import pandas as pd
-from src.utils.functions import load_params
+from src.utils.config import get_config
+from typing import List
 
 
 def true_false_to_int(value: str) -> float:
@@ -76,14 +79,10 @@ def is_features_valid(row: pd.DataFrame) -> bool:
             limits, False otherwise.
 
     """
-    params = load_params()
-
     return all(
         [
             row[feature] < limit
-            for feature, limit in params["data_cleaning"][
-                "feature_limits"
-            ].items()
+            for feature, limit in get_config().feature_limits.items()
         ]
     )
 
@@ -114,3 +113,37 @@ def clean_features(data: pd.DataFrame) -> pd.DataFrame:
     data.host_is_superhost = data.host_is_superhost.apply(true_false_to_int)
     data["is_valid"] = data.apply(is_features_valid, axis=1)
     return data
+
+
+def stratified_sample(
+    data: pd.DataFrame, strata: List[str], n_rows: int, seed: int
+) -> pd.DataFrame:
+    """Samples rows in proportion to the combinations of the strata columns.
+
+    Params:
+        data: A Pandas DataFrame to sample.
+        strata: The names of the columns, which combinations are sampled
+            in proportion to their shares. Each combination keeps at least
+            one row, so the sample can be slightly larger than `n_rows`.
+        n_rows: The number of rows to sample. The whole DataFrame is
+            returned, if it has fewer rows.
+        seed: The random seed.
+
+    Returns:
+        A new Pandas DataFrame with the sampled rows in the original order.
+    """
+
+    if n_rows >= data.shape[0]:
+        return data.copy()
+
+    fraction = n_rows / data.shape[0]
+    return (
+        data.groupby(strata, dropna=False, group_keys=False)
+        .apply(
+            lambda group: group.sample(
+                n=max(1, round(fraction * group.shape[0])),
+                random_state=seed,
+            )
+        )
+        .sort_index()
+    )
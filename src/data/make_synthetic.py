@@ -0,0 +1,94 @@
+"""
+This module provides a command-line interface for generating large
+synthetic datasets of raw listings to benchmark the pipeline stages.
+
+The generator is fitted to the raw training dataset, and the listings are
+sampled and appended to the output CSV file chunk by chunk, so the memory
+use doesn't depend on the number of rows. The output has the raw schema,
+so it can replace the raw datasets of any stage. The same seed, number of
+rows and chunk size give the same dataset.
+
+The columns sampled jointly and the chunk size are set in the `synthetic`
+section of params.yaml. The seed is the project random seed by default.
+
+Usage:
+    $ python make_synthetic.py data/synthetic/listings.csv --rows 10000000
+    $ python make_synthetic.py synthetic.csv.gz -n 1000000 --seed 1
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import load_params, setup_logging, get_abs_path
+from src.data.synthetic import SyntheticListings
+from typing import Optional
+import logging
+import os
+import time
+import pandas as pd
+
+
+@click.command()
+@click.argument("output_path", type=click.Path(dir_okay=False))
+@click.option("-n", "--rows", type=click.IntRange(min=1), required=True)
+@click.option("-s", "--seed", type=int)
+@click.option("--chunk-size", type=click.IntRange(min=1))
+def main(
+    output_path: str,
+    rows: int,
+    seed: Optional[int],
+    chunk_size: Optional[int],
+) -> None:
+    """
+    Generates synthetic raw listings and writes them to the output CSV
+    file.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    settings = params["synthetic"]
+    seed = params["random_seed"] if seed is None else seed
+    chunk_size = chunk_size or settings["chunk_size"]
+
+    raw_path = get_abs_path(
+        params["data"]["raw_data_path"], params["data"]["train_data_file"]
+    )
+    generator = SyntheticListings.fit(
+        pd.read_csv(raw_path),
+        params["data"]["target"],
+        settings["group"],
+        settings["joint"],
+        settings["n_quantiles"],
+        settings["min_count"],
+    )
+    logger.info(
+        f"Fitted the generator to {raw_path}, generate {rows} rows "
+        f"with seed {seed} in chunks of {chunk_size}"
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    start = time.perf_counter()
+    n_rows = 0
+    for chunk in generator.iter_chunks(rows, chunk_size, seed):
+        chunk.to_csv(
+            output_path,
+            mode="w" if n_rows == 0 else "a",
+            header=n_rows == 0,
+            index=False,
+        )
+        n_rows += chunk.shape[0]
+        logger.debug(f"Written {n_rows} rows")
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Saved {n_rows} rows to {output_path} in {elapsed:.1f} s, "
+        f"{n_rows / elapsed:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
@@ -0,0 +1,90 @@
+"""
+This module provides a command-line interface for sampling the raw
+training and test datasets for a quick run of the pipeline.
+
+The stage runs with a params profile, which has a `sampling` section, like
+the `smoke` profile selected with the `PARAMS_PROFILE=smoke` environment
+variable. The raw datasets of the source path are sampled in proportion to
+the combinations of the strata columns, the neighbourhood and the room type,
+and saved to the raw data path of the profile. The data, model and report
+directories of the profile are created, so the following stages write all
+their artifacts apart from the production ones.
+
+Usage:
+    $ PARAMS_PROFILE=smoke python sample_dataset.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.config import get_config
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    get_project_dir,
+    setup_logging,
+)
+from src.data.functions import stratified_sample
+import logging
+import os
+import pandas as pd
+
+
+@click.command()
+def main() -> None:
+    """
+    Samples the raw training and test datasets into the raw data path of
+    the params profile.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    if "sampling" not in params:
+        raise click.ClickException(
+            "Sampling is set by a params profile, "
+            "run the stage with PARAMS_PROFILE=smoke"
+        )
+    sampling = params["sampling"]
+    logger.info(
+        f"Sample the raw datasets for the {get_config().profile} profile"
+    )
+
+    for rel_path in (
+        params["data"]["raw_data_path"],
+        params["data"]["interim_data_path"],
+        params["data"]["processed_data_path"],
+        params["model"]["path"],
+        params["model"]["report_path"],
+    ):
+        os.makedirs(os.path.join(get_project_dir(), rel_path), exist_ok=True)
+
+    for stage in ("train", "test"):
+        source_path = get_abs_path(
+            sampling["source_path"], params["data"][f"{stage}_data_file"]
+        )
+        data = pd.read_csv(source_path)
+        sample = stratified_sample(
+            data,
+            sampling["strata"],
+            sampling[f"{stage}_rows"],
+            params["random_seed"],
+        )
+        sample.to_csv(
+            get_abs_path(
+                params["data"]["raw_data_path"],
+                params["data"][f"{stage}_data_file"],
+            ),
+            index=False,
+        )
+        logger.info(
+            f"Sampled {sample.shape[0]} of {data.shape[0]} rows "
+            f"of {source_path}"
+        )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
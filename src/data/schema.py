@@ -0,0 +1,131 @@
+"""
+A module for loading datasets with compact data types.
+
+The text columns listed in the `data.schema.categorical` section of
+params.yaml are parsed directly into pandas categoricals instead of object
+arrays, and the numerical columns are downcast to the smallest integer
+type or to float32, so all pipeline stages load the datasets in the same
+compact way.
+
+This module contains the following functions:
+
+- get_categorical_columns: Returns the categorical columns of the schema.
+- read_dataset: Reads a CSV file with the categorical columns parsed as
+  pandas categoricals.
+- optimize_dtypes: Downcasts numerical columns of a dataframe.
+- memory_usage_mb: Returns the memory footprint of a dataframe.
+
+Example usage:
+    from src.data.schema import (
+        get_categorical_columns,
+        read_dataset,
+        optimize_dtypes,
+        memory_usage_mb,
+    )
+
+    df = read_dataset("data/raw/train.csv", get_categorical_columns(params))
+    print(f"{memory_usage_mb(df):.2f} MB")
+
+    df = optimize_dtypes(df)
+    print(f"{memory_usage_mb(df):.2f} MB")
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_float_dtype, is_integer_dtype
+
+
+def get_categorical_columns(params: dict) -> List[str]:
+    """
+    Returns the text columns to load as pandas categoricals.
+
+    Params:
+        params: dict
+            The project parameters.
+
+    Returns:
+        List[str]
+            The names of the categorical columns.
+    """
+
+    return list(params["data"]["schema"]["categorical"])
+
+
+def read_dataset(
+    path: str, categorical_columns: Optional[List[str]] = None, **kwargs
+) -> pd.DataFrame:
+    """
+    Reads a CSV file with the given columns parsed as pandas categoricals.
+
+    Params:
+        path: str
+            The path to the CSV file.
+        categorical_columns: List[str], optional
+            The names of the columns to parse as categoricals. The columns
+            missing in the file are ignored.
+        kwargs:
+            Other keyword arguments passed to `pandas.read_csv`.
+
+    Returns:
+        pandas.DataFrame
+            The loaded dataset.
+    """
+
+    columns = pd.read_csv(path, nrows=0).columns
+    dtype = {
+        column: "category"
+        for column in categorical_columns or []
+        if column in columns
+    }
+    return pd.read_csv(path, dtype=dtype, **kwargs)
+
+
+def optimize_dtypes(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Downcasts numerical columns of a dataframe. Integer columns, and float
+    columns with integer values only, are converted to the smallest integer
+    type. The rest of the float columns are converted to float32.
+
+    Params:
+        data: pandas.DataFrame
+            The dataframe to optimize.
+
+    Returns:
+        pandas.DataFrame
+            The dataframe with downcast numerical columns.
+    """
+
+    data = data.copy()
+    for column in data.columns:
+        values = data[column]
+        if is_integer_dtype(values.dtype):
+            data[column] = pd.to_numeric(values, downcast="integer")
+        elif is_float_dtype(values.dtype):
+            if values.notna().all() and np.array_equal(
+                values, np.round(values)
+            ):
+                data[column] = pd.to_numeric(
+                    values.astype(np.int64), downcast="integer"
+                )
+            else:
+                data[column] = values.astype(np.float32)
+    return data
+
+
+def memory_usage_mb(data: pd.DataFrame) -> float:
+    """
+    Returns the memory footprint of a dataframe including the content of
+    object columns.
+
+    Params:
+        data: pandas.DataFrame
+            The dataframe to measure.
+
+    Returns:
+        float
+            The memory footprint in megabytes.
+    """
+
+    return data.memory_usage(deep=True).sum() / 2**20
@@ -0,0 +1,320 @@
+"""
+The synthetic module generates any number of raw listings with the
+distributions of the raw dataset, to benchmark the pipeline stages on
+datasets far larger than the real one.
+
+The generator is fitted to the raw dataset, and all the columns are
+sampled conditionally on a group column, the room type by default:
+- categorical columns are sampled from their frequencies in the group,
+  missing values included,
+- the joint columns, accommodates, bedrooms and beds by default, are
+  sampled together from the frequencies of their combinations in the
+  group, which keeps their correlations and ranges,
+- the other numerical columns are sampled from their quantiles in the
+  group, within the observed range,
+- the target price is sampled from the quantiles of the log price of the
+  listings of the group with the same value of the first joint column, or
+  of the group when there are too few of them, and is formatted as the
+  raw price strings, like `$1,200.00`.
+
+Chunks are sampled with random generators seeded by the seed and the
+chunk number, so the same seed and chunk size give the same dataset.
+
+Classes:
+--------
+1. SyntheticListings:
+    Fits the distributions of the raw dataset and samples listings.
+
+Example:
+--------
+from src.data.synthetic import SyntheticListings
+
+generator = SyntheticListings.fit(raw_data, "price")
+for chunk in generator.iter_chunks(10_000_000, 100_000, seed=230213):
+    chunk.to_csv(...)
+"""
+
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data.functions import price_to_int
+
+# table of values and their shares
+Frequencies = Tuple[np.ndarray, np.ndarray]
+
+
+class SyntheticListings:
+    """
+    Generator of raw listings fitted to a raw dataset.
+
+    Attributes:
+        - `columns`: names of the raw columns in the output order.
+        - `group`: name of the column the others are conditioned on.
+        - `joint`: names of the columns sampled jointly.
+        - `target`: name of the price column.
+        - `groups`: frequencies of the group values.
+        - `categorical`: frequencies of each categorical column per group.
+        - `combinations`: frequencies of the joint columns combinations,
+          as row indices of `joint_values`, per group.
+        - `joint_values`: the unique combinations of the joint columns.
+        - `quantiles`: quantiles of each other numerical column and the
+          share of its missing values per group.
+        - `target_quantiles`: quantiles of the log price per group and
+          value of the first joint column, None is for the whole group.
+        - `integer_columns`: names of the columns of integers.
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        group: str,
+        joint: List[str],
+        target: str,
+        groups: Frequencies,
+        categorical: Dict[str, List[Frequencies]],
+        combinations: List[Frequencies],
+        joint_values: np.ndarray,
+        quantiles: Dict[str, List[Tuple[np.ndarray, float]]],
+        target_quantiles: List[Dict[Any, np.ndarray]],
+        integer_columns: List[str],
+    ) -> None:
+        self.columns = list(columns)
+        self.group = group
+        self.joint = list(joint)
+        self.target = target
+        self.groups = groups
+        self.categorical = categorical
+        self.combinations = combinations
+        self.joint_values = joint_values
+        self.quantiles = quantiles
+        self.target_quantiles = target_quantiles
+        self.integer_columns = list(integer_columns)
+
+    @classmethod
+    def fit(
+        cls,
+        data: pd.DataFrame,
+        target: str,
+        group: str = "room_type",
+        joint: Sequence[str] = ("accommodates", "bedrooms", "beds"),
+        n_quantiles: int = 100,
+        min_count: int = 20,
+    ) -> "SyntheticListings":
+        """
+        Fits the distributions of a raw dataset.
+
+        Params:
+            data: pandas.DataFrame
+                The raw listings.
+            target: str
+                The name of the price column.
+            group: str, optional
+                The name of the column the others are conditioned on.
+            joint: Sequence[str], optional
+                The names of the numerical columns sampled jointly.
+            n_quantiles: int, optional
+                The number of quantiles of numerical columns.
+            min_count: int, optional
+                The minimum number of listings with a value of the first
+                joint column to fit their own price quantiles.
+
+        Returns:
+            SyntheticListings
+                The fitted generator.
+        """
+
+        joint = list(joint)
+        others = [_ for _ in data.columns if _ not in joint + [group, target]]
+        categorical_columns = [
+            _ for _ in others if not pd.api.types.is_numeric_dtype(data[_])
+        ]
+        numerical_columns = [_ for _ in others if _ not in categorical_columns]
+        probabilities = np.linspace(0, 1, n_quantiles + 1)
+
+        groups = _get_frequencies(data[group])
+        joint_codes, joint_values = pd.MultiIndex.from_frame(
+            data[joint]
+        ).factorize()
+        joint_values = joint_values.to_frame().to_numpy(dtype=np.float64)
+        log_prices = np.log10(
+            data[target].apply(price_to_int).to_numpy(dtype=np.float64)
+        )
+
+        categorical = {_: [] for _ in categorical_columns}
+        quantiles = {_: [] for _ in numerical_columns}
+        combinations, target_quantiles = [], []
+        for value in groups[0]:
+            rows = (data[group] == value).to_numpy()
+            subset = data[rows]
+            for column in categorical_columns:
+                categorical[column].append(_get_frequencies(subset[column]))
+            for column in numerical_columns:
+                values = subset[column].to_numpy(dtype=np.float64)
+                missing = np.isnan(values)
+                quantiles[column].append(
+                    (
+                        np.quantile(values[~missing], probabilities)
+                        if (~missing).any()
+                        else np.full(2, np.nan),
+                        float(missing.mean()),
+                    )
+                )
+            codes, shares = _get_frequencies(pd.Series(joint_codes[rows]))
+            combinations.append((codes.astype(np.int64), shares))
+
+            cells = {None: np.quantile(log_prices[rows], probabilities)}
+            by_value = pd.Series(log_prices[rows]).groupby(
+                subset[joint[0]].to_numpy()
+            )
+            for key, prices in by_value:
+                if len(prices) >= min_count:
+                    cells[key] = np.quantile(prices, probabilities)
+            target_quantiles.append(cells)
+
+        return cls(
+            data.columns.to_list(),
+            group,
+            joint,
+            target,
+            groups,
+            categorical,
+            combinations,
+            joint_values,
+            quantiles,
+            target_quantiles,
+            [
+                _
+                for _ in data.columns
+                if pd.api.types.is_integer_dtype(data[_])
+            ],
+        )
+
+    def sample(self, n_rows: int, rng: np.random.Generator) -> pd.DataFrame:
+        """
+        Samples raw listings.
+
+        Params:
+            n_rows: int
+                The number of listings.
+            rng: numpy.random.Generator
+                The random generator.
+
+        Returns:
+            pandas.DataFrame
+                The listings with the raw columns.
+        """
+
+        group_codes = _choose(self.groups, n_rows, rng)
+        columns = {self.group: self.groups[0][group_codes]}
+        columns.update(
+            {_: np.empty(n_rows, dtype=object) for _ in self.categorical}
+        )
+        columns.update(
+            {_: np.empty(n_rows) for _ in self.joint + list(self.quantiles)}
+        )
+        log_prices = np.empty(n_rows)
+
+        for code in range(len(self.groups[0])):
+            rows = np.flatnonzero(group_codes == code)
+            if not len(rows):
+                continue
+            for column, frequencies in self.categorical.items():
+                values, _ = frequencies[code]
+                columns[column][rows] = values[
+                    _choose(frequencies[code], len(rows), rng)
+                ]
+            combinations = self.joint_values[
+                self.combinations[code][0][
+                    _choose(self.combinations[code], len(rows), rng)
+                ]
+            ]
+            for i, column in enumerate(self.joint):
+                columns[column][rows] = combinations[:, i]
+            for column, frequencies in self.quantiles.items():
+                values, missing = frequencies[code]
+                columns[column][rows] = np.where(
+                    rng.random(len(rows)) < missing,
+                    np.nan,
+                    _interpolate(values, rng.random(len(rows))),
+                )
+
+            # the price quantiles of the group are used for the values of
+            # the first joint column with too few listings
+            cells = self.target_quantiles[code]
+            probabilities = rng.random(len(rows))
+            log_prices[rows] = _interpolate(cells[None], probabilities)
+            for key, values in cells.items():
+                cell = combinations[:, 0] == key
+                if key is not None and cell.any():
+                    log_prices[rows[cell]] = _interpolate(
+                        values, probabilities[cell]
+                    )
+
+        for column in self.integer_columns:
+            if column in columns:
+                columns[column] = np.round(columns[column]).astype(np.int64)
+        columns[self.target] = [
+            f"${_:,.2f}" for _ in np.round(10**log_prices)
+        ]
+        return pd.DataFrame(columns)[self.columns]
+
+    def iter_chunks(
+        self, n_rows: int, chunk_size: int, seed: int
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields raw listings in chunks. Each chunk is sampled with a random
+        generator seeded by the seed and the chunk number.
+
+        Params:
+            n_rows: int
+                The total number of listings.
+            chunk_size: int
+                The number of listings in a chunk.
+            seed: int
+                The random seed.
+
+        Yields:
+            pandas.DataFrame
+                The chunks of listings.
+        """
+
+        for i, start in enumerate(range(0, n_rows, chunk_size)):
+            rng = np.random.default_rng([seed, i])
+            yield self.sample(min(chunk_size, n_rows - start), rng)
+
+
+def _get_frequencies(values: pd.Series) -> Frequencies:
+    """
+    Returns the unique values, missing values included, and their shares.
+    """
+
+    counts = values.value_counts(dropna=False)
+    return (
+        counts.index.to_numpy(dtype=object),
+        (counts / len(values)).to_numpy(),
+    )
+
+
+def _choose(
+    frequencies: Frequencies, size: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Samples indices of the values of a frequency table.
+    """
+
+    return rng.choice(len(frequencies[0]), size, p=frequencies[1])
+
+
+def _interpolate(
+    quantiles: np.ndarray, probabilities: np.ndarray
+) -> np.ndarray:
+    """
+    Maps uniform probabilities to values by the linearly interpolated
+    quantiles.
+    """
+
+    return np.interp(
+        probabilities, np.linspace(0, 1, len(quantiles)), quantiles
+    )
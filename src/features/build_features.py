@@ -12,11 +12,16 @@ The module defines a `main` function that performs the following steps:
 5. Transforms the features and target using the fitted transformer.
 6. Joins the transformed features and target into a new dataset.
 7. Saves the new dataset to a file.
+8. Caches the features and target as memory-mapped float32 arrays, and
+   the LightGBM binary dataset for the training dataset.
 
 If the dataset is for training, a column transformer is initialized and fitted
 to encode categorical features with Ordinal Encoder and scale numerical
-features with StandardScaler. The fitted column transformer is saved. If the
-dataset is for testing, the saved column transformer is loaded.
+features with StandardScaler. The fitted column transformer is exported to
+a pickle-free `ColumnEncoder` and saved. The reference profile of the
+training features is saved for the drift monitor of the API, and the
+nearest-neighbour index of the training listings for the comparables
+endpoint. If the dataset is for testing, the saved encoder is loaded.
 
 The transformed features and the original target are merged into a new
 pandas dataframe, which is saved to a CSV file at the destination dataset path.
@@ -40,6 +45,9 @@ Example:
     ```
     python build_features.py --stage test
     ```
+
+    With the `--profile` option the stage is profiled and the profile is
+    saved to the profiles path.
 """
 
 import numpy as np
@@ -48,10 +56,23 @@ from src.utils.functions import (
     load_params,
     get_abs_path,
     setup_logging,
-    load_pickle,
-    save_pickle,
 )
+from src.utils.profiling import profile_option
 from src.data.datatypes import DatasetStage
+from src.data.schema import (
+    get_categorical_columns,
+    read_dataset,
+    optimize_dtypes,
+    memory_usage_mb,
+)
+from src.features.cache import (
+    get_cache_dir,
+    save_feature_cache,
+    save_binary_dataset,
+)
+from src.features.comparables import ComparablesIndex
+from src.features.drift import FeatureProfile
+from src.features.encoder import ColumnEncoder
 from src.features.functions import transform_target
 import logging
 import pandas as pd
@@ -63,6 +84,7 @@ from sklearn.preprocessing import OrdinalEncoder, StandardScaler
 @click.option(
     "-s", "--stage", type=DatasetStage, help="train or test dataset to clean"
 )
+@profile_option("build_features")
 def main(stage: DatasetStage) -> None:
     """
     Builds the features from a cleaned dataset based on whether the input
@@ -85,12 +107,16 @@ def main(stage: DatasetStage) -> None:
     5. Transforms the features and target using the fitted transformer.
     6. Joins the transformed features and target into a new dataset.
     7. Saves the new dataset to a file.
+    8. Caches the features and target as memory-mapped float32 arrays,
+       and the LightGBM binary dataset for the training dataset.
 
     If the dataset is for training, a column transformer is initialized and
     fitted to encode categorical features with Ordinal Encoder and scale
-    numerical features with StandardScaler.
+    numerical features with StandardScaler. The fitted transformer is
+    exported to a `ColumnEncoder` and saved as arrays, and the reference
+    profile of the training features and the comparables index are saved.
 
-    If the dataset is for testing, the saved column transformer is loaded.
+    If the dataset is for testing, the saved encoder is loaded.
 
     The features and target are transformed, and a new pandas dataframe
     is created from the transformed features and the original target.
@@ -105,6 +131,14 @@ def main(stage: DatasetStage) -> None:
         params["model"]["path"],
         params["model"]["column_transformer_file"],
     )
+    feature_profile_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["feature_profile_file"],
+    )
+    comparables_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["comparables_file"],
+    )
     source_dataset_path = get_abs_path(
         params["data"]["interim_data_path"],
         params["data"][f"{stage.value}_data_file"],
@@ -115,8 +149,11 @@ def main(stage: DatasetStage) -> None:
     )
     logger.info(f"Build features for dataset {source_dataset_path}")
 
-    df = pd.read_csv(source_dataset_path)
+    df = read_dataset(source_dataset_path, get_categorical_columns(params))
     logger.info(f"Loaded dataset shape {df.shape}")
+    logger.info(f"Memory footprint {memory_usage_mb(df):.2f} MB")
+    df = optimize_dtypes(df)
+    logger.info(f"Optimized memory footprint {memory_usage_mb(df):.2f} MB")
 
     features = df[params["data"]["features"]]
     target = df[params["data"]["target"]]
@@ -169,29 +206,64 @@ def main(stage: DatasetStage) -> None:
             remainder="drop",
         )
         column_transformer.fit(features)
-        # save transformer for test dataset processing stage
-        save_pickle(column_transformer, column_transformer_path)
+        # export fitted transformer to a pickle-free encoder
+        # and save it for test dataset processing stage
+        encoder = ColumnEncoder.from_column_transformer(column_transformer)
+        encoder.save(column_transformer_path)
         logger.info("Saved fitted column transformer")
 
+        # reference profile of the training features for drift monitoring
+        profile = FeatureProfile.fit(
+            features, categorical_features, params["drift"]["n_bins"]
+        )
+        profile.save(feature_profile_path)
+        logger.info("Saved feature profile")
+
     else:
         # load fitted transformer
-        column_transformer = load_pickle(column_transformer_path)
+        encoder = ColumnEncoder.load(column_transformer_path)
         logger.info("Loaded fitted column transformer")
 
-    features_transformed = column_transformer.transform(features)
+    features_transformed = encoder.transform(features)
     target_transformed = transform_target(target)
     logger.info(
         f"Transformed {features_transformed.shape} features and "
         f"{target_transformed.shape} target"
     )
 
+    if stage == DatasetStage.TRAIN:
+        # nearest-neighbour index of the training listings and their
+        # prices for the comparables endpoint of the API
+        ComparablesIndex.fit(
+            encoder, features_transformed, features, target.to_numpy()
+        ).save(comparables_path)
+        logger.info("Saved comparables index")
+
     dataset = pd.DataFrame(
         features_transformed,
-        columns=categorical_features + as_numerical + as_categorical,
+        columns=encoder.feature_names_out,
     ).join(target_transformed)
 
     dataset.to_csv(dest_dataset_path, index=False)
 
+    # cache features in training order as memory-mapped arrays
+    cache_dir = get_cache_dir(params, stage)
+    feature_names = params["data"]["features"]
+    cached_features = dataset[feature_names].to_numpy(dtype=np.float32)
+    cached_target = target_transformed.to_numpy(dtype=np.float32)
+    save_feature_cache(
+        cache_dir, cached_features, cached_target, feature_names
+    )
+    if stage == DatasetStage.TRAIN:
+        save_binary_dataset(
+            cache_dir,
+            cached_features,
+            cached_target,
+            feature_names,
+            params["model"]["categorical_features"],
+        )
+    logger.info(f"Cached features to {cache_dir}")
+
 
 if __name__ == "__main__":
     logger = setup_logging(logname=__name__, loglevel="INFO")
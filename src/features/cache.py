@@ -0,0 +1,275 @@
+"""
+The cache module stores transformed features and target as memory-mapped
+float32 arrays and LightGBM binary datasets, so training and evaluation
+runs can map them directly instead of parsing the processed CSV files
+and re-binning the features.
+
+A cache entry is a directory keyed by a hash of the interim dataset, the
+fitted column transformer and the feature settings. When any of them
+changes, the key changes and a stale entry is never used.
+
+Each cache entry contains:
+- `features.npy`: float32 features in `params["data"]["features"]` order,
+- `target.npy`: float32 transformed target,
+- `meta.json`: feature names and the shape of the arrays,
+- `dataset.bin`: LightGBM binary Dataset (train stage only).
+
+Functions:
+----------
+1. get_cache_dir(params: dict, stage: DatasetStage) -> Optional[str]:
+    Returns the cache directory of the dataset stage for the current
+    data and transformer, or None if they are not built yet.
+
+2. save_feature_cache(cache_dir: str, features: np.ndarray,
+                      target: np.ndarray, feature_names: List[str]) -> None:
+    Saves features and target as memory-mapped float32 arrays.
+
+3. load_feature_cache(cache_dir: str)
+        -> Optional[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    Maps cached features and target, if the cache entry exists.
+
+4. save_binary_dataset(cache_dir: str, features: np.ndarray,
+                       target: np.ndarray, feature_names: List[str],
+                       categorical_features: List[str]) -> None:
+    Constructs a LightGBM Dataset and saves it in the binary format.
+
+5. load_binary_dataset(cache_dir: str) -> Optional[lgb.Dataset]:
+    Loads the binned LightGBM Dataset, if the cache entry has one.
+
+Example:
+--------
+from src.data.datatypes import DatasetStage
+from src.features.cache import get_cache_dir, load_feature_cache
+
+cache_dir = get_cache_dir(params, DatasetStage.TEST)
+cached = load_feature_cache(cache_dir) if cache_dir else None
+if cached is not None:
+    features, target, feature_names = cached
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+
+from src.data.datatypes import DatasetStage
+from src.utils.functions import get_abs_path
+
+FEATURES_FILE = "features.npy"
+TARGET_FILE = "target.npy"
+META_FILE = "meta.json"
+BINARY_DATASET_FILE = "dataset.bin"
+# keep all features, so min_data_in_leaf can be changed by training
+# and tuning parameters without re-binning the dataset
+BINARY_DATASET_PARAMS = {"feature_pre_filter": False}
+
+
+def get_cache_key(paths: List[str], settings: dict) -> str:
+    """
+    Calculates a hash of the files content and the settings.
+
+    Params:
+        paths: List[str]
+            The paths to the files to hash.
+        settings: dict
+            JSON serializable settings to hash with the files.
+
+    Returns:
+        str
+            The hex digest of the hash.
+    """
+
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cache_dir(params: dict, stage: DatasetStage) -> Optional[str]:
+    """
+    Returns the cache directory of the dataset stage keyed by the interim
+    dataset, the fitted column transformer and the feature settings.
+
+    Params:
+        params: dict
+            The project parameters.
+        stage: DatasetStage
+            The dataset stage.
+
+    Returns:
+        Optional[str]
+            The path to the cache directory, or None if the interim dataset
+            or the column transformer doesn't exist.
+    """
+
+    paths = [
+        get_abs_path(
+            params["data"]["interim_data_path"],
+            params["data"][f"{stage.value}_data_file"],
+        ),
+        get_abs_path(
+            params["model"]["path"],
+            params["model"]["column_transformer_file"],
+        ),
+    ]
+    if not all(os.path.exists(_) for _ in paths):
+        return None
+
+    settings = {
+        "features": params["data"]["features"],
+        "target": params["data"]["target"],
+        "categorical_features": params["model"]["categorical_features"],
+    }
+    key = get_cache_key(paths, settings)
+    return get_abs_path(
+        params["data"]["feature_cache_path"], f"{stage.value}-{key[:16]}"
+    )
+
+
+def save_feature_cache(
+    cache_dir: str,
+    features: np.ndarray,
+    target: np.ndarray,
+    feature_names: List[str],
+) -> None:
+    """
+    Saves features and target as memory-mapped float32 arrays. Other cache
+    entries of the same dataset stage are removed.
+
+    Params:
+        cache_dir: str
+            The path to the cache directory.
+        features: numpy.ndarray
+            The transformed features.
+        target: numpy.ndarray
+            The transformed target.
+        feature_names: List[str]
+            The names of the features columns.
+    """
+
+    _remove_stale_entries(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for filename, values in [(FEATURES_FILE, features), (TARGET_FILE, target)]:
+        array = np.lib.format.open_memmap(
+            os.path.join(cache_dir, filename),
+            mode="w+",
+            dtype=np.float32,
+            shape=values.shape,
+        )
+        array[:] = values
+        array.flush()
+        del array
+
+    with open(os.path.join(cache_dir, META_FILE), "w") as f:
+        json.dump(
+            {"feature_names": feature_names, "shape": list(features.shape)},
+            f,
+        )
+
+
+def load_feature_cache(
+    cache_dir: str,
+) -> Optional[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    """
+    Maps cached features and target in read-only mode.
+
+    Params:
+        cache_dir: str
+            The path to the cache directory.
+
+    Returns:
+        Optional[Tuple[numpy.ndarray, numpy.ndarray, List[str]]]
+            The memory-mapped features, target and feature names, or None
+            if the cache entry doesn't exist.
+    """
+
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    features = np.load(os.path.join(cache_dir, FEATURES_FILE), mmap_mode="r")
+    target = np.load(os.path.join(cache_dir, TARGET_FILE), mmap_mode="r")
+    return features, target, meta["feature_names"]
+
+
+def save_binary_dataset(
+    cache_dir: str,
+    features: np.ndarray,
+    target: np.ndarray,
+    feature_names: List[str],
+    categorical_features: List[str],
+) -> None:
+    """
+    Constructs a LightGBM Dataset and saves it in the binary format with
+    the binned features.
+
+    Params:
+        cache_dir: str
+            The path to the cache directory.
+        features: numpy.ndarray
+            The transformed features.
+        target: numpy.ndarray
+            The transformed target.
+        feature_names: List[str]
+            The names of the features columns.
+        categorical_features: List[str]
+            The names of the categorical features.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    dataset = lgb.Dataset(
+        features,
+        label=target,
+        feature_name=feature_names,
+        categorical_feature=categorical_features,
+        params=BINARY_DATASET_PARAMS,
+    ).construct()
+    dataset.save_binary(os.path.join(cache_dir, BINARY_DATASET_FILE))
+
+
+def load_binary_dataset(cache_dir: str) -> Optional[lgb.Dataset]:
+    """
+    Loads the binned LightGBM Dataset from the cache directory.
+
+    Params:
+        cache_dir: str
+            The path to the cache directory.
+
+    Returns:
+        Optional[lightgbm.Dataset]
+            The constructed dataset, or None if the cache entry doesn't
+            have a binary dataset.
+    """
+
+    path = os.path.join(cache_dir, BINARY_DATASET_FILE)
+    if not os.path.exists(path):
+        return None
+
+    return lgb.Dataset(
+        path, params=BINARY_DATASET_PARAMS, free_raw_data=False
+    ).construct()
+
+
+def _remove_stale_entries(cache_dir: str) -> None:
+    """
+    Removes cache entries of the same dataset stage with other keys.
+    """
+
+    root, name = os.path.split(cache_dir)
+    if not os.path.isdir(root):
+        return
+
+    stage = name.split("-")[0]
+    for entry in os.listdir(root):
+        if entry != name and entry.startswith(f"{stage}-"):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
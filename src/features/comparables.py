@@ -0,0 +1,354 @@
+"""
+The comparables module provides a nearest-neighbour index of the training
+listings, which finds the listings most similar to a query listing along
+with their prices.
+
+The listings are indexed by their transformed features. Ordinal codes of
+categorical features have no meaningful distance, so each category is
+replaced with the mean log price of its training listings, and unknown
+categories with the overall mean. All the columns are then standardized,
+so each feature weighs equally in the Euclidean distance.
+
+The index keeps the points, the original prices and the cleaned features
+of the training listings in a pickle-free `.npz` file built by
+`build_features`. The KD-tree over the points is built when the index is
+loaded, and the k nearest listings of a batch of queries are found in one
+lookup.
+
+Classes:
+--------
+1. ComparablesIndex:
+    Finds the training listings nearest to the queries.
+
+Functions:
+----------
+1. brute_force_query(points: np.ndarray, queries: np.ndarray, k: int,
+                     chunk_size: int = 256)
+        -> Tuple[np.ndarray, np.ndarray]:
+    Finds the k nearest points by computing all the distances, as the
+    reference for the KD-tree lookup.
+
+Example:
+--------
+from src.features.comparables import ComparablesIndex
+
+index = ComparablesIndex.fit(encoder, encoded_features, features, prices)
+index.save("models/comparables.npz")
+
+index = ComparablesIndex.load("models/comparables.npz")
+distances, indices = index.query(encoder.transform(queries), k=5)
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from src.features.encoder import ColumnEncoder
+
+FORMAT_VERSION = 1
+LEAF_SIZE = 40
+
+
+class ComparablesIndex:
+    """
+    Nearest-neighbour index of the training listings.
+
+    Attributes:
+        - `feature_names`: names of the transformed features in the
+          encoder output order.
+        - `category_means`: mean log price of each category of each
+          categorical feature.
+        - `default_mean`: the overall mean log price used for unknown
+          categories.
+        - `center`, `scale`: the standardization of the points.
+        - `points`: the standardized points of the training listings.
+        - `prices`: the prices of the training listings.
+        - `listings`: the cleaned features of the training listings.
+    """
+
+    def __init__(
+        self,
+        feature_names: List[str],
+        category_means: Dict[str, np.ndarray],
+        default_mean: float,
+        center: np.ndarray,
+        scale: np.ndarray,
+        points: np.ndarray,
+        prices: np.ndarray,
+        listings: pd.DataFrame,
+    ) -> None:
+        self.feature_names = list(feature_names)
+        self.category_means = category_means
+        self.default_mean = float(default_mean)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.points = np.asarray(points, dtype=np.float32)
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.listings = listings
+
+        self._tree = KDTree(self.points, leaf_size=LEAF_SIZE)
+
+    @classmethod
+    def fit(
+        cls,
+        encoder: ColumnEncoder,
+        encoded: np.ndarray,
+        listings: pd.DataFrame,
+        prices: np.ndarray,
+    ) -> "ComparablesIndex":
+        """
+        Builds the index of the training listings.
+
+        Params:
+            encoder: ColumnEncoder
+                The fitted column encoder.
+            encoded: numpy.ndarray
+                The transformed features of the listings in the encoder
+                output order.
+            listings: pandas.DataFrame
+                The cleaned features of the listings, returned with the
+                comparables.
+            prices: numpy.ndarray
+                The prices of the listings.
+
+        Returns:
+            ComparablesIndex
+                The fitted index.
+        """
+
+        log_prices = np.log10(np.asarray(prices, dtype=np.float64))
+        default_mean = log_prices.mean()
+        category_means = {}
+        for i, (feature, vocabulary) in enumerate(
+            zip(encoder.categorical_features, encoder.categories)
+        ):
+            codes = encoded[:, i]
+            known = ~np.isnan(codes)
+            codes = codes[known].astype(np.int64)
+            sums = np.bincount(
+                codes, weights=log_prices[known], minlength=len(vocabulary)
+            )
+            counts = np.bincount(codes, minlength=len(vocabulary))
+            category_means[feature] = np.where(
+                counts > 0, sums / np.maximum(counts, 1), default_mean
+            )
+
+        points = _encode_categories(
+            encoded, encoder.feature_names_out, category_means, default_mean
+        )
+        center = np.nanmean(points, axis=0)
+        scale = np.nanstd(points, axis=0)
+        scale[scale == 0] = 1.0
+        return cls(
+            encoder.feature_names_out,
+            category_means,
+            default_mean,
+            center,
+            scale,
+            np.nan_to_num((points - center) / scale),
+            prices,
+            listings.reset_index(drop=True),
+        )
+
+    def transform(self, encoded: np.ndarray) -> np.ndarray:
+        """
+        Maps transformed features to the standardized points of the index.
+        Missing values are mapped to the center.
+
+        Params:
+            encoded: numpy.ndarray
+                The transformed features in the encoder output order.
+
+        Returns:
+            numpy.ndarray
+                The points.
+        """
+
+        points = _encode_categories(
+            encoded, self.feature_names, self.category_means, self.default_mean
+        )
+        points = (points - self.center) / self.scale
+        return np.nan_to_num(points).astype(np.float32)
+
+    def query(
+        self, encoded: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest training listings of each query in one lookup.
+
+        Params:
+            encoded: numpy.ndarray
+                The transformed features of the queries in the encoder
+                output order.
+            k: int
+                The number of listings per query.
+
+        Returns:
+            Tuple[numpy.ndarray, numpy.ndarray]
+                The distances and the row indices of the listings, sorted
+                by the distance, with one row per query.
+        """
+
+        k = min(k, self.points.shape[0])
+        return self._tree.query(self.transform(encoded), k=k)
+
+    def save(self, path: str) -> None:
+        """
+        Saves the index arrays to a `.npz` file. The file is written to
+        a temporary file first and then renamed.
+
+        Params:
+            path: str
+                The path to the file.
+        """
+
+        arrays = {
+            f"category_means_{feature}": means
+            for feature, means in self.category_means.items()
+        }
+        # text columns are stored as codes of their unique values
+        for column in self.listings.columns:
+            values = self.listings[column]
+            if pd.api.types.is_numeric_dtype(values):
+                arrays[f"listings_{column}"] = values.to_numpy(np.float32)
+            else:
+                codes, uniques = pd.factorize(values.astype(str))
+                arrays[f"listings_{column}"] = codes.astype(np.int32)
+                arrays[f"listing_values_{column}"] = np.asarray(
+                    uniques, dtype=str
+                )
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.array(FORMAT_VERSION),
+                feature_names=np.array(self.feature_names, dtype=str),
+                categorical_features=np.array(
+                    list(self.category_means), dtype=str
+                ),
+                listing_columns=np.array(self.listings.columns, dtype=str),
+                default_mean=np.array(self.default_mean),
+                center=self.center,
+                scale=self.scale,
+                points=self.points,
+                prices=self.prices,
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ComparablesIndex":
+        """
+        Loads the index from a `.npz` file written by `save()`.
+
+        Params:
+            path: str
+                The path to the file.
+
+        Returns:
+            ComparablesIndex
+                The loaded index.
+
+        Raises:
+            ValueError: If the file has an unsupported format version.
+        """
+
+        with np.load(path, allow_pickle=False) as f:
+            if int(f["format_version"]) != FORMAT_VERSION:
+                raise ValueError(
+                    "Unsupported comparables format "
+                    f"{int(f['format_version'])}"
+                )
+            return cls(
+                f["feature_names"].tolist(),
+                {
+                    feature: f[f"category_means_{feature}"]
+                    for feature in f["categorical_features"].tolist()
+                },
+                float(f["default_mean"]),
+                f["center"],
+                f["scale"],
+                f["points"],
+                f["prices"],
+                pd.DataFrame(
+                    {
+                        column: f[f"listing_values_{column}"][
+                            f[f"listings_{column}"]
+                        ]
+                        if f"listing_values_{column}" in f
+                        else f[f"listings_{column}"]
+                        for column in f["listing_columns"].tolist()
+                    }
+                ),
+            )
+
+
+def _encode_categories(
+    encoded: np.ndarray,
+    feature_names: List[str],
+    category_means: Dict[str, np.ndarray],
+    default_mean: float,
+) -> np.ndarray:
+    """
+    Replaces the ordinal codes of categorical features with the mean log
+    prices of the categories, and unknown categories with the default mean.
+    """
+
+    points = np.array(encoded, dtype=np.float64)
+    for feature, means in category_means.items():
+        column = feature_names.index(feature)
+        codes = points[:, column].copy()
+        known = ~np.isnan(codes)
+        points[:, column] = default_mean
+        points[known, column] = means[codes[known].astype(np.int64)]
+    return points
+
+
+def brute_force_query(
+    points: np.ndarray, queries: np.ndarray, k: int, chunk_size: int = 256
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the k nearest points of each query by computing the distances to
+    all the points, chunk by chunk of queries.
+
+    Params:
+        points: numpy.ndarray
+            The indexed points.
+        queries: numpy.ndarray
+            The query points.
+        k: int
+            The number of points per query.
+        chunk_size: int, optional
+            The number of queries per chunk.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]
+            The distances and the indices of the nearest points, sorted by
+            the distance, with one row per query.
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    k = min(k, points.shape[0])
+    squared_norms = (points**2).sum(axis=1)
+    distances = np.empty((queries.shape[0], k))
+    indices = np.empty((queries.shape[0], k), dtype=np.int64)
+    for start in range(0, queries.shape[0], chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = queries[rows]
+        squared = (
+            squared_norms
+            - 2 * chunk @ points.T
+            + (chunk**2).sum(axis=1)[:, np.newaxis]
+        )
+        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        order = np.argsort(nearest_squared, axis=1)
+        indices[rows] = np.take_along_axis(nearest, order, axis=1)
+        distances[rows] = np.sqrt(
+            np.maximum(np.take_along_axis(nearest_squared, order, axis=1), 0)
+        )
+    return distances, indices
@@ -0,0 +1,355 @@
+"""
+The drift module profiles the training features and monitors drift of the
+features served by the API in constant memory.
+
+The reference profile is built from the cleaned training dataset by
+`build_features`:
+- numerical features are split into bins by their training quantiles, and
+  the share of training rows in each bin is kept, with a separate bin for
+  missing values,
+- categorical features keep the share of training rows of each category.
+
+The monitor keeps one count table per feature with the bins or categories
+of the profile, so its memory doesn't grow with the number of served rows.
+The quantile bins act as a fixed quantile sketch of the served values.
+Categories missing in the profile are counted as unseen, and the most
+frequent of them are tracked up to `max_unseen` names.
+
+The drift score of a feature is the Population Stability Index (PSI)
+between the training and served shares. PSI below 0.1 is usually read as
+no drift, above 0.25 as a significant one.
+
+Classes:
+--------
+1. FeatureProfile:
+    The reference profile of the training features.
+
+2. DriftMonitor:
+    Counts served feature values and calculates drift scores.
+
+Example:
+--------
+from src.features.drift import FeatureProfile, DriftMonitor
+
+profile = FeatureProfile.fit(train_features, ["room_type"], n_bins=10)
+profile.save("models/feature_profile.json")
+
+monitor = DriftMonitor(FeatureProfile.load("models/feature_profile.json"))
+monitor.update(served_features)
+print(monitor.scores())
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+# avoids infinite PSI for empty bins
+EPSILON = 1e-4
+
+
+class FeatureProfile:
+    """
+    The reference profile of the training features.
+
+    Attributes:
+        - `edges`: the inner quantile bin edges of each numerical feature.
+        - `numerical_shares`: the training share of each bin of each
+          numerical feature, the last bin is for missing values.
+        - `categories`: the categories of each categorical feature.
+        - `categorical_shares`: the training share of each category of
+          each categorical feature.
+        - `n_rows`: the number of training rows.
+    """
+
+    def __init__(
+        self,
+        edges: Dict[str, List[float]],
+        numerical_shares: Dict[str, List[float]],
+        categories: Dict[str, List[str]],
+        categorical_shares: Dict[str, List[float]],
+        n_rows: int,
+    ) -> None:
+        self.edges = {
+            k: np.asarray(v, dtype=np.float64) for k, v in edges.items()
+        }
+        self.numerical_shares = {
+            k: np.asarray(v, dtype=np.float64)
+            for k, v in numerical_shares.items()
+        }
+        self.categories = {k: list(v) for k, v in categories.items()}
+        self.categorical_shares = {
+            k: np.asarray(v, dtype=np.float64)
+            for k, v in categorical_shares.items()
+        }
+        self.n_rows = n_rows
+
+        # hash based lookups of category codes
+        self._vocabularies = {
+            k: pd.Index(v) for k, v in self.categories.items()
+        }
+
+    @classmethod
+    def fit(
+        cls, data: pd.DataFrame, categorical_features: List[str], n_bins: int
+    ) -> "FeatureProfile":
+        """
+        Builds the profile of the training features.
+
+        Params:
+            data: pandas.DataFrame
+                The cleaned training features.
+            categorical_features: List[str]
+                The names of the categorical features, the rest of the
+                columns are numerical.
+            n_bins: int
+                The number of quantile bins of numerical features.
+
+        Returns:
+            FeatureProfile
+                The fitted profile.
+        """
+
+        edges, numerical_shares = {}, {}
+        categories, categorical_shares = {}, {}
+        for column in data.columns:
+            if column in categorical_features:
+                counts = data[column].astype(str).value_counts()
+                categories[column] = counts.index.to_list()
+                categorical_shares[column] = (counts / len(data)).to_list()
+            else:
+                values = data[column].to_numpy(dtype=np.float64)
+                quantiles = np.nanquantile(
+                    values, np.linspace(0, 1, n_bins + 1)[1:-1]
+                )
+                edges[column] = np.unique(quantiles).tolist()
+                counts = _count_bins(values, np.asarray(edges[column]))
+                numerical_shares[column] = (counts / len(data)).tolist()
+        return cls(
+            edges, numerical_shares, categories, categorical_shares, len(data)
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Saves the profile to a JSON file.
+
+        Params:
+            path: str
+                The path to the profile file.
+        """
+
+        profile = {
+            "format_version": FORMAT_VERSION,
+            "n_rows": self.n_rows,
+            "edges": {k: v.tolist() for k, v in self.edges.items()},
+            "numerical_shares": {
+                k: v.tolist() for k, v in self.numerical_shares.items()
+            },
+            "categories": self.categories,
+            "categorical_shares": {
+                k: v.tolist() for k, v in self.categorical_shares.items()
+            },
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureProfile":
+        """
+        Loads the profile from a JSON file.
+
+        Params:
+            path: str
+                The path to the profile file.
+
+        Returns:
+            FeatureProfile
+                The loaded profile.
+
+        Raises:
+            ValueError: If the file has an unsupported format version.
+        """
+
+        with open(path, "r") as f:
+            profile = json.load(f)
+        if profile.pop("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported profile format of {path}")
+        return cls(**profile)
+
+    def encode(self, column: str, values: pd.Series) -> np.ndarray:
+        """
+        Returns the category codes of values of a categorical feature,
+        unseen categories are coded with -1.
+        """
+
+        return self._vocabularies[column].get_indexer(values.astype(str))
+
+
+class DriftMonitor:
+    """
+    Counts served feature values in the bins and categories of the profile
+    and calculates drift scores.
+
+    Params:
+        profile: FeatureProfile
+            The reference profile of the training features.
+        max_unseen: int
+            The maximum number of tracked unseen category names per
+            feature.
+    """
+
+    def __init__(self, profile: FeatureProfile, max_unseen: int = 100) -> None:
+        self.profile = profile
+        self.max_unseen = max_unseen
+        # updates may run in concurrent threads of the API
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops the counts of served values.
+        """
+
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        """
+        Creates empty count tables, the lock must be held.
+        """
+
+        self.n_rows = 0
+        self.numerical_counts = {
+            k: np.zeros(len(v), dtype=np.int64)
+            for k, v in self.profile.numerical_shares.items()
+        }
+        # the last count is for unseen categories
+        self.categorical_counts = {
+            k: np.zeros(len(v) + 1, dtype=np.int64)
+            for k, v in self.profile.categories.items()
+        }
+        self.unseen = {k: Counter() for k in self.profile.categories}
+
+    def update(self, data: pd.DataFrame) -> None:
+        """
+        Counts the values of a batch of served features. Columns missing
+        in the profile are ignored.
+
+        Params:
+            data: pandas.DataFrame
+                The cleaned served features.
+        """
+
+        # the counts are calculated outside of the lock
+        numerical_counts = {
+            column: _count_bins(
+                pd.to_numeric(data[column], errors="coerce").to_numpy(
+                    dtype=np.float64
+                ),
+                edges,
+            )
+            for column, edges in self.profile.edges.items()
+            if column in data
+        }
+        categorical_counts, unseen = {}, {}
+        for column, categories in self.profile.categories.items():
+            if column not in data:
+                continue
+            codes = self.profile.encode(column, data[column])
+            # unseen categories coded with -1 are moved to the last count
+            categorical_counts[column] = np.bincount(
+                np.where(codes < 0, len(categories), codes),
+                minlength=len(categories) + 1,
+            )
+            if categorical_counts[column][-1]:
+                unseen[column] = (
+                    data[column][codes < 0].astype(str).value_counts()
+                )
+
+        with self._lock:
+            for column, counts in numerical_counts.items():
+                self.numerical_counts[column] += counts
+            for column, counts in categorical_counts.items():
+                self.categorical_counts[column] += counts
+            for column, names in unseen.items():
+                self._track_unseen(column, names)
+            self.n_rows += len(data)
+
+    def scores(self) -> dict:
+        """
+        Returns the drift scores of the served features.
+
+        Returns:
+            dict
+                The number of served rows, and the PSI of each feature with
+                the share and the most frequent names of unseen categories
+                for categorical features.
+        """
+
+        with self._lock:
+            return self._scores()
+
+    def _scores(self) -> dict:
+        """
+        Calculates the drift scores, the lock must be held.
+        """
+
+        features = {}
+        for column, counts in self.numerical_counts.items():
+            features[column] = {
+                "psi": _psi(self.profile.numerical_shares[column], counts)
+            }
+        for column, counts in self.categorical_counts.items():
+            reference = np.r_[self.profile.categorical_shares[column], 0.0]
+            features[column] = {
+                "psi": _psi(reference, counts),
+                "unseen_share": float(counts[-1] / counts.sum())
+                if counts.sum()
+                else 0.0,
+                "unseen": dict(self.unseen[column].most_common(10)),
+            }
+        return {"rows": self.n_rows, "features": features}
+
+    def _track_unseen(self, column: str, names: pd.Series) -> None:
+        """
+        Adds the counts of unseen category names, new names are dropped when
+        `max_unseen` names are tracked. The lock must be held.
+        """
+
+        tracked = self.unseen[column]
+        for name, count in names.items():
+            if name in tracked or len(tracked) < self.max_unseen:
+                tracked[name] += int(count)
+
+
+def _count_bins(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Counts values in the bins between the edges, and missing values in the
+    last bin.
+    """
+
+    missing = np.isnan(values)
+    bins = np.searchsorted(edges, values[~missing], side="right")
+    counts = np.bincount(bins, minlength=len(edges) + 1)
+    return np.r_[counts, missing.sum()]
+
+
+def _psi(reference: np.ndarray, counts: np.ndarray) -> float:
+    """
+    Calculates the Population Stability Index of the served counts against
+    the reference shares.
+    """
+
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+    expected = np.maximum(reference, EPSILON)
+    actual = np.maximum(counts / total, EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
@@ -0,0 +1,281 @@
+"""
+The encoder module provides a compact, pickle-free replacement for the
+fitted scikit-learn `ColumnTransformer` used to build model features.
+
+The fitted transformer is exported to plain arrays:
+- category vocabularies of the Ordinal Encoder, one array per feature,
+- mean and scale vectors of the StandardScaler,
+- names of categorical, numerical and passthrough features, which define
+  the column order of the transformed features.
+
+The arrays are stored in a `.npz` file, which is loaded without pickle and
+does not depend on the scikit-learn version.
+
+Classes:
+--------
+1. ColumnEncoder:
+    Holds the exported arrays and transforms a dataframe with the same
+    output as the fitted `ColumnTransformer`, including `np.nan` for
+    unknown categories.
+
+Example:
+--------
+from src.features.encoder import ColumnEncoder
+
+# export a fitted column transformer
+encoder = ColumnEncoder.from_column_transformer(column_transformer)
+encoder.save("models/column_transformer.npz")
+
+# load it back and transform features
+encoder = ColumnEncoder.load("models/column_transformer.npz")
+features = encoder.transform(dataset)
+"""
+
+import os
+from typing import Any, List, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+
+FORMAT_VERSION = 1
+
+
+class ColumnEncoder:
+    """
+    Array-backed equivalent of the fitted column transformer, which
+    encodes categorical features with ordinal codes, scales numerical
+    features and passes the rest of the features through.
+
+    Attributes:
+        - `categorical_features`: names of ordinal encoded features.
+        - `categories`: category vocabulary of each categorical feature.
+        - `numerical_features`: names of scaled features.
+        - `mean`: mean of each numerical feature.
+        - `scale`: scale of each numerical feature.
+        - `passthrough_features`: names of features left as is.
+    """
+
+    def __init__(
+        self,
+        categorical_features: Sequence[str],
+        categories: Sequence[np.ndarray],
+        numerical_features: Sequence[str],
+        mean: np.ndarray,
+        scale: np.ndarray,
+        passthrough_features: Sequence[str],
+    ) -> None:
+        assert len(categorical_features) == len(categories)
+        assert len(numerical_features) == len(mean) == len(scale)
+
+        self.categorical_features = list(categorical_features)
+        self.categories = [np.asarray(_) for _ in categories]
+        self.numerical_features = list(numerical_features)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.passthrough_features = list(passthrough_features)
+
+        # hash based lookups of category codes
+        self._vocabularies = [pd.Index(_) for _ in self.categories]
+
+    @property
+    def feature_names_out(self) -> List[str]:
+        """
+        Returns names of the transformed features in the output order.
+        """
+        return (
+            self.categorical_features
+            + self.numerical_features
+            + self.passthrough_features
+        )
+
+    @classmethod
+    def from_column_transformer(
+        cls, column_transformer: ColumnTransformer
+    ) -> "ColumnEncoder":
+        """
+        Exports a fitted column transformer with `categorical`, `numerical`
+        and `numerical_as_categorical` transformers to an encoder.
+
+        Params:
+            column_transformer: sklearn.compose.ColumnTransformer
+                The fitted column transformer.
+
+        Returns:
+            ColumnEncoder
+                The encoder with the same output as the column transformer.
+
+        Raises:
+            ValueError: If the column transformer has an unexpected
+                structure or non-string categories.
+        """
+
+        transformers = {
+            name: (transformer, columns)
+            for name, transformer, columns in column_transformer.transformers_
+            if transformer != "drop"
+        }
+        expected = ["categorical", "numerical", "numerical_as_categorical"]
+        if list(transformers) != expected:
+            raise ValueError(
+                f"Expected {', '.join(expected)} transformers, "
+                f"but {', '.join(transformers)} are given"
+            )
+
+        ordinal_encoder, categorical_features = transformers["categorical"]
+        scaler, numerical_features = transformers["numerical"]
+        passthrough, passthrough_features = transformers[
+            "numerical_as_categorical"
+        ]
+        if passthrough != "passthrough":
+            raise ValueError("numerical_as_categorical must be passthrough")
+        if not np.isnan(ordinal_encoder.unknown_value):
+            raise ValueError("Only np.nan unknown value is supported")
+
+        categories = []
+        for feature, vocabulary in zip(
+            categorical_features, ordinal_encoder.categories_
+        ):
+            if not all(isinstance(_, str) for _ in vocabulary):
+                raise ValueError(f"Non-string categories of {feature}")
+            categories.append(np.asarray(vocabulary, dtype=str))
+
+        n_numerical = len(numerical_features)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_numerical)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_numerical)
+
+        return cls(
+            categorical_features,
+            categories,
+            numerical_features,
+            mean,
+            scale,
+            passthrough_features,
+        )
+
+    def transform(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Transforms features of a dataframe.
+
+        Params:
+            data: pandas.DataFrame
+                The dataframe with the features to transform.
+
+        Returns:
+            numpy.ndarray
+                The float64 array of transformed features in
+                `feature_names_out` order. Unknown categories are
+                encoded as `np.nan`.
+        """
+
+        features = np.empty(
+            (data.shape[0], len(self.feature_names_out)), dtype=np.float64
+        )
+        for i, feature in enumerate(self.feature_names_out):
+            features[:, i] = self.transform_column(feature, data[feature])
+
+        return features
+
+    def transform_column(
+        self, feature: str, values: Sequence[Any]
+    ) -> np.ndarray:
+        """
+        Transforms values of one feature, like `transform()` does for the
+        feature column.
+
+        Params:
+            feature: str
+                The name of the feature.
+            values: Sequence[Any]
+                The values to transform.
+
+        Returns:
+            numpy.ndarray
+                The float64 array of transformed values. Unknown categories
+                are encoded as `np.nan`.
+
+        Raises:
+            KeyError: If the encoder doesn't have the feature.
+        """
+
+        if feature in self.categorical_features:
+            i = self.categorical_features.index(feature)
+            codes = self._vocabularies[i].get_indexer(values)
+            return np.where(codes < 0, np.nan, codes)
+
+        values = np.asarray(values, dtype=np.float64)
+        if feature in self.numerical_features:
+            i = self.numerical_features.index(feature)
+            return (values - self.mean[i]) / self.scale[i]
+        if feature in self.passthrough_features:
+            return values
+        raise KeyError(f"Unknown feature {feature}")
+
+    def save(self, path: str) -> None:
+        """
+        Saves the encoder arrays to a `.npz` file. The file is written to
+        a temporary file first and then renamed.
+
+        Params:
+            path: str
+                The path to the file.
+        """
+
+        arrays = {
+            f"categories_{i}": vocabulary
+            for i, vocabulary in enumerate(self.categories)
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.array(FORMAT_VERSION),
+                categorical_features=np.array(
+                    self.categorical_features, dtype=str
+                ),
+                numerical_features=np.array(
+                    self.numerical_features, dtype=str
+                ),
+                passthrough_features=np.array(
+                    self.passthrough_features, dtype=str
+                ),
+                mean=self.mean,
+                scale=self.scale,
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnEncoder":
+        """
+        Loads the encoder from a `.npz` file written by `save()`.
+
+        Params:
+            path: str
+                The path to the file.
+
+        Returns:
+            ColumnEncoder
+                The loaded encoder.
+
+        Raises:
+            ValueError: If the file has an unsupported format version.
+        """
+
+        with np.load(path, allow_pickle=False) as f:
+            if int(f["format_version"]) != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported encoder format {int(f['format_version'])}"
+                )
+            categorical_features = f["categorical_features"].tolist()
+            return cls(
+                categorical_features,
+                [
+                    f[f"categories_{i}"]
+                    for i in range(len(categorical_features))
+                ],
+                f["numerical_features"].tolist(),
+                f["mean"],
+                f["scale"],
+                f["passthrough_features"].tolist(),
+            )
@@ -0,0 +1,109 @@
+"""
+The accumulators module calculates the model metrics over a stream of
+chunks in constant memory.
+
+The accumulator keeps running sums of the absolute, squared and relative
+price errors for MAE, RMSE and MAPE, and the count, mean and sum of squared
+deviations of the transformed target with the residual sum of squares for
+R2. The target mean and deviations are merged chunk by chunk with the
+parallel variance formula, so R2 doesn't suffer from the cancellation of
+the raw sum of squares. The result matches the metrics of `test_model`
+calculated in memory up to floating point rounding.
+
+Classes:
+--------
+1. MetricAccumulator:
+    Accumulates the R2, MAE, MAPE and RMSE metrics over chunks of the
+    target and predictions.
+
+Example:
+--------
+from src.models.accumulators import MetricAccumulator
+
+accumulator = MetricAccumulator()
+for features, target in chunks:
+    accumulator.update(target, model.predict(features))
+metrics = accumulator.result()
+"""
+
+import numpy as np
+
+from src.features.functions import restore_target
+
+
+class MetricAccumulator:
+    """
+    Accumulates the R2 metric on the transformed target, and the MAE,
+    MAPE and RMSE metrics on the restored price, over chunks.
+
+    Attributes:
+        - `count`: the number of accumulated rows.
+        - `mean`: the mean of the transformed target.
+        - `m2`: the sum of squared deviations of the transformed target.
+        - `ss_res`: the residual sum of squares of the transformed target.
+        - `sum_ae`, `sum_ape`, `sum_se`: the sums of absolute, absolute
+          percentage and squared errors of the price.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ss_res = 0.0
+        self.sum_ae = 0.0
+        self.sum_ape = 0.0
+        self.sum_se = 0.0
+
+    def update(self, target: np.ndarray, preds: np.ndarray) -> None:
+        """
+        Adds a chunk of the target and predictions.
+
+        Params:
+            target: numpy.ndarray
+                The transformed target of the chunk.
+            preds: numpy.ndarray
+                The predictions of the transformed target of the chunk.
+        """
+
+        target = np.asarray(target, dtype=np.float64)
+        preds = np.asarray(preds, dtype=np.float64)
+        n = target.shape[0]
+        if n == 0:
+            return
+
+        mean = target.mean()
+        m2 = np.square(target - mean).sum()
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta**2 * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.ss_res += np.square(target - preds).sum()
+
+        price = restore_target(target)
+        error = np.abs(price - restore_target(preds))
+        self.sum_ae += error.sum()
+        self.sum_ape += (error / np.abs(price)).sum()
+        self.sum_se += np.square(error).sum()
+
+    def result(self) -> dict:
+        """
+        Returns the metrics of the accumulated rows.
+
+        Returns:
+            dict
+                The R2, MAE, MAPE and RMSE metrics.
+
+        Raises:
+            ValueError: If no rows were accumulated.
+        """
+
+        if self.count == 0:
+            raise ValueError("No rows to calculate metrics")
+
+        return {
+            "r2": 1 - self.ss_res / self.m2,
+            "mae": self.sum_ae / self.count,
+            "mape": self.sum_ape / self.count,
+            "rmse": (self.sum_se / self.count) ** 0.5,
+        }
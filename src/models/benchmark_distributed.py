@@ -0,0 +1,130 @@
+"""
+This module provides a command-line interface for benchmarking scaling of
+the data parallel training of `train_model.py --workers` with the number
+of local worker processes.
+
+A synthetic regression dataset with the number of rows and features set in
+the `distributed.benchmark` section of params.yaml is generated with the
+project random seed. A model is trained on it with 1 to `max_workers`
+workers with the training parameters of the project and the benchmark
+learning rate. The training time, the speedup over one worker and the R2
+on the dataset are logged and saved to a CSV file in the report path.
+
+Usage:
+    $ python benchmark_distributed.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.models.distributed import train_distributed
+from src.models.functions import get_model_params
+import logging
+import time
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score
+
+
+def make_dataset(
+    n_rows: int, n_features: int, seed: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a synthetic regression dataset with a non-linear target.
+
+    Params:
+        n_rows: int
+            The number of rows.
+        n_features: int
+            The number of features.
+        seed: int
+            The random seed.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]
+            The float32 features and target.
+    """
+
+    rng = np.random.default_rng(seed)
+    features = rng.random((n_rows, n_features), dtype=np.float32)
+    weights = rng.normal(size=n_features).astype(np.float32)
+    target = (
+        features @ weights
+        + np.sin(6 * features[:, 0])
+        + rng.normal(scale=0.1, size=n_rows).astype(np.float32)
+    )
+    return features, target.astype(np.float32)
+
+
+@click.command()
+def main() -> None:
+    """
+    Benchmarks data parallel training with 1 to `max_workers` local workers
+    and saves the report to a CSV file.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    benchmark = params["distributed"]["benchmark"]
+    scaling_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["scaling_file"],
+    )
+
+    features, target = make_dataset(
+        benchmark["n_rows"], benchmark["n_features"], params["random_seed"]
+    )
+    feature_names = [f"feature_{_}" for _ in range(features.shape[1])]
+    logger.info(
+        f"Generated {features.shape[0]} rows with {features.shape[1]} features"
+    )
+
+    model_params = {
+        **get_model_params(params),
+        "learning_rate": benchmark["learning_rate"],
+        "verbose": -1,
+    }
+    records = []
+    for n_workers in range(1, benchmark["max_workers"] + 1):
+        start = time.perf_counter()
+        booster = train_distributed(
+            features,
+            target,
+            model_params,
+            benchmark["num_boost_round"],
+            n_workers,
+            feature_names,
+            [],
+            params["distributed"]["time_out"],
+        )
+        seconds = time.perf_counter() - start
+        records.append(
+            {
+                "n_workers": n_workers,
+                "seconds": seconds,
+                "speedup": records[0]["seconds"] / seconds if records else 1.0,
+                "r2": r2_score(target, booster.predict(features)),
+            }
+        )
+        logger.info(
+            f"{n_workers:>3} workers: {seconds:>8.2f} s, "
+            f"speedup {records[-1]['speedup']:>5.2f}, "
+            f"R2 {records[-1]['r2']:>7.4f}"
+        )
+
+    pd.DataFrame(records).to_csv(scaling_path, index=False)
+    logger.info(f"Saved scaling report to {scaling_path}")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
@@ -0,0 +1,106 @@
+"""
+This module provides a command-line interface for benchmarking prediction
+latency of the trained model served in different ways:
+
+- `single_fold`: the first fold booster only,
+- `fold_ensemble`: all fold boosters, one `predict` call per fold and
+  averaging of the predictions,
+- `merged`: the merged booster averaging all folds in one call.
+
+The fold boosters are loaded from the fold artifact written by
+`train_model`. Batches of the sizes set in the `latency` section of
+params.yaml are sampled from the test dataset features. The latency report
+with the maximum absolute difference from the fold ensemble predictions is
+logged and saved to a CSV file in the report path.
+
+Usage:
+    $ python benchmark_model.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.data.datatypes import DatasetStage
+from src.models.ensemble import load_ensemble, merge_boosters
+from src.models.functions import load_features, measure_latency
+import logging
+import numpy as np
+import pandas as pd
+
+
+@click.command()
+def main() -> None:
+    """
+    Benchmarks prediction latency of a single fold, the fold ensemble and
+    the merged booster, and saves the report to a CSV file.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    folds_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["folds_file"],
+    )
+    latency_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["latency_file"],
+    )
+
+    boosters, metadata = load_ensemble(folds_path)
+    logger.info(
+        f"Loaded {metadata['n_folds']} fold boosters with "
+        f"{metadata['best_iteration']} iterations from {folds_path}"
+    )
+    merged = merge_boosters(boosters)
+
+    models = {
+        "single_fold": boosters[0].predict,
+        "fold_ensemble": lambda X: np.mean(
+            [_.predict(X) for _ in boosters], axis=0
+        ),
+        "merged": merged.predict,
+    }
+
+    features, _ = load_features(params, DatasetStage.TEST, logger)
+    rng = np.random.default_rng(params["random_seed"])
+
+    records = []
+    for batch_size in params["latency"]["batch_sizes"]:
+        batch = np.asarray(
+            features[rng.integers(0, features.shape[0], batch_size)]
+        )
+        reference = models["fold_ensemble"](batch)
+        for name, predict in models.items():
+            latency = measure_latency(
+                predict, batch, params["latency"]["repeats"]
+            )
+            records.append(
+                {
+                    "model": name,
+                    "batch_size": batch_size,
+                    **latency,
+                    "max_abs_diff": np.abs(predict(batch) - reference).max(),
+                }
+            )
+            logger.info(
+                f"{name:<14} batch {batch_size:>6}: "
+                f"median {latency['median_ms']:>9.3f} ms, "
+                f"p99 {latency['p99_ms']:>9.3f} ms, "
+                f"{latency['per_row_us']:>9.3f} us per row"
+            )
+
+    pd.DataFrame(records).to_csv(latency_path, index=False)
+    logger.info(f"Saved latency report to {latency_path}")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
@@ -0,0 +1,273 @@
+"""
+The bootstrap module estimates confidence intervals of the model metrics and
+compares two models on the same bootstrap resamples.
+
+The resamples are drawn chunk by chunk as matrices of row indices, one row
+per resample, with a random generator seeded by the seed and the chunk
+number, so only one chunk of indices is held in memory and the same seed
+and chunk size give the same resamples. The metrics of a chunk of
+resamples are calculated in one vectorized pass over the gathered target
+and prediction matrices, so no Python loop runs per resample. The metrics
+are the ones of `test_model`: R2 on the transformed target, MAE, MAPE and
+RMSE on the restored price.
+
+Paired comparison evaluates both models on every chunk of indices, so the
+differences of their metrics are measured on exactly the same rows in each
+resample, and the sampling noise shared by both models cancels out.
+
+Functions:
+----------
+1. iter_resample_indices(n_rows: int, n_resamples: int, seed: int,
+                         chunk_size: int = 100) -> Iterator[np.ndarray]:
+    Draws the bootstrap resamples as matrices of row indices by chunks.
+
+2. resample_metrics(target: np.ndarray, preds: np.ndarray,
+                    indices: np.ndarray) -> pd.DataFrame:
+    Calculates the metrics of the resamples of an index matrix.
+
+3. bootstrap_metrics(target: np.ndarray, preds: np.ndarray,
+                     n_resamples: int, seed: int, chunk_size: int = 100)
+        -> pd.DataFrame:
+    Calculates the metrics of every resample.
+
+4. confidence_intervals(samples: pd.DataFrame, confidence: float)
+        -> pd.DataFrame:
+    Calculates percentile confidence intervals of the metrics.
+
+5. compare_models(target: np.ndarray, preds: np.ndarray,
+                  other_preds: np.ndarray, n_resamples: int, seed: int,
+                  confidence: float, chunk_size: int = 100)
+        -> pd.DataFrame:
+    Compares the metrics of two models on the same resamples.
+
+Example:
+--------
+from src.models.bootstrap import bootstrap_metrics, confidence_intervals
+
+samples = bootstrap_metrics(target, model.predict(features), 1000, 230213)
+print(confidence_intervals(samples, 0.95))
+"""
+
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.features.functions import restore_target
+
+METRICS = ["r2", "mae", "mape", "rmse"]
+HIGHER_BETTER = {"r2": True, "mae": False, "mape": False, "rmse": False}
+
+# the transformed target and predictions and the restored prices
+Prepared = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def iter_resample_indices(
+    n_rows: int, n_resamples: int, seed: int, chunk_size: int = 100
+) -> Iterator[np.ndarray]:
+    """
+    Draws bootstrap resamples with replacement as matrices of row indices,
+    chunk by chunk. Each chunk is drawn with a random generator seeded by
+    the seed and the chunk number.
+
+    Params:
+        n_rows: int
+            The number of rows in the dataset.
+        n_resamples: int
+            The number of resamples.
+        seed: int
+            The random seed.
+        chunk_size: int
+            The number of resamples in a chunk, which limits the memory to
+            `chunk_size * n_rows` indices.
+
+    Yields:
+        numpy.ndarray
+            The int32 matrices of shape (chunk_size, n_rows), the last one
+            with the remaining resamples.
+    """
+
+    for i, start in enumerate(range(0, n_resamples, chunk_size)):
+        rng = np.random.default_rng([seed, i])
+        yield rng.integers(
+            0,
+            n_rows,
+            (min(chunk_size, n_resamples - start), n_rows),
+            dtype=np.int32,
+        )
+
+
+def _prepare(target: np.ndarray, preds: np.ndarray) -> Prepared:
+    """
+    Returns the float64 target and predictions with their restored prices.
+    """
+
+    target = np.asarray(target, dtype=np.float64)
+    preds = np.asarray(preds, dtype=np.float64)
+    return target, preds, restore_target(target), restore_target(preds)
+
+
+def _get_metrics(prepared: Prepared, indices: np.ndarray) -> np.ndarray:
+    """
+    Calculates the metrics of the resamples of an index matrix in one
+    vectorized pass.
+    """
+
+    target, preds, price, price_preds = prepared
+    y, p = target[indices], preds[indices]
+    y_price, p_price = price[indices], price_preds[indices]
+
+    ss_res = np.square(y - p).sum(axis=1)
+    ss_tot = np.square(y - y.mean(axis=1, keepdims=True)).sum(axis=1)
+    error = np.abs(y_price - p_price)
+    return np.column_stack(
+        [
+            1 - ss_res / ss_tot,
+            error.mean(axis=1),
+            (error / np.abs(y_price)).mean(axis=1),
+            np.sqrt(np.square(error).mean(axis=1)),
+        ]
+    )
+
+
+def resample_metrics(
+    target: np.ndarray, preds: np.ndarray, indices: np.ndarray
+) -> pd.DataFrame:
+    """
+    Calculates the R2, MAE, MAPE and RMSE metrics of the resamples of an
+    index matrix.
+
+    Params:
+        target: numpy.ndarray
+            The transformed target.
+        preds: numpy.ndarray
+            The predictions of the transformed target.
+        indices: numpy.ndarray
+            The resample index matrix, one row per resample.
+
+    Returns:
+        pandas.DataFrame
+            The metrics with one row per resample.
+    """
+
+    return pd.DataFrame(
+        _get_metrics(_prepare(target, preds), indices), columns=METRICS
+    )
+
+
+def bootstrap_metrics(
+    target: np.ndarray,
+    preds: np.ndarray,
+    n_resamples: int,
+    seed: int,
+    chunk_size: int = 100,
+) -> pd.DataFrame:
+    """
+    Calculates the R2, MAE, MAPE and RMSE metrics of every resample.
+
+    Params:
+        target: numpy.ndarray
+            The transformed target.
+        preds: numpy.ndarray
+            The predictions of the transformed target.
+        n_resamples: int
+            The number of resamples.
+        seed: int
+            The random seed of the resamples.
+        chunk_size: int
+            The number of resamples drawn and processed in one pass, which
+            limits the memory of the indices and the gathered matrices.
+
+    Returns:
+        pandas.DataFrame
+            The metrics with one row per resample.
+    """
+
+    prepared = _prepare(target, preds)
+    chunks = [
+        _get_metrics(prepared, _)
+        for _ in iter_resample_indices(
+            len(prepared[0]), n_resamples, seed, chunk_size
+        )
+    ]
+    return pd.DataFrame(np.vstack(chunks), columns=METRICS)
+
+
+def confidence_intervals(
+    samples: pd.DataFrame, confidence: float
+) -> pd.DataFrame:
+    """
+    Calculates percentile confidence intervals of bootstrap samples.
+
+    Params:
+        samples: pandas.DataFrame
+            The bootstrap samples with one column per metric.
+        confidence: float
+            The confidence level, for example 0.95.
+
+    Returns:
+        pandas.DataFrame
+            The mean, lower and upper bounds indexed by metric.
+    """
+
+    alpha = (1 - confidence) / 2
+    return pd.DataFrame(
+        {
+            "mean": samples.mean(),
+            "low": samples.quantile(alpha),
+            "high": samples.quantile(1 - alpha),
+        }
+    )
+
+
+def compare_models(
+    target: np.ndarray,
+    preds: np.ndarray,
+    other_preds: np.ndarray,
+    n_resamples: int,
+    seed: int,
+    confidence: float,
+    chunk_size: int = 100,
+) -> pd.DataFrame:
+    """
+    Compares the metrics of two models on the same bootstrap resamples.
+    Each chunk of resamples is drawn once and evaluated for both models.
+
+    Params:
+        target: numpy.ndarray
+            The transformed target.
+        preds: numpy.ndarray
+            The predictions of the first model.
+        other_preds: numpy.ndarray
+            The predictions of the second model.
+        n_resamples: int
+            The number of resamples.
+        seed: int
+            The random seed of the resamples.
+        confidence: float
+            The confidence level of the intervals.
+        chunk_size: int
+            The number of resamples processed in one pass.
+
+    Returns:
+        pandas.DataFrame
+            The mean and confidence interval of the metric difference
+            (second model minus first) and the share of resamples where
+            the second model is better, indexed by metric.
+    """
+
+    prepared = _prepare(target, preds)
+    other_prepared = _prepare(target, other_preds)
+    chunks = [
+        _get_metrics(other_prepared, _) - _get_metrics(prepared, _)
+        for _ in iter_resample_indices(
+            len(prepared[0]), n_resamples, seed, chunk_size
+        )
+    ]
+    diff = pd.DataFrame(np.vstack(chunks), columns=METRICS)
+    comparison = confidence_intervals(diff, confidence)
+    comparison["better_share"] = [
+        (diff[_] > 0).mean() if HIGHER_BETTER[_] else (diff[_] < 0).mean()
+        for _ in comparison.index
+    ]
+    return comparison
@@ -0,0 +1,184 @@
+"""
+This module provides a command-line interface for compacting the trained
+model into a smaller and faster serving model.
+
+The candidates are built from the fold boosters of the fold artifact
+written by `train_model`:
+
+- `full`: the merged booster with all the iterations, the reference,
+- `truncated_<fraction>`: the merged booster truncated to a fraction of
+  the best iteration,
+- `distilled_<rounds>`: a single booster trained with a higher learning
+  rate and fewer rounds on the predictions of the full model.
+
+The fractions, learning rates and rounds are set in the `compaction`
+section of params.yaml. Each candidate is evaluated on the test dataset
+with the metrics of `test_model`, and its latency per row is measured on
+a batch of `latency_batch_size` rows. The trade-off report is saved to
+a CSV file in the report path.
+
+The fastest candidate with R2 not lower than the R2 of the full model minus
+`max_r2_loss` is saved to the compact model file, as a separate serving
+artifact. The model file served by default is not changed.
+
+Usage:
+    $ python compact_model.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.data.datatypes import DatasetStage
+from src.models.ensemble import load_ensemble, merge_boosters
+from src.models.functions import (
+    get_model_params,
+    load_features,
+    measure_latency,
+    save_model,
+)
+from src.models.test_model import evaluate_model
+import logging
+from typing import List
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+
+def select_compact_model(records: List[dict], max_r2_loss: float) -> dict:
+    """
+    Selects the fastest candidate model, which R2 is not lower than the R2
+    of the full model minus the allowed loss.
+
+    Params:
+        records: List[dict]
+            The candidate reports with the `model`, `r2` and `per_row_us`
+            keys. The full model is named `full`.
+        max_r2_loss: float
+            The allowed absolute loss of R2.
+
+    Returns:
+        dict
+            The report of the selected candidate.
+    """
+
+    full = next(_ for _ in records if _["model"] == "full")
+    accepted = [_ for _ in records if _["r2"] >= full["r2"] - max_r2_loss]
+    return min(accepted, key=lambda _: (_["per_row_us"], _["num_trees"]))
+
+
+@click.command()
+def main() -> None:
+    """
+    Builds truncated and distilled candidates of the trained model,
+    reports their accuracy and latency, and saves the selected compact
+    model.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    compaction = params["compaction"]
+    folds_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["folds_file"],
+    )
+    compact_model_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["compact_model_file"],
+    )
+    compaction_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["compaction_file"],
+    )
+
+    boosters, metadata = load_ensemble(folds_path)
+    best_iteration = metadata["best_iteration"]
+    logger.info(
+        f"Loaded {metadata['n_folds']} fold boosters with "
+        f"{best_iteration} iterations from {folds_path}"
+    )
+
+    full = merge_boosters(boosters, best_iteration)
+    models = {"full": full}
+    for fraction in compaction["truncate_fractions"]:
+        num_iteration = max(1, int(best_iteration * fraction))
+        models[f"truncated_{fraction}"] = merge_boosters(
+            boosters, num_iteration
+        )
+
+    # the student models learn the full model predictions, which are
+    # smoother than the target and don't need cross-validation
+    features, _ = load_features(params, DatasetStage.TRAIN, logger)
+    dataset = lgb.Dataset(
+        features,
+        label=full.predict(features),
+        feature_name=params["data"]["features"],
+        categorical_feature=params["model"]["categorical_features"],
+        free_raw_data=False,
+    )
+    model_params = {**get_model_params(params), **metadata["params"]}
+    for setting in compaction["distillation"]:
+        name = f"distilled_{setting['num_boost_round']}"
+        logger.info(
+            f"Distill {name} with learning rate {setting['learning_rate']}"
+        )
+        models[name] = lgb.train(
+            {**model_params, "learning_rate": setting["learning_rate"]},
+            dataset,
+            num_boost_round=setting["num_boost_round"],
+        )
+
+    test_features, test_target = load_features(
+        params, DatasetStage.TEST, logger
+    )
+    rng = np.random.default_rng(params["random_seed"])
+    batch = np.asarray(
+        test_features[
+            rng.integers(
+                0, test_features.shape[0], compaction["latency_batch_size"]
+            )
+        ]
+    )
+
+    records = []
+    for name, model in models.items():
+        metrics = evaluate_model(model, test_features, test_target)
+        latency = measure_latency(
+            model.predict, batch, params["latency"]["repeats"]
+        )
+        records.append(
+            {
+                "model": name,
+                "num_trees": model.num_trees(),
+                **metrics,
+                **latency,
+            }
+        )
+        logger.info(
+            f"{name:<16} {model.num_trees():>6} trees: "
+            f"R2 {metrics['r2']:>7.4f}, MAE {metrics['mae']:>8.4f}, "
+            f"MAPE {metrics['mape']:>7.4f}, "
+            f"{latency['per_row_us']:>9.3f} us per row"
+        )
+
+    pd.DataFrame(records).to_csv(compaction_path, index=False)
+    logger.info(f"Saved compaction report to {compaction_path}")
+
+    selected = select_compact_model(records, compaction["max_r2_loss"])
+    save_model(models[selected["model"]], compact_model_path)
+    logger.info(
+        f"Saved {selected['model']} model with {selected['num_trees']} "
+        f"trees to {compact_model_path}"
+    )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
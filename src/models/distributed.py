@@ -0,0 +1,289 @@
+"""
+The distributed module trains a LightGBM model with data parallel learning
+across local worker processes.
+
+The training data is split into contiguous shards, one per worker. Every
+worker constructs a dataset from its shard and joins the other workers over
+sockets on localhost, with `machines`, `num_machines` and
+`local_listen_port` LightGBM parameters. The workers find the feature bins
+together and exchange histograms on every iteration, so they all end up with
+the same model, which is returned by the first worker.
+
+The ports of the workers are free when they are chosen, but another process
+may take one before a worker binds it. Then all the workers are stopped
+and training is retried with new ports. With a validation set, every
+worker evaluates the same validation rows, so the metrics of all the
+workers are equal and early stopping stops them at the same iteration.
+
+Functions:
+----------
+1. get_shards(n_rows: int, n_workers: int) -> List[slice]:
+    Splits rows into contiguous shards of nearly equal size.
+
+2. train_distributed(features: np.ndarray, target: np.ndarray,
+                     model_params: dict, num_boost_round: int,
+                     n_workers: int, feature_names: List[str],
+                     categorical_features: List[str],
+                     time_out: int = 10,
+                     valid_features: Optional[np.ndarray] = None,
+                     valid_target: Optional[np.ndarray] = None,
+                     early_stopping_rounds: Optional[int] = None)
+        -> lgb.Booster:
+    Trains a model with data parallel learning in local worker processes.
+
+Example:
+--------
+from src.models.distributed import train_distributed
+
+booster = train_distributed(
+    features, target, model_params, 1000, 4, feature_names, []
+)
+booster.save_model("models/lgbm_regressor.txt")
+"""
+
+import multiprocessing
+import queue
+import socket
+from contextlib import ExitStack
+from typing import List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+
+from src.utils.threads import get_available_cpus
+
+# attempts to start the workers on free ports
+BIND_ATTEMPTS = 3
+# the error of a worker, which can't listen on its port
+BIND_ERROR = "Binding port"
+
+
+def get_shards(n_rows: int, n_workers: int) -> List[slice]:
+    """
+    Splits rows into contiguous shards of nearly equal size.
+
+    Params:
+        n_rows: int
+            The number of rows.
+        n_workers: int
+            The number of shards.
+
+    Returns:
+        List[slice]
+            The row slices of the shards.
+
+    Raises:
+        ValueError: If there are fewer rows than workers.
+    """
+
+    if n_rows < n_workers:
+        raise ValueError(f"Can't split {n_rows} rows on {n_workers} workers")
+
+    bounds = np.linspace(0, n_rows, n_workers + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+
+def train_distributed(
+    features: np.ndarray,
+    target: np.ndarray,
+    model_params: dict,
+    num_boost_round: int,
+    n_workers: int,
+    feature_names: List[str],
+    categorical_features: List[str],
+    time_out: int = 10,
+    valid_features: Optional[np.ndarray] = None,
+    valid_target: Optional[np.ndarray] = None,
+    early_stopping_rounds: Optional[int] = None,
+) -> lgb.Booster:
+    """
+    Trains a LightGBM model with data parallel learning in local worker
+    processes. The CPU cores are shared evenly between the workers.
+
+    Params:
+        features: numpy.ndarray
+            The training features.
+        target: numpy.ndarray
+            The training target.
+        model_params: dict
+            The LightGBM training parameters.
+        num_boost_round: int
+            The number of boosting rounds.
+        n_workers: int
+            The number of worker processes. With one worker the model is
+            trained without the network.
+        feature_names: List[str]
+            The names of the features columns.
+        categorical_features: List[str]
+            The names of the categorical features.
+        time_out: int
+            The socket time out of the workers in minutes.
+        valid_features: numpy.ndarray, optional
+            The validation features, evaluated by every worker.
+        valid_target: numpy.ndarray, optional
+            The validation target.
+        early_stopping_rounds: int, optional
+            The rounds without improvement of the validation metric, after
+            which training stops. The model keeps the best iteration.
+
+    Returns:
+        lightgbm.Booster
+            The trained model.
+
+    Raises:
+        lightgbm.basic.LightGBMError: If a worker fails, or the workers
+            can't listen on free ports in `BIND_ATTEMPTS` attempts.
+    """
+
+    num_threads = max(1, get_available_cpus() // n_workers)
+    params = {**model_params, "num_threads": num_threads}
+    shards = [
+        (np.ascontiguousarray(features[_]), np.ascontiguousarray(target[_]))
+        for _ in get_shards(features.shape[0], n_workers)
+    ]
+    valid = (
+        (
+            np.ascontiguousarray(valid_features),
+            np.ascontiguousarray(valid_target),
+        )
+        if valid_features is not None
+        else None
+    )
+
+    for attempt in range(1, BIND_ATTEMPTS + 1):
+        ports = _get_free_ports(n_workers)
+        if n_workers > 1:
+            params.update(
+                {
+                    "tree_learner": "data",
+                    "num_machines": n_workers,
+                    "machines": ",".join(f"127.0.0.1:{_}" for _ in ports),
+                    "time_out": time_out,
+                    "pre_partition": True,
+                }
+            )
+        try:
+            model_string = _run_workers(
+                [
+                    (
+                        shard,
+                        {**params, "local_listen_port": port},
+                        num_boost_round,
+                        feature_names,
+                        categorical_features,
+                        valid,
+                        early_stopping_rounds,
+                    )
+                    for shard, port in zip(shards, ports)
+                ]
+            )
+        except lgb.basic.LightGBMError as e:
+            # another process took a port after it was chosen
+            if BIND_ERROR not in str(e) or attempt == BIND_ATTEMPTS:
+                raise
+            continue
+        return lgb.Booster(model_str=model_string)
+
+
+def _run_workers(worker_args: List[tuple]) -> str:
+    """
+    Runs a worker process per arguments of `_train_worker` and returns the
+    model string of the first worker. When a worker fails, all the workers
+    are stopped, as the others would wait for it until the time out.
+
+    Raises:
+        lightgbm.basic.LightGBMError: If a worker fails.
+    """
+
+    # workers are spawned, as forked OpenMP runtimes may dead lock
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_train_worker, args=(rank, results, *args))
+        for rank, args in enumerate(worker_args)
+    ]
+    for process in processes:
+        process.start()
+
+    model_strings = {}
+    try:
+        while len(model_strings) < len(processes):
+            try:
+                rank, model_string, error = results.get(timeout=1)
+            except queue.Empty:
+                if any(_.exitcode not in (None, 0) for _ in processes):
+                    raise lgb.basic.LightGBMError(
+                        "A worker process terminated abruptly"
+                    )
+                continue
+            if error is not None:
+                raise lgb.basic.LightGBMError(f"Worker {rank}: {error}")
+            model_strings[rank] = model_string
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    return model_strings[0]
+
+
+def _train_worker(
+    rank: int,
+    results: multiprocessing.Queue,
+    shard: Tuple[np.ndarray, np.ndarray],
+    params: dict,
+    num_boost_round: int,
+    feature_names: List[str],
+    categorical_features: List[str],
+    valid: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    early_stopping_rounds: Optional[int] = None,
+) -> None:
+    """
+    Trains the model on a shard in a worker process and puts its rank with
+    the model string, up to the best iteration with early stopping, or the
+    error to the results.
+    """
+
+    try:
+        dataset = lgb.Dataset(
+            shard[0],
+            label=shard[1],
+            feature_name=feature_names,
+            categorical_feature=categorical_features,
+        )
+        valid_sets, callbacks = [], []
+        if valid is not None:
+            valid_sets.append(
+                lgb.Dataset(valid[0], label=valid[1], reference=dataset)
+            )
+            if early_stopping_rounds:
+                callbacks.append(
+                    lgb.early_stopping(early_stopping_rounds, verbose=False)
+                )
+        booster = lgb.train(
+            params,
+            dataset,
+            num_boost_round=num_boost_round,
+            valid_sets=valid_sets,
+            valid_names=["valid"] if valid_sets else None,
+            callbacks=callbacks,
+        )
+    except Exception as e:
+        results.put((rank, None, str(e)))
+        return
+    results.put((rank, booster.model_to_string(), None))
+
+
+def _get_free_ports(n: int) -> List[int]:
+    """
+    Returns free TCP ports on localhost for the workers to listen.
+    """
+
+    with ExitStack() as stack:
+        sockets = [
+            stack.enter_context(socket.socket(socket.AF_INET))
+            for _ in range(n)
+        ]
+        for s in sockets:
+            s.bind(("127.0.0.1", 0))
+        return [s.getsockname()[1] for s in sockets]
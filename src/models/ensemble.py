@@ -0,0 +1,181 @@
+"""
+The ensemble module stores all fold boosters of a cross-validated LightGBM
+model and merges them into a single booster, which predicts the average of
+the folds in one call.
+
+A fold artifact is a JSON file with the model strings of all fold boosters
+and metadata: the number of folds, the best iteration, feature names,
+training parameters and the cross-validation score.
+
+The merged booster contains the trees of all folds with leaf values scaled
+by `1 / n_folds`. As the prediction of a regression booster is the sum of
+its tree outputs (the initial score is folded into the first tree), the
+merged booster predicts the mean of the fold predictions up to floating
+point rounding.
+
+Functions:
+----------
+1. save_ensemble(boosters: List[lgb.Booster], path: str, metadata: dict,
+                 num_iteration: Optional[int] = None) -> None:
+    Saves fold boosters and metadata to a fold artifact.
+
+2. load_ensemble(path: str) -> Tuple[List[lgb.Booster], dict]:
+    Loads fold boosters and metadata from a fold artifact.
+
+3. merge_boosters(boosters: List[lgb.Booster],
+                  num_iteration: Optional[int] = None) -> lgb.Booster:
+    Merges fold boosters into a single averaging booster.
+
+Example:
+--------
+from src.models.ensemble import save_ensemble, merge_boosters
+
+best_iteration = cvbooster.best_iteration
+save_ensemble(
+    cvbooster.boosters, "models/lgbm_regressor_folds.json", {}, best_iteration
+)
+merged = merge_boosters(cvbooster.boosters, best_iteration)
+merged.save_model("models/lgbm_regressor.txt")
+"""
+
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+import lightgbm as lgb
+
+FORMAT_VERSION = 1
+
+# per node lines, which are summed up to the prediction
+_SCALED_LINES = ("leaf_value=", "internal_value=")
+
+
+def save_ensemble(
+    boosters: List[lgb.Booster],
+    path: str,
+    metadata: dict,
+    num_iteration: Optional[int] = None,
+) -> None:
+    """
+    Saves fold boosters and metadata to a fold artifact. The file is written
+    to a temporary file first and then renamed.
+
+    Params:
+        boosters: List[lightgbm.Booster]
+            The fold boosters.
+        path: str
+            The path to the fold artifact.
+        metadata: dict
+            JSON serializable metadata of the ensemble.
+        num_iteration: int, optional
+            The number of iterations of each fold to save. By default,
+            the best iteration of each booster is used.
+    """
+
+    artifact = {
+        "format_version": FORMAT_VERSION,
+        "metadata": {**metadata, "n_folds": len(boosters)},
+        "folds": [
+            _.model_to_string(num_iteration=num_iteration) for _ in boosters
+        ],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(artifact, f)
+    os.replace(tmp_path, path)
+
+
+def load_ensemble(path: str) -> Tuple[List[lgb.Booster], dict]:
+    """
+    Loads fold boosters and metadata from a fold artifact.
+
+    Params:
+        path: str
+            The path to the fold artifact.
+
+    Returns:
+        Tuple[List[lightgbm.Booster], dict]
+            The fold boosters and the metadata.
+
+    Raises:
+        ValueError: If the artifact has an unsupported format version.
+    """
+
+    with open(path, "r") as f:
+        artifact = json.load(f)
+    if artifact["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported ensemble format {artifact['format_version']}"
+        )
+    boosters = [lgb.Booster(model_str=_) for _ in artifact["folds"]]
+    return boosters, artifact["metadata"]
+
+
+def merge_boosters(
+    boosters: List[lgb.Booster], num_iteration: Optional[int] = None
+) -> lgb.Booster:
+    """
+    Merges fold boosters into a single booster, which predicts the average
+    of the fold predictions.
+
+    Params:
+        boosters: List[lightgbm.Booster]
+            The fold boosters of a regression model.
+        num_iteration: int, optional
+            The number of iterations of each fold to merge. By default,
+            the best iteration of each booster is used.
+
+    Returns:
+        lightgbm.Booster
+            The merged booster.
+
+    Raises:
+        ValueError: If the boosters have linear trees or more than one
+            tree per iteration.
+    """
+
+    weight = 1.0 / len(boosters)
+    header, footer = None, None
+    trees = []
+    for booster in boosters:
+        model = booster.model_to_string(num_iteration=num_iteration)
+        head, body = model.split("\nTree=", 1)
+        body, tail = body.split("\nend of trees", 1)
+        if "num_tree_per_iteration=1\n" not in head:
+            raise ValueError("Only one tree per iteration is supported")
+        if header is None:
+            # tree sizes are optional and don't match merged trees
+            header = re.sub(r"(?m)^tree_sizes=.*\n", "", head)
+            footer = tail
+        for tree in ("Tree=" + body).split("\n\n\n"):
+            if tree.strip():
+                trees.append(_scale_tree(tree.strip("\n"), weight))
+
+    merged = [header.rstrip("\n"), ""]
+    for i, tree in enumerate(trees):
+        merged.append(re.sub(r"^Tree=\d+", f"Tree={i}", tree))
+        merged.append("\n")
+    model_str = "\n".join(merged) + "\nend of trees" + footer
+    return lgb.Booster(model_str=model_str)
+
+
+def _scale_tree(tree: str, weight: float) -> str:
+    """
+    Scales node outputs of a tree in the text model format.
+    """
+
+    lines = tree.split("\n")
+    for i, line in enumerate(lines):
+        if line == "is_linear=1":
+            raise ValueError("Linear trees are not supported")
+        if line.startswith(_SCALED_LINES):
+            name, values = line.split("=", 1)
+            lines[i] = (
+                name
+                + "="
+                + " ".join(
+                    repr(float(_) * weight) for _ in values.split(" ") if _
+                )
+            )
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+"""
+This module provides a command-line interface for evaluating the model on
+slices of the test dataset, such as neighbourhoods, property types, room
+types and their combinations.
+
+The slice columns, the maximum number of columns combined in a slice and
+the minimum number of rows in a reported group are set in the `slices`
+section of params.yaml. For every combination of the slice columns, the
+rows are grouped by their category codes, and the sufficient statistics of
+the R2, MAE, MAPE and RMSE metrics of all groups are summed in one pass
+over the rows sorted by group. The category codes are decoded to names
+with the column encoder.
+
+The slice report with one row per group is saved to a CSV file in the
+report path.
+
+Usage:
+    $ python evaluate_slices.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.data.datatypes import DatasetStage
+from src.features.encoder import ColumnEncoder
+from src.features.functions import restore_target
+from src.models.functions import load_features
+from itertools import combinations
+from typing import Tuple
+import logging
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+# unknown categories are encoded as nan and grouped under this code
+UNKNOWN_CODE = -1
+
+
+def get_group_ids(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assigns a group id to every row by the combination of its codes.
+
+    Params:
+        codes: numpy.ndarray
+            The category codes of the slice columns, one column per slice
+            column. Unknown categories are nan.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]
+            The group id of each row, and the codes of each group.
+    """
+
+    codes = np.where(np.isnan(codes), UNKNOWN_CODE, codes).astype(np.int64)
+    groups, group_ids = np.unique(codes, axis=0, return_inverse=True)
+    return group_ids.reshape(-1), groups
+
+
+def grouped_metrics(
+    target: np.ndarray, preds: np.ndarray, group_ids: np.ndarray
+) -> pd.DataFrame:
+    """
+    Calculates the R2, MAE, MAPE and RMSE metrics of every group. The
+    sufficient statistics of the metrics are summed per group in one pass
+    over the rows sorted by group.
+
+    Params:
+        target: numpy.ndarray
+            The transformed target.
+        preds: numpy.ndarray
+            The predictions of the transformed target.
+        group_ids: numpy.ndarray
+            The group id of each row, from 0 to the number of groups - 1.
+
+    Returns:
+        pandas.DataFrame
+            The number of rows and the metrics indexed by group id.
+    """
+
+    target = np.asarray(target, dtype=np.float64)
+    preds = np.asarray(preds, dtype=np.float64)
+    price = restore_target(target)
+    error = np.abs(price - restore_target(preds))
+    stats = np.column_stack(
+        [
+            np.ones_like(target),
+            target,
+            np.square(target),
+            np.square(target - preds),
+            error,
+            error / price,
+            np.square(error),
+        ]
+    )
+
+    order = np.argsort(group_ids, kind="stable")
+    sorted_ids = group_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    sums = np.add.reduceat(stats[order], starts, axis=0)
+    count, sum_y, sum_yy, ss_res, sum_ae, sum_ape, sum_se = sums.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ss_tot = sum_yy - np.square(sum_y) / count
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+    return pd.DataFrame(
+        {
+            "count": count.astype(np.int64),
+            "r2": r2,
+            "mae": sum_ae / count,
+            "mape": sum_ape / count,
+            "rmse": np.sqrt(sum_se / count),
+        },
+        index=pd.Index(sorted_ids[starts], name="group_id"),
+    )
+
+
+@click.command()
+def main() -> None:
+    """
+    Evaluates the model on slices of the test dataset and saves the slice
+    report to a CSV file.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    settings = params["slices"]
+    model_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["model_file"],
+    )
+    encoder_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["column_transformer_file"],
+    )
+    slices_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["slices_file"],
+    )
+
+    features, target = load_features(params, DatasetStage.TEST, logger)
+    preds = lgb.Booster(model_file=model_path).predict(features)
+    encoder = ColumnEncoder.load(encoder_path)
+    vocabularies = dict(zip(encoder.categorical_features, encoder.categories))
+    positions = {_: i for i, _ in enumerate(params["data"]["features"])}
+
+    reports = []
+    for order in range(1, settings["max_order"] + 1):
+        for columns in combinations(settings["columns"], order):
+            codes = np.asarray(features[:, [positions[_] for _ in columns]])
+            group_ids, groups = get_group_ids(codes)
+            report = grouped_metrics(target, preds, group_ids)
+
+            supported = report["count"] >= settings["min_support"]
+            report = report[supported]
+            report.insert(0, "slice", " & ".join(columns))
+            report.insert(
+                1,
+                "group",
+                [
+                    " & ".join(
+                        str(vocabularies[column][code])
+                        if code != UNKNOWN_CODE
+                        else "unknown"
+                        for column, code in zip(columns, groups[group_id])
+                    )
+                    for group_id in report.index
+                ],
+            )
+            reports.append(report.sort_values("count", ascending=False))
+            logger.info(
+                f"{' & '.join(columns)}: {supported.sum()} of "
+                f"{len(supported)} groups with at least "
+                f"{settings['min_support']} rows"
+            )
+
+    report = pd.concat(reports, ignore_index=True)
+    worst = report.sort_values("mape", ascending=False).head(5)
+    for _, row in worst.iterrows():
+        logger.info(
+            f"Worst MAPE {row['mape']:>7.4f} on {row['count']:>5} rows: "
+            f"{row['slice']} = {row['group']}"
+        )
+
+    report.to_csv(slices_path, index=False)
+    logger.info(f"Saved slice report to {slices_path}")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
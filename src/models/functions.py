@@ -0,0 +1,494 @@
+"""
+A collection of functions shared by the model training stages.
+
+Functions:
+- get_model_params(params: dict) -> dict: Returns LightGBM parameters
+  for model training from the `training` section of params.yaml.
+- load_train_dataset(params: dict, logger: logging.Logger) -> lgb.Dataset:
+  Loads the binned training dataset from the feature cache, or constructs
+  it from the processed CSV file.
+- load_features(params: dict, stage: DatasetStage, logger: logging.Logger)
+  -> Tuple[np.ndarray, np.ndarray]: Maps the features and target of
+  a dataset stage from the feature cache, or reads them from the processed
+  CSV file.
+- iter_features(params: dict, stage: DatasetStage, chunk_size: int,
+  logger: logging.Logger) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+  Yields the features and target of a dataset stage in chunks.
+- split_validation(features: np.ndarray, target: np.ndarray,
+  fraction: float, seed: int) -> Tuple[np.ndarray, ...]: Splits a random
+  validation shard off the training rows.
+- save_model(model: lgb.Booster, path: str,
+  num_iteration: Optional[int] = None) -> None: Saves a model atomically,
+  so readers never see a partly written model file.
+- time_budget(seconds: float) -> Callable: Returns a LightGBM callback,
+  which stops training when the time budget is spent.
+- is_regressed(candidate: dict, current: dict, max_regression: float)
+  -> bool: Checks whether candidate model metrics are worse than
+  the current ones.
+- measure_latency(predict: Callable, features: np.ndarray, repeats: int)
+  -> dict: Measures latency of a prediction function on a batch.
+- predict_prices(model: lgb.Booster, encoder: ColumnEncoder,
+  dataset: pd.DataFrame, features: List[str], num_threads: int = 0)
+  -> np.ndarray: Predicts prices of the valid rows of a cleaned dataset.
+- predict_grid(model: lgb.Booster, encoder: ColumnEncoder, base: dict,
+  variations: Dict[str, list], features: List[str], num_threads: int = 0)
+  -> np.ndarray: Predicts prices of the variations grid of a listing.
+
+Usage:
+    from src.models.functions import get_model_params, load_train_dataset
+
+    dataset = load_train_dataset(params, logger)
+    booster = lgb.train(get_model_params(params), dataset)
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.data.datatypes import DatasetStage
+from src.data.functions import clean_features
+from src.data.schema import read_dataset, optimize_dtypes, memory_usage_mb
+from src.features.cache import (
+    get_cache_dir,
+    load_binary_dataset,
+    load_feature_cache,
+)
+from src.features.encoder import ColumnEncoder
+from src.features.functions import restore_target
+from src.utils.config import get_config
+from src.utils.functions import get_abs_path
+from src.utils.threads import get_thread_budget
+
+# the prediction of invalid rows
+INVALID_PREDICTION = -1.0
+
+
+def get_model_params(params: dict) -> dict:
+    """
+    Returns LightGBM parameters for model training.
+
+    Params:
+        params: dict
+            The project parameters.
+
+    Returns:
+        dict
+            The parameters from the `training.params` section with
+            the project random seed, and the training threads of the
+            thread budget unless they are set.
+    """
+
+    return {
+        "num_threads": get_thread_budget(params).train_threads,
+        **params["training"]["params"],
+        "seed": params["random_seed"],
+    }
+
+
+def load_train_dataset(params: dict, logger: logging.Logger) -> lgb.Dataset:
+    """
+    Loads the binned training dataset from the feature cache written by
+    `build_features`. If the dataset isn't cached, it is read from the
+    processed CSV file and constructed.
+
+    Params:
+        params: dict
+            The project parameters.
+        logger: logging.Logger
+            The logger of the calling stage.
+
+    Returns:
+        lightgbm.Dataset
+            The constructed training dataset.
+    """
+
+    cache_dir = get_cache_dir(params, DatasetStage.TRAIN)
+    dataset = load_binary_dataset(cache_dir) if cache_dir else None
+    if dataset is not None:
+        logger.info(f"Loaded binned dataset from {cache_dir}")
+        return dataset
+
+    train_dataset_path = get_abs_path(
+        params["data"]["processed_data_path"],
+        params["data"]["train_data_file"],
+    )
+    df = read_dataset(train_dataset_path)
+    logger.info(f"Memory footprint {memory_usage_mb(df):.2f} MB")
+    df = optimize_dtypes(df)
+    logger.info(f"Optimized memory footprint {memory_usage_mb(df):.2f} MB")
+    features = df[params["data"]["features"]]
+    target = df[params["data"]["target"]]
+
+    return lgb.Dataset(
+        features,
+        label=target,
+        feature_name=features.columns.to_list(),
+        categorical_feature=params["model"]["categorical_features"],
+        free_raw_data=False,
+    ).construct()
+
+
+def load_features(
+    params: dict, stage: DatasetStage, logger: logging.Logger
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maps the features and target of a dataset stage from the feature cache
+    written by `build_features`. If they aren't cached, they are read from
+    the processed CSV file.
+
+    Params:
+        params: dict
+            The project parameters.
+        stage: DatasetStage
+            The dataset stage.
+        logger: logging.Logger
+            The logger of the calling stage.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]
+            The features in `params["data"]["features"]` order and
+            the target.
+    """
+
+    cache_dir = get_cache_dir(params, stage)
+    cached = load_feature_cache(cache_dir) if cache_dir else None
+    if cached is not None:
+        features, target, _ = cached
+        logger.info(f"Mapped cached features from {cache_dir}")
+        return features, target
+
+    dataset_path = get_abs_path(
+        params["data"]["processed_data_path"],
+        params["data"][f"{stage.value}_data_file"],
+    )
+    df = read_dataset(dataset_path)
+    logger.info(f"Memory footprint {memory_usage_mb(df):.2f} MB")
+    df = optimize_dtypes(df)
+    logger.info(f"Optimized memory footprint {memory_usage_mb(df):.2f} MB")
+    return (
+        df[params["data"]["features"]].to_numpy(dtype=np.float32),
+        df[params["data"]["target"]].to_numpy(dtype=np.float32),
+    )
+
+
+def iter_features(
+    params: dict, stage: DatasetStage, chunk_size: int, logger: logging.Logger
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yields the features and target of a dataset stage in chunks. The chunks
+    are sliced from the memory-mapped feature cache written by
+    `build_features`, or read from the processed CSV file chunk by chunk,
+    so only one chunk is held in memory.
+
+    Params:
+        params: dict
+            The project parameters.
+        stage: DatasetStage
+            The dataset stage.
+        chunk_size: int
+            The number of rows in a chunk.
+        logger: logging.Logger
+            The logger of the calling stage.
+
+    Yields:
+        Tuple[numpy.ndarray, numpy.ndarray]
+            The features in `params["data"]["features"]` order and
+            the target of a chunk.
+    """
+
+    cache_dir = get_cache_dir(params, stage)
+    cached = load_feature_cache(cache_dir) if cache_dir else None
+    if cached is not None:
+        features, target, _ = cached
+        logger.info(f"Iterate cached features from {cache_dir}")
+        for start in range(0, features.shape[0], chunk_size):
+            rows = slice(start, start + chunk_size)
+            yield np.asarray(features[rows]), np.asarray(target[rows])
+        return
+
+    dataset_path = get_abs_path(
+        params["data"]["processed_data_path"],
+        params["data"][f"{stage.value}_data_file"],
+    )
+    logger.info(f"Iterate features from {dataset_path}")
+    columns = params["data"]["features"] + [params["data"]["target"]]
+    for df in read_dataset(
+        dataset_path, usecols=columns, chunksize=chunk_size
+    ):
+        yield (
+            df[params["data"]["features"]].to_numpy(dtype=np.float32),
+            df[params["data"]["target"]].to_numpy(dtype=np.float32),
+        )
+
+
+def split_validation(
+    features: np.ndarray, target: np.ndarray, fraction: float, seed: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits a random validation shard off the training rows. The rows of
+    both parts keep their order.
+
+    Params:
+        features: numpy.ndarray
+            The training features.
+        target: numpy.ndarray
+            The training target.
+        fraction: float
+            The share of the rows in the validation shard.
+        seed: int
+            The random seed.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]
+            The training features and target, and the validation features
+            and target.
+
+    Raises:
+        ValueError: If the fraction leaves either part empty.
+    """
+
+    n_rows = features.shape[0]
+    n_valid = int(round(n_rows * fraction))
+    if not 0 < n_valid < n_rows:
+        raise ValueError(
+            f"Can't split {fraction} of {n_rows} rows for validation"
+        )
+    rows = np.random.default_rng(seed).permutation(n_rows)
+    valid, train = np.sort(rows[:n_valid]), np.sort(rows[n_valid:])
+    return features[train], target[train], features[valid], target[valid]
+
+
+def save_model(
+    model: lgb.Booster, path: str, num_iteration: Optional[int] = None
+) -> None:
+    """
+    Saves a model to a temporary file first and then renames it, so the API
+    and the other stages never read a partly written model file.
+
+    Params:
+        model: lightgbm.Booster
+            The model to save.
+        path: str
+            The path to the model file.
+        num_iteration: int, optional
+            The number of iterations to save. By default, the best iteration
+            is saved.
+    """
+
+    tmp_path = f"{path}.tmp"
+    model.save_model(tmp_path, num_iteration=num_iteration)
+    os.replace(tmp_path, path)
+
+
+def time_budget(seconds: float) -> Callable:
+    """
+    Returns a LightGBM callback, which stops training when the time budget
+    is spent. The model keeps all the iterations done so far.
+
+    Params:
+        seconds: float
+            The time budget in seconds, counted from the first iteration.
+
+    Returns:
+        Callable
+            The callback.
+    """
+
+    start = []
+
+    def _callback(env: lgb.callback.CallbackEnv) -> None:
+        if not start:
+            start.append(time.monotonic())
+        if time.monotonic() - start[0] > seconds:
+            raise lgb.callback.EarlyStopException(
+                env.iteration, env.evaluation_result_list
+            )
+
+    _callback.order = 40
+    return _callback
+
+
+def is_regressed(
+    candidate: dict, current: dict, max_regression: float
+) -> bool:
+    """
+    Checks whether any metric of a candidate model is worse than the metric
+    of the current model by more than the relative tolerance. R2 is better
+    when higher, MAE, MAPE and RMSE are better when lower.
+
+    Params:
+        candidate: dict
+            The metrics of the candidate model.
+        current: dict
+            The metrics of the current model.
+        max_regression: float
+            The allowed relative regression of each metric.
+
+    Returns:
+        bool
+            True if any metric regressed, False otherwise.
+    """
+
+    for metric, value in current.items():
+        tolerance = abs(value) * max_regression
+        if metric == "r2":
+            if candidate[metric] < value - tolerance:
+                return True
+        elif candidate[metric] > value + tolerance:
+            return True
+    return False
+
+
+def measure_latency(
+    predict: Callable, features: np.ndarray, repeats: int
+) -> dict:
+    """
+    Measures latency of a prediction function on a batch of features.
+
+    Params:
+        predict: Callable
+            The function, which takes the features and returns predictions.
+        features: numpy.ndarray
+            The batch of features.
+        repeats: int
+            The number of timed calls after one warm-up call.
+
+    Returns:
+        dict
+            The median and 99th percentile of the call latency in
+            milliseconds, and the median latency per row in microseconds.
+    """
+
+    predict(features)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(features)
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings)
+    return {
+        "median_ms": np.median(timings) * 1e3,
+        "p99_ms": np.percentile(timings, 99) * 1e3,
+        "per_row_us": np.median(timings) * 1e6 / features.shape[0],
+    }
+
+
+def predict_prices(
+    model: lgb.Booster,
+    encoder: ColumnEncoder,
+    dataset: pd.DataFrame,
+    features: List[str],
+    num_threads: int = 0,
+) -> np.ndarray:
+    """
+    Predicts per night prices of the valid rows of a dataset cleaned with
+    `clean_features`. The invalid rows get -1.
+
+    Params:
+        model: lightgbm.Booster
+            The model.
+        encoder: ColumnEncoder
+            The fitted column encoder.
+        dataset: pandas.DataFrame
+            The cleaned features with the `is_valid` column.
+        features: List[str]
+            The features in the model training order.
+        num_threads: int, optional
+            The number of prediction threads, by default LightGBM uses
+            all cores.
+
+    Returns:
+        numpy.ndarray
+            The predicted prices.
+    """
+
+    predictions = np.full(dataset.shape[0], INVALID_PREDICTION)
+    valid = dataset["is_valid"].to_numpy(dtype=bool)
+    if valid.any():
+        encoded = pd.DataFrame(
+            encoder.transform(dataset[valid]),
+            columns=encoder.feature_names_out,
+        )[features]
+        predictions[valid] = restore_target(
+            model.predict(encoded.to_numpy(), num_threads=num_threads)
+        )
+    return predictions
+
+
+def predict_grid(
+    model: lgb.Booster,
+    encoder: ColumnEncoder,
+    base: dict,
+    variations: Dict[str, list],
+    features: List[str],
+    num_threads: int = 0,
+) -> np.ndarray:
+    """
+    Predicts per night prices of all the combinations of the variations of
+    a raw listing in one batch. The listing is cleaned and encoded once,
+    and only the values of the varied features are encoded. The
+    combinations with invalid values get -1.
+
+    Params:
+        model: lightgbm.Booster
+            The model.
+        encoder: ColumnEncoder
+            The fitted column encoder.
+        base: dict
+            The raw features of the listing.
+        variations: Dict[str, list]
+            The raw values of each varied feature.
+        features: List[str]
+            The features in the model training order.
+        num_threads: int, optional
+            The number of prediction threads, by default LightGBM uses
+            all cores.
+
+    Returns:
+        numpy.ndarray
+            The predicted prices of the combinations in the
+            `itertools.product(*variations.values())` order.
+    """
+
+    base = {**base, **{k: v[0] for k, v in variations.items()}}
+    listing = clean_features(pd.DataFrame([base], columns=features))
+    row = pd.DataFrame(
+        encoder.transform(listing), columns=encoder.feature_names_out
+    )[features].to_numpy()[0]
+
+    limits = get_config().feature_limits
+    is_valid = all(
+        listing[k].iloc[0] < v
+        for k, v in limits.items()
+        if k not in variations
+    )
+
+    shape = tuple(len(_) for _ in variations.values())
+    # grid row indices of the values of each varied feature
+    indices = np.indices(shape).reshape(len(shape), -1)
+    grid = np.tile(row, (indices.shape[1], 1))
+    valid = np.full(indices.shape[1], is_valid)
+    for axis, (feature, values) in enumerate(variations.items()):
+        # the varied values are cleaned in copies of the listing
+        cleaned = clean_features(
+            pd.DataFrame([base] * len(values), columns=features).assign(
+                **{feature: values}
+            )
+        )[feature]
+        encoded = encoder.transform_column(feature, cleaned)
+        grid[:, features.index(feature)] = encoded[indices[axis]]
+        if feature in limits:
+            valid &= (cleaned.to_numpy() < limits[feature])[indices[axis]]
+
+    predictions = np.full(indices.shape[1], INVALID_PREDICTION)
+    if valid.any():
+        predictions[valid] = restore_target(
+            model.predict(grid[valid], num_threads=num_threads)
+        )
+    return predictions
@@ -0,0 +1,648 @@
+"""
+The jobs module scores large files of raw listings submitted to the API as
+background jobs, so clients don't wait for the predictions in a request.
+
+Jobs are kept in a SQLite database next to their input and output files,
+so they survive restarts of the API. A job is `queued` when it is
+submitted, `running` while it is scored, and `done` or `failed` at the end.
+The progress of a running job is committed after each chunk together with
+the size of its output file. A runner claims a job with its own token and
+holds a lease on it: the lease is renewed with each committed chunk and,
+while a chunk is predicted, every third of `stale_after` seconds. A running
+job with a lease not renewed for `stale_after` seconds, like one left by
+a crashed API worker, is queued again and resumed from the last committed
+chunk by any runner. The progress and the status are only written by the
+owner of the job, so a runner which lost its lease stops scoring the job
+and leaves it to the new owner. A runner stopped gracefully queues its
+running job again at once. Done and failed
+jobs are deleted with their files `retain_for` seconds after they end.
+
+The runner scores the jobs one by one in a background thread of the API.
+The chunks of the input file are predicted by a pool of worker processes,
+which load the model and the column encoder once and run with a lower
+scheduling priority and one thread each, so the interactive requests of
+the API keep the CPU. The predictions are the same as the ones of
+`predict_batch.py`, with -1 for invalid rows. When a worker process dies,
+the pool is started again and the job is queued again, up to
+`MAX_POOL_RESTARTS` times in a row, after which the job fails.
+
+Classes:
+--------
+1. JobStore(path: str):
+    The SQLite database of the jobs.
+
+2. JobRunner(store: JobStore, model_path: str,
+             column_transformer_path: str, features: List[str],
+             chunk_size: int, workers: int = 1, nice: int = 0,
+             poll_interval: float = 5.0, stale_after: float = 300.0,
+             retain_for: Optional[float] = None):
+    Scores the queued jobs in a background thread.
+
+Example:
+--------
+from src.models.jobs import JobStore, JobRunner
+
+store = JobStore("data/jobs/jobs.sqlite")
+store.create("4f1c", "data/jobs/4f1c.csv", "data/jobs/4f1c.out.csv", 1000)
+runner = JobRunner(store, model_path, encoder_path, features, 10000)
+runner.start()
+print(store.get("4f1c"))
+"""
+
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.models.predict_batch import (
+    init_worker,
+    iter_chunks,
+    predict_chunk,
+    write_predictions,
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# consecutive crashes of the worker pool on a job, after which it fails
+MAX_POOL_RESTARTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    n_rows INTEGER NOT NULL,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    output_bytes INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """
+    The SQLite database of the jobs. Each call opens its own connection,
+    so the store is shared by threads and processes.
+
+    Params:
+        path: str
+            The path to the database file, which is created if it doesn't
+            exist.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            # readers don't block the writer of the progress
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+            # the databases created before the leases
+            columns = [
+                _["name"]
+                for _ in connection.execute("PRAGMA table_info(jobs)")
+            ]
+            if "owner" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Opens a connection in autocommit mode, transactions are explicit.
+        """
+
+        connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None
+        )
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def create(
+        self, job_id: str, input_path: str, output_path: str, n_rows: int
+    ) -> dict:
+        """
+        Adds a queued job.
+
+        Params:
+            job_id: str
+                The job id.
+            input_path: str
+                The path to the CSV file of raw listings.
+            output_path: str
+                The path to the CSV file of predictions.
+            n_rows: int
+                The number of listings.
+
+        Returns:
+            dict
+                The job.
+        """
+
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, input_path, output_path, "
+                "n_rows, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, input_path, output_path, n_rows, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Returns the job, or None if it doesn't exist.
+        """
+
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def claim(self, owner: str) -> Optional[dict]:
+        """
+        Marks the oldest queued job as running by the owner and returns it,
+        or None if no job is queued. Concurrent runners never claim the same
+        job.
+
+        Params:
+            owner: str
+                The token of the claiming runner.
+        """
+
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (RUNNING, owner, time.time(), row["id"]),
+                )
+            connection.execute("COMMIT")
+        return (
+            {**dict(row), "status": RUNNING, "owner": owner}
+            if row is not None
+            else None
+        )
+
+    def _update_owned(
+        self, job_id: str, owner: str, values: Optional[dict] = None
+    ) -> bool:
+        """
+        Updates the columns of a running job with the values, if it is
+        owned by the runner, and returns whether it is.
+        """
+
+        values = values or {}
+        columns = "".join(f"{_} = ?, " for _ in values)
+        with self._connect() as connection:
+            return (
+                connection.execute(
+                    f"UPDATE jobs SET {columns}updated_at = ? "
+                    "WHERE id = ? AND status = ? AND owner = ?",
+                    (*values.values(), time.time(), job_id, RUNNING, owner),
+                ).rowcount
+                == 1
+            )
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """
+        Renews the lease of the owner on a running job, and returns whether
+        the owner still holds it.
+        """
+
+        return self._update_owned(job_id, owner)
+
+    def update_progress(
+        self, job_id: str, owner: str, rows_done: int, output_bytes: int
+    ) -> bool:
+        """
+        Commits the number of scored rows and the size of the output file
+        with them, and renews the lease. Returns whether the owner still
+        holds the job.
+        """
+
+        return self._update_owned(
+            job_id,
+            owner,
+            {"rows_done": rows_done, "output_bytes": output_bytes},
+        )
+
+    def finish(
+        self, job_id: str, owner: str, error: Optional[str] = None
+    ) -> bool:
+        """
+        Marks the job as done, or as failed with the error. Returns whether
+        the owner still held the job.
+        """
+
+        return self._update_owned(
+            job_id,
+            owner,
+            {
+                "status": DONE if error is None else FAILED,
+                "error": error,
+                "owner": None,
+            },
+        )
+
+    def release(self, job_id: str, owner: str) -> bool:
+        """
+        Queues a running job again, which is resumed from its progress.
+        Returns whether the owner still held the job.
+        """
+
+        return self._update_owned(
+            job_id, owner, {"status": QUEUED, "owner": None}
+        )
+
+    def delete_finished(self, retain_for: float) -> List[dict]:
+        """
+        Deletes the done and failed jobs, which ended before the given time.
+
+        Params:
+            retain_for: float
+                The seconds a finished job is kept.
+
+        Returns:
+            List[dict]
+                The deleted jobs, their files are left to the caller.
+        """
+
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            condition = "WHERE status IN (?, ?) AND updated_at < ?"
+            args = (DONE, FAILED, time.time() - retain_for)
+            rows = connection.execute(
+                f"SELECT * FROM jobs {condition}", args
+            ).fetchall()
+            connection.execute(f"DELETE FROM jobs {condition}", args)
+            connection.execute("COMMIT")
+        return [dict(_) for _ in rows]
+
+    def requeue_stale(self, stale_after: float) -> int:
+        """
+        Queues again the running jobs without progress for the given time,
+        which are left by a stopped runner.
+
+        Params:
+            stale_after: float
+                The seconds without progress.
+
+        Returns:
+            int
+                The number of queued jobs.
+        """
+
+        now = time.time()
+        with self._connect() as connection:
+            return connection.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? "
+                "WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, RUNNING, now - stale_after),
+            ).rowcount
+
+
+def init_job_worker(nice: int, *args) -> None:
+    """
+    Lowers the scheduling priority of a worker process and loads the model
+    and the encoder.
+    """
+
+    if nice:
+        os.nice(nice)
+    init_worker(*args)
+
+
+class JobRunner:
+    """
+    Scores the queued jobs in a background thread.
+
+    Params:
+        store: JobStore
+            The store of the jobs.
+        model_path: str
+            The path to the model file.
+        column_transformer_path: str
+            The path to the column encoder file.
+        features: List[str]
+            The features in the model training order.
+        chunk_size: int
+            The number of rows predicted at once.
+        workers: int, optional
+            The number of worker processes, with 0 the chunks are predicted
+            in the runner thread.
+        nice: int, optional
+            The increment of the niceness of the worker processes.
+        poll_interval: float, optional
+            The seconds between checks for new jobs, when the runner isn't
+            notified.
+        stale_after: float, optional
+            The seconds without renewing the lease, after which a running
+            job is resumed, as its runner is considered stopped.
+        retain_for: float, optional
+            The seconds after which finished jobs are deleted with their
+            files, by default they are kept.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        model_path: str,
+        column_transformer_path: str,
+        features: List[str],
+        chunk_size: int,
+        workers: int = 1,
+        nice: int = 0,
+        poll_interval: float = 5.0,
+        stale_after: float = 300.0,
+        retain_for: Optional[float] = None,
+    ) -> None:
+        self.store = store
+        self.features = features
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retain_for = retain_for
+        # the token of the runner in the leases of its jobs
+        self.owner = uuid.uuid4().hex
+        # one prediction thread per worker
+        self._init_args = (model_path, column_transformer_path, features, 1)
+        self._nice = nice
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # consecutive crashes of the worker pool by job id
+        self._pool_restarts: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Starts the worker processes and the runner thread.
+        """
+
+        if self.workers > 0:
+            self._start_pool()
+        else:
+            init_worker(*self._init_args)
+        self._thread = threading.Thread(
+            target=self._run, name="job-runner", daemon=True
+        )
+        self._thread.start()
+
+    def _start_pool(self) -> None:
+        """
+        Starts the worker processes.
+        """
+
+        self._executor = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_job_worker,
+            initargs=(self._nice, *self._init_args),
+        )
+
+    def notify(self) -> None:
+        """
+        Wakes the runner up to check for new jobs.
+        """
+
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """
+        Stops the runner thread after the current chunk and shuts the
+        worker processes down. The running job is queued again.
+        """
+
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def _run(self) -> None:
+        """
+        Scores the queued jobs until the runner is stopped.
+        """
+
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            if not self.run_pending():
+                self._wakeup.wait(self.poll_interval)
+
+    def run_pending(self) -> bool:
+        """
+        Deletes the expired finished jobs and queues the stale jobs again,
+        then claims and scores the oldest queued job.
+
+        Returns:
+            bool
+                Whether a job was claimed.
+        """
+
+        if self.retain_for is not None:
+            self.delete_expired()
+        n_requeued = self.store.requeue_stale(self.stale_after)
+        if n_requeued:
+            logger.info(f"Resume {n_requeued} interrupted jobs")
+        job = self.store.claim(self.owner)
+        if job is None:
+            return False
+        logger.info(f"Score job {job['id']} from row {job['rows_done']}")
+        try:
+            if self._score(job):
+                owned = self.store.finish(job["id"], self.owner)
+                if owned:
+                    logger.info(f"Job {job['id']} is done")
+            else:
+                owned = self.store.release(job["id"], self.owner)
+            if not owned:
+                logger.warning(
+                    f"Job {job['id']} lease is lost, it is left to its owner"
+                )
+            self._pool_restarts.pop(job["id"], None)
+        except BrokenProcessPool as e:
+            self._restart_pool(job, e)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed")
+            self._pool_restarts.pop(job["id"], None)
+            self.store.finish(job["id"], self.owner, error=str(e))
+        return True
+
+    def _restart_pool(self, job: dict, error: BrokenProcessPool) -> None:
+        """
+        Starts the worker processes again after one of them died, and
+        queues the job again to be resumed by the new pool, or fails it
+        after `MAX_POOL_RESTARTS` crashes in a row.
+        """
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start_pool()
+        restarts = self._pool_restarts.get(job["id"], 0) + 1
+        if restarts > MAX_POOL_RESTARTS:
+            logger.error(f"Job {job['id']} failed, the pool crashed")
+            self._pool_restarts.pop(job["id"], None)
+            self.store.finish(job["id"], self.owner, error=str(error))
+        else:
+            logger.warning(
+                f"Worker pool crashed on job {job['id']}, queue it again"
+            )
+            self._pool_restarts[job["id"]] = restarts
+            self.store.release(job["id"], self.owner)
+
+    def delete_expired(self) -> int:
+        """
+        Deletes the finished jobs older than `retain_for` with their input
+        and output files.
+
+        Returns:
+            int
+                The number of deleted jobs.
+        """
+
+        jobs = self.store.delete_finished(self.retain_for)
+        for job in jobs:
+            for path in (job["input_path"], job["output_path"]):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        if jobs:
+            logger.info(f"Deleted {len(jobs)} expired jobs")
+        return len(jobs)
+
+    def _score(self, job: dict) -> bool:
+        """
+        Scores the job from its last committed chunk, and returns whether
+        all its rows are scored. Scoring stops, when the lease on the job
+        is lost.
+        """
+
+        rows_done = job["rows_done"]
+        if not self.store.renew(job["id"], self.owner):
+            return False
+        # drop the output of chunks written after the last commit
+        with open(job["output_path"], "ab") as f:
+            f.truncate(job["output_bytes"])
+
+        pending: deque[Future] = deque()
+        for chunk in self._iter_remaining(job):
+            if self._stopped.is_set():
+                break
+            if self._executor is None:
+                predictions = predict_chunk(chunk)
+            else:
+                pending.append(self._executor.submit(predict_chunk, chunk))
+                if len(pending) < 2 * self.workers:
+                    continue
+                predictions = self._wait(job, pending.popleft())
+            rows_done = self._commit(job, predictions, rows_done)
+            if rows_done is None:
+                return self._cancel(pending)
+        while pending:
+            predictions = self._wait(job, pending.popleft())
+            rows_done = self._commit(job, predictions, rows_done)
+            if rows_done is None:
+                return self._cancel(pending)
+
+        if rows_done == 0:
+            write_predictions(np.empty(0), job["output_path"], header=True)
+        return not self._stopped.is_set()
+
+    def _iter_remaining(self, job: dict) -> Iterator[pd.DataFrame]:
+        """
+        Yields the chunks of the input file without the rows scored before
+        a restart.
+        """
+
+        skipped = 0
+        for chunk in iter_chunks(
+            job["input_path"], self.features, self.chunk_size
+        ):
+            if skipped < job["rows_done"]:
+                n_skip = min(job["rows_done"] - skipped, chunk.shape[0])
+                skipped += n_skip
+                chunk = chunk.iloc[n_skip:]
+                if chunk.empty:
+                    continue
+            yield chunk
+
+    def _commit(
+        self, job: dict, predictions: Optional[np.ndarray], rows_done: int
+    ) -> Optional[int]:
+        """
+        Appends the predictions of a chunk to the output file and commits
+        the progress, and returns the number of scored rows. Returns None,
+        when the lease on the job is lost.
+        """
+
+        # the output file is written only while the lease is held
+        if predictions is None or not self.store.renew(job["id"], self.owner):
+            return None
+        write_predictions(
+            predictions, job["output_path"], header=rows_done == 0
+        )
+        rows_done += predictions.shape[0]
+        if not self.store.update_progress(
+            job["id"],
+            self.owner,
+            rows_done,
+            os.path.getsize(job["output_path"]),
+        ):
+            return None
+        return rows_done
+
+    def _wait(self, job: dict, future: Future) -> Optional[np.ndarray]:
+        """
+        Waits for the predictions of a chunk and renews the lease on the job
+        meanwhile, as the niced workers may be slow under load. Returns
+        None, when the lease is lost.
+        """
+
+        while True:
+            try:
+                return future.result(timeout=self.stale_after / 3)
+            except TimeoutError:
+                if not self.store.renew(job["id"], self.owner):
+                    return None
+
+    @staticmethod
+    def _cancel(pending: deque) -> bool:
+        """
+        Cancels the pending chunks of a job, which lease is lost.
+        """
+
+        for future in pending:
+            future.cancel()
+        return False
@@ -0,0 +1,219 @@
+"""
+This module provides a command-line interface for scoring large files of
+raw listings in chunks across a pool of worker processes.
+
+The input file is read chunk by chunk, so only the chunks in flight are held
+in memory. Each worker loads the model and the column encoder once, when it
+starts, and predicts the chunks it gets with the same cleaning, encoding and
+model as the API: `clean_features`, the `ColumnEncoder` and the LightGBM
+booster of the current bundle of the artifact store, or of the model path
+when no bundle is promoted. Invalid rows get -1.
+
+The predictions are appended to the output CSV file in the input order as
+soon as their chunk and all the chunks before it are done. The number of
+scored rows per second is logged.
+
+CSV files are read with pandas. Parquet files are read by row groups with
+pyarrow, which must be installed to score them.
+
+The chunk size and the number of workers are set in the `batch_prediction`
+section of params.yaml, and can be overridden by options. The workers
+default to the thread budget of the `threads` section, and share the
+available cores.
+
+Usage:
+    $ python predict_batch.py data/raw/test.csv reports/predictions.csv
+    $ python predict_batch.py listings.parquet predictions.csv --workers 4
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.config import get_config
+from src.utils.functions import load_params, setup_logging
+from src.utils.threads import apply_thread_limits, get_thread_budget
+from src.data.functions import clean_features
+from src.features.encoder import ColumnEncoder
+from src.models.functions import predict_prices
+from src.models.store import get_serving_paths
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, List, Optional
+import logging
+import multiprocessing
+import time
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+# the model and the encoder of a worker process
+_model: Optional[lgb.Booster] = None
+_encoder: Optional[ColumnEncoder] = None
+_features: List[str] = []
+_num_threads = 0
+
+
+def iter_chunks(
+    path: str, columns: List[str], chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields the columns of a CSV or parquet file in chunks.
+
+    Params:
+        path: str
+            The path to the file.
+        columns: List[str]
+            The columns to read.
+        chunk_size: int
+            The number of rows in a chunk.
+
+    Yields:
+        pandas.DataFrame
+            The chunks.
+    """
+
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise click.ClickException(
+                "Scoring parquet files requires pyarrow, "
+                "install it with `pip install pyarrow`"
+            )
+        for batch in pq.ParquetFile(path).iter_batches(
+            batch_size=chunk_size, columns=columns
+        ):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def init_worker(
+    model_path: str,
+    column_transformer_path: str,
+    features: List[str],
+    num_threads: int,
+) -> None:
+    """
+    Loads the model and the encoder once per worker process.
+    """
+
+    global _model, _encoder, _features, _num_threads
+    _model = lgb.Booster(model_file=model_path)
+    _encoder = ColumnEncoder.load(column_transformer_path)
+    _features = features
+    _num_threads = num_threads
+
+
+def predict_chunk(chunk: pd.DataFrame) -> np.ndarray:
+    """
+    Predicts prices of a chunk of raw listings with the model of the worker,
+    the invalid rows get -1.
+    """
+
+    return predict_prices(
+        _model,
+        _encoder,
+        clean_features(chunk[_features].copy()),
+        _features,
+        _num_threads,
+    )
+
+
+def write_predictions(
+    predictions: np.ndarray, path: str, header: bool
+) -> None:
+    """
+    Appends predictions to the output CSV file.
+    """
+
+    pd.DataFrame({"predictions": predictions}).to_csv(
+        path, mode="w" if header else "a", header=header, index=False
+    )
+
+
+@click.command()
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_path", type=click.Path(dir_okay=False))
+@click.option("-s", "--chunk-size", type=click.IntRange(min=1))
+@click.option("-w", "--workers", type=click.IntRange(min=1))
+def main(
+    input_path: str,
+    output_path: str,
+    chunk_size: Optional[int],
+    workers: Optional[int],
+) -> None:
+    """
+    Scores the raw listings of the input file and writes the predictions to
+    the output CSV file.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    config = get_config()
+    settings = params["batch_prediction"]
+    chunk_size = chunk_size or settings["chunk_size"]
+    # share the available cores between the workers
+    budget = get_thread_budget(params, workers or settings["workers"])
+    workers = budget.workers
+    apply_thread_limits(budget)
+    # the artifacts served by the API, of the current bundle if promoted
+    paths = get_serving_paths(params)
+    init_args = (
+        paths["model_file"],
+        paths["column_transformer_file"],
+        config.features,
+        budget.predict_threads,
+    )
+    logger.info(
+        f"Score {input_path} in chunks of {chunk_size} rows "
+        f"with {workers} workers"
+    )
+
+    chunks = iter_chunks(input_path, config.features, chunk_size)
+    n_rows, n_valid = 0, 0
+    start = time.perf_counter()
+
+    def _write(predictions: np.ndarray) -> None:
+        nonlocal n_rows, n_valid
+        write_predictions(predictions, output_path, header=n_rows == 0)
+        n_rows += predictions.shape[0]
+        n_valid += int((predictions >= 0).sum())
+        logger.debug(f"Scored {n_rows} rows")
+
+    if workers == 1:
+        init_worker(*init_args)
+        for chunk in chunks:
+            _write(predict_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=init_args,
+        ) as executor:
+            # bound the chunks in flight to keep memory constant
+            pending: deque[Future] = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(predict_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    _write(pending.popleft().result())
+            while pending:
+                _write(pending.popleft().result())
+
+    if n_rows == 0:
+        write_predictions(np.empty(0), output_path, header=True)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Scored {n_rows} rows, {n_valid} valid, in {elapsed:.1f} s, "
+        f"{n_rows / elapsed:.0f} rows/s"
+    )
+    logger.info(f"Saved predictions to {output_path}")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
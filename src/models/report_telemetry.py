@@ -0,0 +1,136 @@
+"""
+This module provides a command-line interface for summarizing a training
+telemetry log written by `train_model`.
+
+The summary shows where the training time goes and how the metrics
+converge:
+
+- the number of iterations, the total time and the median and 99th
+  percentile of the iteration time,
+- the time spent in each tenth of the iterations,
+- the resident set size at the start, peak and end of training,
+- the first, best and last value of each metric with the best iteration
+  and the first iteration within 1% and 0.1% of the best value.
+
+The log path defaults to the telemetry file in the report path set in
+params.yaml.
+
+Usage:
+    $ python report_telemetry.py
+    $ python report_telemetry.py --path reports/lgbm_regressor_telemetry.bin
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.models.telemetry import read_telemetry, BASE_COLUMNS
+import logging
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+CONVERGENCE_TOLERANCES = (0.01, 0.001)
+
+
+def summarize_metric(values: pd.Series, higher_better: bool) -> dict:
+    """
+    Summarizes convergence of a metric over iterations.
+
+    Params:
+        values: pandas.Series
+            The metric values indexed by iteration.
+        higher_better: bool
+            Whether higher values of the metric are better.
+
+    Returns:
+        dict
+            The first, best and last values, the best iteration and the
+            first iterations within the relative convergence tolerances
+            of the best value.
+    """
+
+    best_iteration = values.idxmax() if higher_better else values.idxmin()
+    best = values[best_iteration]
+    summary = {
+        "first": values.iloc[0],
+        "best": best,
+        "last": values.iloc[-1],
+        "best_iteration": best_iteration,
+    }
+    for tolerance in CONVERGENCE_TOLERANCES:
+        gap = (best - values) if higher_better else (values - best)
+        within = values.index[gap <= abs(best) * tolerance]
+        summary[f"within_{tolerance:g}"] = within[0]
+    return summary
+
+
+@click.command()
+@click.option(
+    "-p",
+    "--path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="telemetry log path, defaults to the telemetry file of params.yaml",
+)
+def main(path: Optional[str]) -> None:
+    """
+    Logs the summary of a training telemetry log.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    if path is None:
+        params = load_params()
+        path = get_abs_path(
+            params["model"]["report_path"],
+            params["model"]["telemetry_file"],
+        )
+
+    records, header = read_telemetry(path)
+    records = records.set_index("iteration")
+    seconds = records["seconds"]
+    logger.info(
+        f"{len(records)} iterations in {seconds.sum():.2f} s, "
+        f"median {seconds.median() * 1e3:.2f} ms, "
+        f"p99 {np.percentile(seconds, 99) * 1e3:.2f} ms per iteration"
+    )
+
+    deciles = np.array_split(seconds, min(10, len(seconds)))
+    for decile in deciles:
+        logger.info(
+            f"Iterations {decile.index[0]:>6}-{decile.index[-1]:<6} "
+            f"{decile.sum():>8.2f} s "
+            f"({decile.sum() / seconds.sum():>6.1%})"
+        )
+
+    rss = records["rss_mb"]
+    logger.info(
+        f"RSS start {rss.iloc[0]:.1f} MB, peak {rss.max():.1f} MB, "
+        f"end {rss.iloc[-1]:.1f} MB"
+    )
+
+    metrics = [_ for _ in header["columns"] if _ not in BASE_COLUMNS]
+    for metric in metrics:
+        summary = summarize_metric(
+            records[metric], header["higher_better"][metric]
+        )
+        logger.info(
+            f"{metric}: first {summary['first']:.6g}, "
+            f"best {summary['best']:.6g} at {summary['best_iteration']}, "
+            f"last {summary['last']:.6g}, "
+            + ", ".join(
+                f"within {_:.1%} at {summary[f'within_{_:g}']}"
+                for _ in CONVERGENCE_TOLERANCES
+            )
+        )
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
@@ -0,0 +1,399 @@
+"""
+The store module keeps versioned bundles of the serving artifacts: the
+model, the column encoder, the feature profile, the comparables index and
+the fold artifact.
+
+A bundle is a directory named by a hash of the content of its files, so
+the same artifacts are stored once and a bundle never changes after it is
+written. Each bundle has a manifest with the checksums and sizes of the
+files, the training parameters, a fingerprint of the training and test data
+and the test metrics of the model.
+
+Bundles are written to a temporary directory first and renamed into place,
+so a reader never sees a partial bundle. The checksums are taken from the
+copies, so a bundle matches its id even when a training run replaces the
+source files meanwhile. The bundle served by the API is
+set by a separate `current` pointer, which is replaced atomically by
+`promote()`, and keeps the previously promoted bundle for a rollback.
+
+Files are hashed through memory maps without copying them into Python
+buffers, and the model is parsed by LightGBM straight from the bundle
+file.
+
+Functions:
+----------
+1. save_bundle(store_dir: str, files: Dict[str, str], manifest: dict)
+        -> str:
+    Stores the files as a bundle and returns its id.
+
+2. verify_bundle(store_dir: str, bundle_id: str) -> dict:
+    Checks the checksums of the bundle files and returns the manifest.
+
+3. promote(store_dir: str, bundle_id: str) -> None:
+    Points the `current` pointer to the bundle.
+
+4. get_current(store_dir: str) -> Optional[dict]:
+    Returns the `current` pointer, if any bundle is promoted.
+
+5. list_bundles(store_dir: str) -> List[dict]:
+    Returns the manifests of the stored bundles.
+
+6. load_bundle(store_dir: str, model_file: str,
+               column_transformer_file: str,
+               bundle_id: Optional[str] = None)
+        -> Tuple[lgb.Booster, ColumnEncoder, dict]:
+    Loads the model and the encoder of a bundle, the current by default.
+
+7. get_serving_paths(params: dict) -> Dict[str, str]:
+    Returns the paths to the served artifacts, of the current bundle when
+    one is promoted, which are shared by the API and batch scoring.
+
+Example:
+--------
+from src.models.store import save_bundle, promote, load_bundle
+
+bundle_id = save_bundle(
+    "models/store", {"lgbm_regressor.txt": "models/lgbm_regressor.txt"}, {}
+)
+promote("models/store", bundle_id)
+model, encoder, manifest = load_bundle(
+    "models/store", "lgbm_regressor.txt", "column_transformer.npz"
+)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+
+from src.features.encoder import ColumnEncoder
+from src.utils.functions import get_abs_path, get_project_dir
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "current.json"
+BUNDLE_ID_LENGTH = 16
+# params keys of the served artifacts, which are taken from the current
+# bundle when it has them
+SERVING_FILES = ("model_file", "column_transformer_file", "comparables_file")
+
+
+def get_file_checksum(path: str) -> str:
+    """
+    Calculates the SHA-256 hex digest of a file through a memory map.
+
+    Params:
+        path: str
+            The path to the file.
+
+    Returns:
+        str
+            The hex digest.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                digest.update(m)
+    return digest.hexdigest()
+
+
+def get_bundle_id(checksums: Dict[str, str]) -> str:
+    """
+    Calculates the bundle id from the names and checksums of its files.
+
+    Params:
+        checksums: Dict[str, str]
+            The checksums of the files by name.
+
+    Returns:
+        str
+            The bundle id.
+    """
+
+    digest = hashlib.sha256(
+        json.dumps(checksums, sort_keys=True).encode("utf-8")
+    )
+    return digest.hexdigest()[:BUNDLE_ID_LENGTH]
+
+
+def save_bundle(store_dir: str, files: Dict[str, str], manifest: dict) -> str:
+    """
+    Stores the files as a bundle. The files are copied first and the copies
+    are hashed. If an intact bundle with the same content exists, it is
+    kept as is, and a damaged one is replaced.
+
+    Params:
+        store_dir: str
+            The path to the store.
+        files: Dict[str, str]
+            The paths to the files by their names in the bundle.
+        manifest: dict
+            JSON serializable metadata of the bundle, like the training
+            parameters, the data fingerprint and the metrics.
+
+    Returns:
+        str
+            The bundle id.
+    """
+
+    # the copies are hashed, so the bundle matches its id and manifest even
+    # if the source files are replaced meanwhile
+    tmp_dir = os.path.join(store_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    bundle_dir = None
+    try:
+        for name, path in files.items():
+            shutil.copyfile(path, os.path.join(tmp_dir, name))
+        checksums = {
+            name: get_file_checksum(os.path.join(tmp_dir, name))
+            for name in files
+        }
+        bundle_id = get_bundle_id(checksums)
+        bundle_dir = os.path.join(store_dir, bundle_id)
+        if _is_intact(store_dir, bundle_id):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return bundle_id
+
+        manifest = {
+            **manifest,
+            "format_version": FORMAT_VERSION,
+            "bundle_id": bundle_id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "files": {
+                name: {
+                    "sha256": checksums[name],
+                    "size": os.path.getsize(os.path.join(tmp_dir, name)),
+                }
+                for name in files
+            },
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(bundle_dir):
+            # a damaged bundle is replaced by the new copy
+            broken_dir = os.path.join(store_dir, f".tmp-{uuid.uuid4().hex}")
+            os.rename(bundle_dir, broken_dir)
+            shutil.rmtree(broken_dir, ignore_errors=True)
+        os.rename(tmp_dir, bundle_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # a concurrent writer stored the same bundle
+        if bundle_dir is None or not os.path.exists(bundle_dir):
+            raise
+    return bundle_id
+
+
+def _is_intact(store_dir: str, bundle_id: str) -> bool:
+    """
+    Checks whether the bundle exists and its files match the manifest.
+    """
+
+    try:
+        verify_bundle(store_dir, bundle_id)
+    except (ValueError, KeyError, OSError):
+        return False
+    return True
+
+
+def read_manifest(store_dir: str, bundle_id: str) -> dict:
+    """
+    Reads the manifest of a bundle.
+
+    Raises:
+        ValueError: If the bundle doesn't exist or has an unsupported
+            format version.
+    """
+
+    path = os.path.join(store_dir, bundle_id, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise ValueError(f"Bundle {bundle_id} doesn't exist")
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported bundle format {manifest['format_version']}"
+        )
+    return manifest
+
+
+def verify_bundle(store_dir: str, bundle_id: str) -> dict:
+    """
+    Checks the checksums of the bundle files.
+
+    Params:
+        store_dir: str
+            The path to the store.
+        bundle_id: str
+            The bundle id.
+
+    Returns:
+        dict
+            The manifest of the bundle.
+
+    Raises:
+        ValueError: If the bundle doesn't exist or a file is changed.
+    """
+
+    manifest = read_manifest(store_dir, bundle_id)
+    for name, entry in manifest["files"].items():
+        path = os.path.join(store_dir, bundle_id, name)
+        if get_file_checksum(path) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch of {name} in {bundle_id}")
+    return manifest
+
+
+def promote(store_dir: str, bundle_id: str) -> None:
+    """
+    Points the `current` pointer to a verified bundle. The pointer is
+    written to a temporary file and renamed.
+
+    Params:
+        store_dir: str
+            The path to the store.
+        bundle_id: str
+            The bundle id.
+
+    Raises:
+        ValueError: If the bundle doesn't exist or a file is changed.
+    """
+
+    verify_bundle(store_dir, bundle_id)
+    current = get_current(store_dir)
+    pointer = {
+        "bundle_id": bundle_id,
+        "promoted_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "previous": current["bundle_id"] if current else None,
+    }
+    path = os.path.join(store_dir, CURRENT_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(pointer, f)
+    os.replace(tmp_path, path)
+
+
+def get_current(store_dir: str) -> Optional[dict]:
+    """
+    Returns the `current` pointer with the id of the promoted bundle, the
+    time of the promotion and the previously promoted bundle id, or None if
+    no bundle is promoted.
+    """
+
+    path = os.path.join(store_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def list_bundles(store_dir: str) -> List[dict]:
+    """
+    Returns the manifests of the stored bundles ordered by creation time.
+    """
+
+    if not os.path.isdir(store_dir):
+        return []
+    manifests = [
+        read_manifest(store_dir, _)
+        for _ in os.listdir(store_dir)
+        if os.path.exists(os.path.join(store_dir, _, MANIFEST_FILE))
+    ]
+    return sorted(manifests, key=lambda _: _["created_at"])
+
+
+def get_bundle_path(store_dir: str, bundle_id: str, name: str) -> str:
+    """
+    Returns the path to a file of a bundle.
+    """
+
+    return os.path.join(store_dir, bundle_id, name)
+
+
+def load_bundle(
+    store_dir: str,
+    model_file: str,
+    column_transformer_file: str,
+    bundle_id: Optional[str] = None,
+) -> Tuple[lgb.Booster, ColumnEncoder, dict]:
+    """
+    Loads the model and the encoder of a verified bundle.
+
+    Params:
+        store_dir: str
+            The path to the store.
+        model_file: str
+            The name of the model file in the bundle.
+        column_transformer_file: str
+            The name of the encoder file in the bundle.
+        bundle_id: str, optional
+            The bundle id. By default, the current bundle is loaded.
+
+    Returns:
+        Tuple[lightgbm.Booster, ColumnEncoder, dict]
+            The model, the encoder and the manifest.
+
+    Raises:
+        ValueError: If no bundle is promoted, or the bundle doesn't exist
+            or is changed.
+    """
+
+    if bundle_id is None:
+        current = get_current(store_dir)
+        if current is None:
+            raise ValueError(f"No bundle is promoted in {store_dir}")
+        bundle_id = current["bundle_id"]
+
+    manifest = verify_bundle(store_dir, bundle_id)
+    model = lgb.Booster(
+        model_file=get_bundle_path(store_dir, bundle_id, model_file)
+    )
+    encoder = ColumnEncoder.load(
+        get_bundle_path(store_dir, bundle_id, column_transformer_file)
+    )
+    return model, encoder, manifest
+
+
+def get_serving_paths(params: dict) -> Dict[str, str]:
+    """
+    Returns the paths to the served artifacts by their params keys. The
+    artifacts of the current bundle are used after verifying its checksums,
+    and the artifacts of the model path otherwise.
+
+    Params:
+        params: dict
+            The parameters.
+
+    Returns:
+        Dict[str, str]
+            The paths to the artifacts by their params keys.
+
+    Raises:
+        ValueError: If a file of the current bundle is changed.
+    """
+
+    paths = {
+        key: get_abs_path(params["model"]["path"], params["model"][key])
+        for key in SERVING_FILES
+    }
+    store_dir = os.path.join(get_project_dir(), params["store"]["path"])
+    current = get_current(store_dir)
+    if current is None:
+        return paths
+
+    bundle_id = current["bundle_id"]
+    manifest = verify_bundle(store_dir, bundle_id)
+    for key in SERVING_FILES:
+        if params["model"][key] in manifest["files"]:
+            paths[key] = get_bundle_path(
+                store_dir, bundle_id, params["model"][key]
+            )
+    return paths
@@ -0,0 +1,234 @@
+"""
+This module provides a command-line interface for the versioned artifact
+store of the serving model.
+
+The `save` command stores the model, the column encoder, the feature
+profile, the comparables index and the fold artifact as a bundle named by
+a hash of their content, with a manifest of the training parameters,
+a fingerprint of the interim datasets and the test metrics. The `promote`
+command points the current pointer, which the API serves, to a bundle, and
+`rollback` points it back to the previously promoted bundle. The `list`
+and `verify` commands show the bundles and check their checksums.
+
+The store path is set in the `store` section of params.yaml.
+
+Usage:
+    $ python store_model.py save --promote
+    $ python store_model.py promote 3f2a9c0d1e4b5a67
+    $ python store_model.py rollback
+    $ python store_model.py list
+    $ python store_model.py verify
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    get_project_dir,
+    setup_logging,
+)
+from src.features.cache import get_cache_key
+from src.models.store import (
+    get_current,
+    list_bundles,
+    promote as promote_bundle,
+    save_bundle,
+    verify_bundle,
+)
+from typing import Dict, Optional
+import json
+import logging
+import os
+import pandas as pd
+
+
+def get_store_dir(params: dict) -> str:
+    """
+    Returns the absolute path to the artifact store.
+    """
+
+    return os.path.join(get_project_dir(), params["store"]["path"])
+
+
+def get_bundle_files(params: dict) -> Dict[str, str]:
+    """
+    Returns the paths to the existing serving artifacts by their names.
+
+    Raises:
+        click.ClickException: If the model or the encoder doesn't exist.
+    """
+
+    files = {}
+    for key in (
+        "model_file",
+        "column_transformer_file",
+        "feature_profile_file",
+        "comparables_file",
+        "folds_file",
+    ):
+        name = params["model"][key]
+        path = get_abs_path(params["model"]["path"], name)
+        if os.path.exists(path):
+            files[name] = path
+        elif key in ("model_file", "column_transformer_file"):
+            raise click.ClickException(f"{path} doesn't exist")
+    return files
+
+
+def get_manifest(params: dict, files: Dict[str, str]) -> dict:
+    """
+    Returns the manifest of a new bundle with the training parameters,
+    a fingerprint of the interim datasets and the test metrics.
+    """
+
+    data_paths = [
+        get_abs_path(
+            params["data"]["interim_data_path"],
+            params["data"][f"{_}_data_file"],
+        )
+        for _ in ("train", "test")
+    ]
+    performance_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["model_performance_file"],
+    )
+
+    training = {"training": params["training"]}
+    folds_path = files.get(params["model"]["folds_file"])
+    if folds_path is not None:
+        with open(folds_path, "r") as f:
+            training["fold_metadata"] = json.load(f)["metadata"]
+
+    return {
+        "params": {
+            "features": params["data"]["features"],
+            "target": params["data"]["target"],
+            "categorical_features": params["model"]["categorical_features"],
+            **training,
+        },
+        "data_fingerprint": get_cache_key(
+            [_ for _ in data_paths if os.path.exists(_)], {}
+        ),
+        "metrics": pd.read_csv(performance_path).iloc[0].to_dict()
+        if os.path.exists(performance_path)
+        else {},
+    }
+
+
+@click.group()
+def cli() -> None:
+    """
+    Manages the versioned artifact store.
+    """
+
+
+@cli.command()
+@click.option(
+    "-p",
+    "--promote",
+    is_flag=True,
+    help="promote the bundle to the current one",
+)
+def save(promote: bool) -> None:
+    """
+    Stores the serving artifacts as a bundle.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    store_dir = get_store_dir(params)
+    files = get_bundle_files(params)
+    bundle_id = save_bundle(store_dir, files, get_manifest(params, files))
+    logger.info(f"Saved bundle {bundle_id} with {', '.join(files)}")
+    if promote:
+        promote_bundle(store_dir, bundle_id)
+        logger.info(f"Promoted bundle {bundle_id}")
+
+
+@cli.command()
+@click.argument("bundle_id")
+def promote(bundle_id: str) -> None:
+    """
+    Promotes a bundle to the current one.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    store_dir = get_store_dir(load_params())
+    try:
+        promote_bundle(store_dir, bundle_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    logger.info(f"Promoted bundle {bundle_id}")
+
+
+@cli.command()
+def rollback() -> None:
+    """
+    Promotes the previously promoted bundle back.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    store_dir = get_store_dir(load_params())
+    current = get_current(store_dir)
+    if current is None or current["previous"] is None:
+        raise click.ClickException("No previous bundle to roll back to")
+    promote_bundle(store_dir, current["previous"])
+    logger.info(
+        f"Rolled back from {current['bundle_id']} to {current['previous']}"
+    )
+
+
+@cli.command(name="list")
+def list_command() -> None:
+    """
+    Lists the stored bundles.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    store_dir = get_store_dir(load_params())
+    current = get_current(store_dir)
+    current_id = current["bundle_id"] if current else None
+    for manifest in list_bundles(store_dir):
+        metrics = ", ".join(
+            f"{k} {v:.4f}" for k, v in manifest["metrics"].items()
+        )
+        logger.info(
+            f"{'*' if manifest['bundle_id'] == current_id else ' '} "
+            f"{manifest['bundle_id']} {manifest['created_at']} "
+            f"data {manifest['data_fingerprint'][:16]} {metrics}"
+        )
+
+
+@cli.command()
+@click.argument("bundle_id", required=False)
+def verify(bundle_id: Optional[str]) -> None:
+    """
+    Checks the checksums of a bundle, the current one by default.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    store_dir = get_store_dir(load_params())
+    if bundle_id is None:
+        current = get_current(store_dir)
+        if current is None:
+            raise click.ClickException("No bundle is promoted")
+        bundle_id = current["bundle_id"]
+    try:
+        verify_bundle(store_dir, bundle_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    logger.info(f"Bundle {bundle_id} is intact")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    cli()
@@ -0,0 +1,193 @@
+"""
+The telemetry module records per-iteration training telemetry with
+a LightGBM callback and reads it back.
+
+For every boosting iteration the callback records the iteration number, its
+wall time, the cumulative training time, the resident set size of the
+process and the train and validation metrics. The records are buffered in
+memory and appended to the log file in batches, so the training loop isn't
+slowed down by small writes.
+
+A telemetry log is a binary file with a header and fixed width records:
+- magic bytes `LGBTLM01`,
+- the header length as a little endian uint32,
+- the JSON header with the column names and whether higher metric values
+  are better,
+- float64 records, one per iteration, in the column order.
+
+Classes:
+--------
+1. TelemetryLogger(path: str, batch_size: int = 100):
+    A LightGBM callback, which writes the telemetry log. It is used as
+    a context manager, so the last batch is written when training stops.
+
+Functions:
+----------
+1. read_telemetry(path: str) -> Tuple[pd.DataFrame, dict]:
+    Reads a telemetry log to a dataframe with one column per value.
+
+Example:
+--------
+from src.models.telemetry import TelemetryLogger, read_telemetry
+
+with TelemetryLogger("reports/lgbm_regressor_telemetry.bin") as telemetry:
+    booster = lgb.train(params, dataset, callbacks=[telemetry])
+
+records, header = read_telemetry("reports/lgbm_regressor_telemetry.bin")
+"""
+
+import json
+import os
+import resource
+import struct
+import time
+from typing import List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+MAGIC = b"LGBTLM01"
+BASE_COLUMNS = ["iteration", "seconds", "cumulative_seconds", "rss_mb"]
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class TelemetryLogger:
+    """
+    A LightGBM callback, which writes per-iteration telemetry to a binary
+    log in batches. The log file is replaced when the logger is entered.
+
+    Params:
+        path: str
+            The path to the telemetry log.
+        batch_size: int
+            The number of iterations buffered before they are written.
+    """
+
+    # run before early stopping, so the last iterations are recorded too
+    order = 10
+
+    def __init__(self, path: str, batch_size: int = 100) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._file = None
+        self._metrics: Optional[List[str]] = None
+        self._buffer: List[List[float]] = []
+        self._start = 0.0
+        self._last = 0.0
+
+    def __enter__(self) -> "TelemetryLogger":
+        self._file = open(self.path, "wb")
+        self._start = self._last = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __call__(self, env: lgb.callback.CallbackEnv) -> None:
+        now = time.perf_counter()
+        if self._metrics is None:
+            self._write_header(env.evaluation_result_list)
+
+        self._buffer.append(
+            [
+                env.iteration + 1,
+                now - self._last,
+                now - self._start,
+                get_rss_mb(),
+                *(_[2] for _ in env.evaluation_result_list),
+            ]
+        )
+        self._last = now
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered records to the log file.
+        """
+
+        if self._buffer and self._file is not None:
+            self._file.write(np.array(self._buffer, dtype="<f8").tobytes())
+            self._file.flush()
+            self._buffer = []
+
+    def close(self) -> None:
+        """
+        Writes the buffered records and closes the log file.
+        """
+
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def _write_header(self, evaluation_result_list: list) -> None:
+        """
+        Writes the header with column names to the log file.
+        """
+
+        # cv results are aggregated over folds and prefixed with "cv_agg"
+        self._metrics = [
+            _[1] if _[0] == "cv_agg" else f"{_[0]} {_[1]}"
+            for _ in evaluation_result_list
+        ]
+        header = json.dumps(
+            {
+                "columns": BASE_COLUMNS + self._metrics,
+                "higher_better": {
+                    name: bool(_[3])
+                    for name, _ in zip(self._metrics, evaluation_result_list)
+                },
+            }
+        ).encode("utf-8")
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+
+def get_rss_mb() -> float:
+    """
+    Returns the resident set size of the current process. Where
+    `/proc/self/statm` is not available, the peak resident set size is
+    returned.
+
+    Returns:
+        float
+            The resident set size in megabytes.
+    """
+
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def read_telemetry(path: str) -> Tuple[pd.DataFrame, dict]:
+    """
+    Reads a telemetry log.
+
+    Params:
+        path: str
+            The path to the telemetry log.
+
+    Returns:
+        Tuple[pandas.DataFrame, dict]
+            The records with one row per iteration, and the header.
+
+    Raises:
+        ValueError: If the file is not a telemetry log.
+    """
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a telemetry log")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+        values = np.fromfile(f, dtype="<f8")
+
+    columns = header["columns"]
+    records = pd.DataFrame(
+        values.reshape(-1, len(columns)), columns=columns
+    ).astype({"iteration": int})
+    return records, header
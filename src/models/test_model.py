@@ -5,13 +5,26 @@ performance metrics, logs them, and saves them to a CSV file.
 
 The dataset and the paths to the model and model performance files
 are specified in a config file `params.yaml` which is loaded with the
-`load_params()` function.
+`load_params()` function. The features are mapped from the feature cache
+written by `build_features` when it is available.
+
+The confidence intervals of the metrics are estimated with the bootstrap
+resamples set in the `bootstrap` section of params.yaml and saved to
+a CSV file. With the `--compare` option, another model file is evaluated on
+the same resamples, and the differences of its metrics from the model
+metrics are saved to the comparison file.
+
+With the `--chunk-size` option the test dataset is evaluated chunk by
+chunk with running sums of the metrics in constant memory. The bootstrap
+confidence intervals need all the predictions and are skipped then.
 
 This module provides a `main()` function that can be run as a command line
 interface.
 
 Usage:
     $ python test_model.py
+    $ python test_model.py --compare models/lgbm_regressor_compact.txt
+    $ python test_model.py --chunk-size 100000
 
 Returns:
     None
@@ -24,6 +37,16 @@ from src.utils.functions import (
     get_abs_path,
     setup_logging,
 )
+from src.data.datatypes import DatasetStage
+from src.features.functions import restore_target
+from src.models.functions import load_features, iter_features
+from src.models.accumulators import MetricAccumulator
+from src.models.bootstrap import (
+    bootstrap_metrics,
+    confidence_intervals,
+    compare_models,
+)
+from typing import Iterable, Optional, Tuple
 import logging
 import lightgbm as lgb
 import pandas as pd
@@ -36,8 +59,97 @@ from sklearn.metrics import (
 )
 
 
+def evaluate_model(
+    model: lgb.Booster, features: np.ndarray, target: np.ndarray
+) -> dict:
+    """
+    Calculates performance metrics of a model. R2 is calculated on the
+    transformed target, MAE, MAPE and RMSE on the restored price.
+
+    Params:
+        model: lightgbm.Booster
+            The model to evaluate.
+        features: numpy.ndarray
+            The transformed features.
+        target: numpy.ndarray
+            The transformed target.
+
+    Returns:
+        dict
+            The R2, MAE, MAPE and RMSE metrics.
+    """
+
+    return evaluate_predictions(target, model.predict(features))
+
+
+def evaluate_predictions(target: np.ndarray, preds: np.ndarray) -> dict:
+    """
+    Calculates the performance metrics of `evaluate_model` from the
+    predictions of a model.
+
+    Params:
+        target: numpy.ndarray
+            The transformed target.
+        preds: numpy.ndarray
+            The predictions of the transformed target.
+
+    Returns:
+        dict
+            The R2, MAE, MAPE and RMSE metrics.
+    """
+
+    # the float32 target of the feature cache is evaluated in float64 like
+    # in the chunked evaluation
+    target = np.asarray(target, dtype=np.float64)
+    preds = np.asarray(preds, dtype=np.float64)
+    price, price_preds = restore_target(target), restore_target(preds)
+    return {
+        "r2": r2_score(target, preds),
+        "mae": mean_absolute_error(price, price_preds),
+        "mape": mean_absolute_percentage_error(price, price_preds),
+        "rmse": mean_squared_error(price, price_preds) ** 0.5,
+    }
+
+
+def evaluate_model_chunked(
+    model: lgb.Booster, chunks: Iterable[Tuple[np.ndarray, np.ndarray]]
+) -> dict:
+    """
+    Calculates performance metrics of a model over chunks of a dataset in
+    constant memory. The metrics match the ones of `evaluate_model` on the
+    whole dataset.
+
+    Params:
+        model: lightgbm.Booster
+            The model to evaluate.
+        chunks: Iterable[Tuple[numpy.ndarray, numpy.ndarray]]
+            The chunks of the transformed features and target.
+
+    Returns:
+        dict
+            The R2, MAE, MAPE and RMSE metrics.
+    """
+
+    accumulator = MetricAccumulator()
+    for features, target in chunks:
+        accumulator.update(target, model.predict(features))
+    return accumulator.result()
+
+
 @click.command()
-def main() -> None:
+@click.option(
+    "-c",
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False),
+    help="model file to compare with the model on the same resamples",
+)
+@click.option(
+    "-s",
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    help="evaluate the test dataset in chunks of this number of rows",
+)
+def main(compare: Optional[str], chunk_size: Optional[int]) -> None:
     """Tests model
 
     This function loads a saved LightGBM model and tests it against
@@ -47,7 +159,14 @@ def main() -> None:
 
     The function calculates the R2, MAE, MAPE, and RMSE performance metrics,
     logs them, and saves them to a CSV file at the location specified in
-    the config file.
+    the config file. The bootstrap confidence intervals of the metrics,
+    and the paired comparison with another model if it is given, are
+    saved to CSV files too.
+
+    Params:
+        compare (str): The path to a model file to compare with the model.
+        chunk_size (int): The number of rows to evaluate at once, or None
+                          to evaluate the whole dataset in memory.
 
     Returns:
         None: The function doesn't return anything.
@@ -71,25 +190,78 @@ def main() -> None:
         params["model"]["model_performance_file"],
     )
 
-    df = pd.read_csv(test_dataset_path)
-    features = df[params["data"]["features"]]
-    target = df[params["data"]["target"]]
+    if compare and chunk_size:
+        raise click.UsageError("--compare can't be used with --chunk-size")
 
     model = lgb.Booster(model_file=model_path)
 
-    preds = model.predict(features.values)
-    metrics = {
-        "r2": [r2_score(target, preds)],
-        "mae": [mean_absolute_error(10**target, 10**preds)],
-        "mape": [mean_absolute_percentage_error(10**target, 10**preds)],
-        "rmse": [mean_squared_error(10**target, 10**preds) ** 0.5],
-    }
-    logger.info(f"R2:   {np.mean(metrics['r2']):>8.4f}")
-    logger.info(f"MAE:  {np.mean(metrics['mae']):>8.4f}")
-    logger.info(f"MAPE: {np.mean(metrics['mape']):>8.4f}")
-    logger.info(f"RMSE: {np.mean(metrics['rmse']):>8.4f}")
+    if chunk_size:
+        metrics = evaluate_model_chunked(
+            model,
+            iter_features(params, DatasetStage.TEST, chunk_size, logger),
+        )
+    else:
+        features, target = load_features(params, DatasetStage.TEST, logger)
+        preds = model.predict(features)
+        metrics = evaluate_predictions(target, preds)
+    logger.info(f"R2:   {metrics['r2']:>8.4f}")
+    logger.info(f"MAE:  {metrics['mae']:>8.4f}")
+    logger.info(f"MAPE: {metrics['mape']:>8.4f}")
+    logger.info(f"RMSE: {metrics['rmse']:>8.4f}")
+
+    pd.DataFrame([metrics]).to_csv(model_performance_path, index=False)
+    if chunk_size:
+        logger.info("Bootstrap is skipped in chunked evaluation")
+        logger.info("Done model test")
+        return
+
+    settings = params["bootstrap"]
+    intervals = confidence_intervals(
+        bootstrap_metrics(
+            target,
+            preds,
+            settings["n_resamples"],
+            params["random_seed"],
+            settings["chunk_size"],
+        ),
+        settings["confidence"],
+    )
+    for metric, row in intervals.iterrows():
+        logger.info(
+            f"{metric.upper():<5} {settings['confidence']:.0%} CI "
+            f"[{row['low']:>8.4f}, {row['high']:>8.4f}]"
+        )
+    intervals.to_csv(
+        get_abs_path(
+            params["model"]["report_path"], params["model"]["bootstrap_file"]
+        ),
+        index_label="metric",
+    )
 
-    pd.DataFrame(metrics).to_csv(model_performance_path, index=False)
+    if compare:
+        other = lgb.Booster(model_file=compare)
+        comparison = compare_models(
+            target,
+            preds,
+            other.predict(features),
+            settings["n_resamples"],
+            params["random_seed"],
+            settings["confidence"],
+            settings["chunk_size"],
+        )
+        for metric, row in comparison.iterrows():
+            logger.info(
+                f"{metric.upper():<5} difference {row['mean']:>8.4f} "
+                f"[{row['low']:>8.4f}, {row['high']:>8.4f}], "
+                f"better in {row['better_share']:.1%} of resamples"
+            )
+        comparison.to_csv(
+            get_abs_path(
+                params["model"]["report_path"],
+                params["model"]["comparison_file"],
+            ),
+            index_label="metric",
+        )
     logger.info("Done model test")
 
 
@@ -5,7 +5,8 @@ evaluation history to files in a directory specified in the params.yaml
 configuration file.
 
 The main function reads parameters from a configuration file, loads the
-training dataset and categorical feature names from CSV files, trains
+binned training dataset from the feature cache written by `build_features`
+(or the training dataset from the CSV file if it isn't cached), trains
 a LightGBM model with cross-validation and early stopping, and saves the
 trained model and evaluation history to files.
 
@@ -13,14 +14,43 @@ The params.yaml configuration file contains information on file paths and other
 parameters required for model training. The train_dataset_path specifies the
 path to the CSV file containing the training dataset.
 
-The model_path and eval_hist_path specify the paths
-to the files to save the trained model and evaluation history, respectively.
+The model_path, folds_path and eval_hist_path specify the paths to the
+files to save the merged model, the fold boosters and evaluation history,
+respectively.
 
-The LightGBM model is trained using the lgb.cv function with the cvbooster
-object saved to file. The evaluation history is saved to a CSV file too.
+The LightGBM model is trained using the lgb.cv function. Per-iteration
+time, memory and metrics are written to the telemetry log in the report
+path, which is summarized by `report_telemetry`. All fold boosters
+are saved up to the best iteration with metadata to the fold artifact, and
+merged into a single booster averaging the folds, which is saved to the
+model file and served by the API. The evaluation history is saved to a CSV
+file too.
+The model parameters, the number of boosting rounds and folds are set in
+the `training` section of params.yaml. With the `--tuned` option the best
+parameters found by `tune_model` are used instead.
+
+With the `--incremental` option the current model is not retrained from
+scratch. Boosting continues from the saved model on the training data with
+the rounds and time budget set in the `incremental` section of params.yaml.
+The training metrics are monitored on a validation shard held out of the
+training rows. The candidate model is evaluated against the current one on
+the test dataset and promoted only if its metrics don't regress. The
+promoted model replaces the fold artifact as an ensemble of one booster,
+and the current bundle of the artifact store, if any bundle is promoted.
+
+With the `--workers N` option a single model is trained without
+cross-validation with data parallel learning in N local worker processes,
+each with a shard of the training features, with the learning rate and
+early stopping on a validation shard set in the `distributed` section of
+params.yaml. The model is a candidate, which is promoted like the one of
+`--incremental`.
 
 Usage:
     $ python train_model.py
+    $ python train_model.py --tuned
+    $ python train_model.py --incremental
+    $ python train_model.py --workers 4
+    $ python train_model.py --profile
 
 Returns:
     None
@@ -36,13 +66,324 @@ from src.utils.functions import (
     get_abs_path,
     setup_logging,
 )
+from src.utils.profiling import profile_option
+from src.data.datatypes import DatasetStage
+from src.models.functions import (
+    get_model_params,
+    load_train_dataset,
+    load_features,
+    split_validation,
+    time_budget,
+    is_regressed,
+    save_model,
+)
+from src.models.test_model import evaluate_model
+from src.models.ensemble import save_ensemble, merge_boosters
+from src.models.distributed import train_distributed
+from src.models.store import (
+    get_current,
+    promote as promote_bundle,
+    save_bundle,
+)
+from src.models.store_model import (
+    get_bundle_files,
+    get_manifest,
+    get_store_dir,
+)
+from src.models.telemetry import TelemetryLogger
+from typing import Optional
 import logging
+import os
 import lightgbm as lgb
 import pandas as pd
+import yaml
+
+
+def promote_candidate(
+    params: dict,
+    candidate: lgb.Booster,
+    metadata: dict,
+    logger: logging.Logger,
+) -> bool:
+    """
+    Saves a candidate model, evaluates it against the current model on the
+    test dataset and promotes it if no metric regresses by more than
+    `incremental.max_regression`, or if there is no current model.
+
+    The promoted candidate replaces the model file, and the fold artifact
+    as an ensemble of one booster, so the stages reading the folds describe
+    the served model. Its test metrics are saved, and when a bundle of the
+    artifact store is promoted, the new artifacts are stored and promoted
+    as a bundle too.
+
+    Params:
+        params: dict
+            The project parameters.
+        candidate: lightgbm.Booster
+            The candidate model.
+        metadata: dict
+            The fold artifact metadata of the candidate, like its training
+            parameters.
+        logger: logging.Logger
+            The logger of the calling stage.
+
+    Returns:
+        bool
+            Whether the candidate is promoted.
+    """
+
+    model_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["model_file"],
+    )
+    candidate_path = get_abs_path(
+        params["model"]["path"],
+        params["incremental"]["candidate_model_file"],
+    )
+    folds_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["folds_file"],
+    )
+    model_performance_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["model_performance_file"],
+    )
+
+    save_model(candidate, candidate_path)
+    logger.info(
+        f"Saved candidate model {candidate_path} with "
+        f"{candidate.num_trees()} trees"
+    )
+
+    test_features, test_target = load_features(
+        params, DatasetStage.TEST, logger
+    )
+    candidate_metrics = evaluate_model(candidate, test_features, test_target)
+    if os.path.exists(model_path):
+        current = lgb.Booster(model_file=model_path)
+        current_metrics = evaluate_model(current, test_features, test_target)
+        for metric in current_metrics:
+            logger.info(
+                f"{metric.upper():<5} current "
+                f"{current_metrics[metric]:>8.4f} "
+                f"candidate {candidate_metrics[metric]:>8.4f}"
+            )
+        if is_regressed(
+            candidate_metrics,
+            current_metrics,
+            params["incremental"]["max_regression"],
+        ):
+            logger.info("Candidate model regressed, current model is kept")
+            return False
+    else:
+        logger.info(f"No current model {model_path}, promote the candidate")
+
+    # the best iteration of early stopping, all iterations otherwise
+    num_iteration = (
+        candidate.best_iteration
+        if candidate.best_iteration > 0
+        else candidate.current_iteration()
+    )
+    save_ensemble(
+        [candidate],
+        folds_path,
+        {
+            **metadata,
+            "best_iteration": num_iteration,
+            "feature_names": candidate.feature_name(),
+        },
+        num_iteration=num_iteration,
+    )
+    os.replace(candidate_path, model_path)
+    pd.DataFrame([candidate_metrics]).to_csv(
+        model_performance_path, index=False
+    )
+    logger.info(f"Promoted candidate model to {model_path} and {folds_path}")
+
+    store_dir = get_store_dir(params)
+    if get_current(store_dir) is not None:
+        files = get_bundle_files(params)
+        bundle_id = save_bundle(store_dir, files, get_manifest(params, files))
+        promote_bundle(store_dir, bundle_id)
+        logger.info(f"Promoted bundle {bundle_id} of the candidate model")
+    return True
+
+
+def train_incremental(params: dict, logger: logging.Logger) -> None:
+    """
+    Continues boosting the current model on the training data with
+    a limited number of rounds and time budget, and promotes the candidate
+    model if its test metrics don't regress.
+
+    Params:
+        params: dict
+            The project parameters.
+        logger: logging.Logger
+            The logger of the calling stage.
+
+    Raises:
+        click.ClickException: If there is no current model to continue.
+    """
+
+    incremental = params["incremental"]
+    model_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["model_file"],
+    )
+    telemetry_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["telemetry_file"],
+    )
+    if not os.path.exists(model_path):
+        raise click.ClickException(f"No current model {model_path}")
+
+    # init scores are predicted by the current model from raw features,
+    # so the dataset is built from the features, not the binned cache;
+    # the telemetry monitors a validation shard held out of the rows
+    features, target = load_features(params, DatasetStage.TRAIN, logger)
+    (
+        train_features,
+        train_target,
+        valid_features,
+        valid_target,
+    ) = split_validation(
+        features,
+        target,
+        incremental["validation_fraction"],
+        params["random_seed"],
+    )
+    dataset = lgb.Dataset(
+        train_features,
+        label=train_target,
+        feature_name=params["data"]["features"],
+        categorical_feature=params["model"]["categorical_features"],
+        free_raw_data=False,
+    )
+    valid_dataset = lgb.Dataset(
+        valid_features, label=valid_target, reference=dataset
+    )
+
+    current = lgb.Booster(model_file=model_path)
+    logger.info(
+        f"Continue model {model_path} with {current.num_trees()} trees "
+        f"for up to {incremental['num_boost_round']} rounds "
+        f"or {incremental['time_budget']} seconds"
+    )
+    model_params = {
+        **get_model_params(params),
+        "learning_rate": incremental["learning_rate"],
+    }
+    with TelemetryLogger(
+        telemetry_path, params["training"]["telemetry_batch_size"]
+    ) as telemetry:
+        candidate = lgb.train(
+            model_params,
+            dataset,
+            num_boost_round=incremental["num_boost_round"],
+            init_model=current,
+            valid_sets=[valid_dataset],
+            valid_names=["valid"],
+            callbacks=[time_budget(incremental["time_budget"]), telemetry],
+        )
+
+    promote_candidate(
+        params,
+        candidate,
+        {"params": model_params, "source": "incremental"},
+        logger,
+    )
+
+
+def train_sharded(
+    params: dict, model_params: dict, n_workers: int, logger: logging.Logger
+) -> None:
+    """
+    Trains a single model with data parallel learning in local worker
+    processes, with early stopping on a validation shard held out of the
+    training rows, and promotes it if its test metrics don't regress.
+
+    Params:
+        params: dict
+            The project parameters.
+        model_params: dict
+            The LightGBM training parameters.
+        n_workers: int
+            The number of worker processes.
+        logger: logging.Logger
+            The logger of the calling stage.
+    """
+
+    distributed = params["distributed"]
+    model_params = {
+        **model_params,
+        "learning_rate": distributed["learning_rate"],
+    }
+
+    features, target = load_features(params, DatasetStage.TRAIN, logger)
+    (
+        train_features,
+        train_target,
+        valid_features,
+        valid_target,
+    ) = split_validation(
+        features,
+        target,
+        distributed["validation_fraction"],
+        params["random_seed"],
+    )
+    logger.info(
+        f"Train model on {train_features.shape[0]} rows with {n_workers} "
+        f"workers for up to {distributed['num_boost_round']} rounds, "
+        f"validate on {valid_features.shape[0]} rows"
+    )
+    booster = train_distributed(
+        train_features,
+        train_target,
+        model_params,
+        distributed["num_boost_round"],
+        n_workers,
+        params["data"]["features"],
+        params["model"]["categorical_features"],
+        distributed["time_out"],
+        valid_features,
+        valid_target,
+        distributed["early_stopping_rounds"],
+    )
+    logger.info(f"Trained model with {booster.current_iteration()} iterations")
+
+    promote_candidate(
+        params,
+        booster,
+        {
+            "params": model_params,
+            "source": "distributed",
+            "n_workers": n_workers,
+        },
+        logger,
+    )
 
 
 @click.command()
-def main() -> None:
+@click.option(
+    "-t",
+    "--tuned",
+    is_flag=True,
+    help="use the best parameters found by tune_model",
+)
+@click.option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    help="continue boosting the current model and promote it if better",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    help="train one model with data parallel learning in local workers",
+)
+@profile_option("train_model")
+def main(tuned: bool, incremental: bool, workers: Optional[int]) -> None:
     """
     Trains a LightGBM regression model with cross-validation and save
     the trained model and evaluation history.
@@ -52,10 +393,37 @@ def main() -> None:
     trains a LightGBM model with cross-validation and early stopping,
     and saves the trained model and evaluation history to files in a
     directory specified in `params.yaml` configuration file.
+
+    Params:
+        tuned (bool): Whether to override the `training.params` with
+                      the best parameters found by `tune_model`.
+        incremental (bool): Whether to continue boosting the current model
+                            instead of training from scratch.
+        workers (int): The number of local workers to train the model with
+                       data parallel learning instead of cross-validation.
     """
     logger = logging.getLogger(__name__)
 
     params = load_params()
+    if incremental:
+        train_incremental(params, logger)
+        return
+
+    model_params = get_model_params(params)
+    if tuned:
+        best_params_path = get_abs_path(
+            params["model"]["report_path"],
+            params["tuning"]["best_params_file"],
+        )
+        with open(best_params_path, "r") as f:
+            best_params = yaml.safe_load(f)["params"]
+        model_params.update(best_params)
+        logger.info(f"Use tuned parameters {best_params}")
+
+    if workers:
+        train_sharded(params, model_params, workers, logger)
+        return
+
     train_dataset_path = get_abs_path(
         params["data"]["processed_data_path"],
         params["data"]["train_data_file"],
@@ -66,54 +434,68 @@ def main() -> None:
         params["model"]["path"],
         params["model"]["model_file"],
     )
+    folds_path = get_abs_path(
+        params["model"]["path"],
+        params["model"]["folds_file"],
+    )
     eval_hist_path = get_abs_path(
         params["model"]["report_path"],
         params["model"]["eval_hist_file"],
     )
+    telemetry_path = get_abs_path(
+        params["model"]["report_path"],
+        params["model"]["telemetry_file"],
+    )
 
     categorical_features = params["model"]["categorical_features"]
     logger.info(f"Categorical feature names {', '.join(categorical_features)}")
 
-    df = pd.read_csv(train_dataset_path)
-    features = df[params["data"]["features"]]
-    target = df[params["data"]["target"]]
-
-    dataset = lgb.Dataset(
-        features,
-        label=target,
-        feature_name=features.columns.to_list(),
-        categorical_feature=categorical_features,
-        free_raw_data=False,
-    ).construct()
+    dataset = load_train_dataset(params, logger)
 
     logger.info(
         f"Constructed dataset with {dataset.num_data()} rows "
         f"and {dataset.num_feature()} features"
     )
 
-    model_params = {
-        "task": "train",
-        "objective": "regression",
-        "metric": "mse",
-        "learning_rate": 0.001,
-        "lambda_l2": 0.5,
-        "seed": params["random_seed"],
-        "verbose": 2,
-    }
-    eval_hist = lgb.cv(
-        model_params,
-        dataset,
-        num_boost_round=10000,
-        nfold=5,
-        stratified=False,
-        shuffle=True,
-        eval_train_metric=True,
-        callbacks=[lgb.early_stopping(50)],
-        return_cvbooster=True,
-    )
+    training = params["training"]
+    with TelemetryLogger(
+        telemetry_path, training["telemetry_batch_size"]
+    ) as telemetry:
+        eval_hist = lgb.cv(
+            model_params,
+            dataset,
+            num_boost_round=training["num_boost_round"],
+            nfold=training["nfold"],
+            stratified=False,
+            shuffle=True,
+            eval_train_metric=True,
+            callbacks=[
+                lgb.early_stopping(training["early_stopping_rounds"]),
+                telemetry,
+            ],
+            return_cvbooster=True,
+        )
 
     cvbooster = eval_hist.pop("cvbooster")
-    cvbooster.save_model(model_path)
+    best_iteration = cvbooster.best_iteration
+    save_ensemble(
+        cvbooster.boosters,
+        folds_path,
+        {
+            "best_iteration": best_iteration,
+            "feature_names": dataset.get_feature_name(),
+            "params": model_params,
+            "cv_score": {k: v[-1] for k, v in eval_hist.items()},
+        },
+        num_iteration=best_iteration,
+    )
+    logger.info(
+        f"Saved {len(cvbooster.boosters)} fold boosters with "
+        f"{best_iteration} iterations to {folds_path}"
+    )
+
+    # serve all folds with one booster averaging their predictions
+    save_model(merge_boosters(cvbooster.boosters, best_iteration), model_path)
 
     pd.DataFrame(eval_hist).to_csv(eval_hist_path)
     logger.info("Model is trained")
@@ -0,0 +1,300 @@
+"""
+This module provides a command-line interface for tuning hyperparameters
+of the LightGBM regression model with a parallel random search and
+successive halving pruning.
+
+The search space, the number of trials and the pruning settings are set in
+the `tuning` section of params.yaml. Every search space entry has a
+`distribution` (`uniform`, `log_uniform` or `int_uniform`) with `low` and
+`high` bounds.
+
+The search goes through rungs. At the first rung all sampled trials are
+evaluated with cross-validation for `min_boost_round` rounds. At each next
+rung only the best `1 / reduction_factor` of the trials are kept and
+evaluated with `reduction_factor` times more boosting rounds, until one
+trial is left or the `training.num_boost_round` limit is reached.
+
+Trials run in a process pool of `n_jobs` workers with `num_threads`
+LightGBM threads per trial. Every worker loads the pre-binned training
+dataset written by `build_features` once, so the features are never
+re-binned.
+
+The leaderboard of all evaluated trials and the best parameters are saved
+to the report path. The best parameters are used by
+`train_model.py --tuned`.
+
+Usage:
+    $ python tune_model.py
+
+Returns:
+    None
+"""
+
+import click
+from src.utils.functions import (
+    load_params,
+    get_abs_path,
+    setup_logging,
+)
+from src.data.datatypes import DatasetStage
+from src.features.cache import (
+    get_cache_dir,
+    BINARY_DATASET_FILE,
+    BINARY_DATASET_PARAMS,
+)
+from src.models.functions import get_model_params
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import logging
+import os
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import yaml
+
+# training dataset loaded once per worker process
+_DATASET: Optional[lgb.Dataset] = None
+
+
+def sample_params(search_space: dict, n_trials: int, seed: int) -> List[dict]:
+    """
+    Samples trial parameters from the search space.
+
+    Params:
+        search_space: dict
+            The parameter distributions with `distribution`, `low`
+            and `high` keys.
+        n_trials: int
+            The number of trials to sample.
+        seed: int
+            The random seed.
+
+    Returns:
+        List[dict]
+            The parameters of each trial.
+
+    Raises:
+        ValueError: If a distribution is not supported.
+    """
+
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, space in search_space.items():
+        low, high = space["low"], space["high"]
+        if space["distribution"] == "uniform":
+            values = rng.uniform(low, high, n_trials).tolist()
+        elif space["distribution"] == "log_uniform":
+            values = np.exp(
+                rng.uniform(np.log(low), np.log(high), n_trials)
+            ).tolist()
+        elif space["distribution"] == "int_uniform":
+            values = rng.integers(low, high, n_trials, endpoint=True).tolist()
+        else:
+            raise ValueError(
+                f"Unknown distribution {space['distribution']} of {name}"
+            )
+        samples[name] = values
+
+    return [
+        {name: values[i] for name, values in samples.items()}
+        for i in range(n_trials)
+    ]
+
+
+def select_survivors(scores: List[float], reduction_factor: int) -> List[int]:
+    """
+    Selects the best trials of a rung for the next rung.
+
+    Params:
+        scores: List[float]
+            The cross-validation scores of the rung trials, lower is better.
+        reduction_factor: int
+            The rung keeps `1 / reduction_factor` of the trials.
+
+    Returns:
+        List[int]
+            The positions of the selected trials, best first.
+    """
+
+    n_keep = max(1, len(scores) // reduction_factor)
+    return np.argsort(scores, kind="stable")[:n_keep].tolist()
+
+
+def _init_worker(dataset_path: str) -> None:
+    """
+    Loads the pre-binned training dataset in a worker process.
+    """
+
+    global _DATASET
+    _DATASET = lgb.Dataset(
+        dataset_path, params=BINARY_DATASET_PARAMS, free_raw_data=False
+    ).construct()
+
+
+def _run_trial(
+    trial: int,
+    rung: int,
+    trial_params: dict,
+    model_params: dict,
+    num_boost_round: int,
+    nfold: int,
+    early_stopping_rounds: int,
+) -> dict:
+    """
+    Evaluates the trial parameters with cross-validation in a worker
+    process and returns the leaderboard record.
+    """
+
+    eval_hist = lgb.cv(
+        {**model_params, **trial_params},
+        _DATASET,
+        num_boost_round=num_boost_round,
+        nfold=nfold,
+        stratified=False,
+        shuffle=True,
+        seed=model_params["seed"],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)],
+    )
+    metric = next(_ for _ in eval_hist if _.endswith("-mean"))
+
+    return {
+        "trial": trial,
+        "rung": rung,
+        "num_boost_round": num_boost_round,
+        "best_iteration": len(eval_hist[metric]),
+        "score": eval_hist[metric][-1],
+        "score_stdv": eval_hist[metric.replace("-mean", "-stdv")][-1],
+        **trial_params,
+    }
+
+
+@click.command()
+def main() -> None:
+    """
+    Tunes hyperparameters of the LightGBM regression model with a parallel
+    random search and successive halving, and saves the leaderboard and
+    the best parameters to files in the report path.
+
+    Raises:
+        click.ClickException: If the binned training dataset isn't cached
+            by `build_features`.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    params = load_params()
+    tuning = params["tuning"]
+    training = params["training"]
+
+    cache_dir = get_cache_dir(params, DatasetStage.TRAIN)
+    dataset_path = (
+        os.path.join(cache_dir, BINARY_DATASET_FILE) if cache_dir else None
+    )
+    if dataset_path is None or not os.path.exists(dataset_path):
+        raise click.ClickException(
+            "Binned training dataset is not found, run build_features first"
+        )
+    logger.info(f"Tune model with dataset {dataset_path}")
+
+    leaderboard_path = get_abs_path(
+        params["model"]["report_path"], tuning["leaderboard_file"]
+    )
+    best_params_path = get_abs_path(
+        params["model"]["report_path"], tuning["best_params_file"]
+    )
+
+    model_params = {
+        **get_model_params(params),
+        "num_threads": tuning["num_threads"],
+        "verbose": -1,
+    }
+    trials = sample_params(
+        tuning["search_space"], tuning["n_trials"], params["random_seed"]
+    )
+    logger.info(
+        f"Sampled {len(trials)} trials, run them in {tuning['n_jobs']} "
+        f"processes with {tuning['num_threads']} threads each"
+    )
+
+    alive = list(range(len(trials)))
+    num_boost_round = tuning["min_boost_round"]
+    rung = 0
+    records = []
+    with ProcessPoolExecutor(
+        max_workers=tuning["n_jobs"],
+        initializer=_init_worker,
+        initargs=(dataset_path,),
+    ) as executor:
+        while True:
+            futures = [
+                executor.submit(
+                    _run_trial,
+                    trial,
+                    rung,
+                    trials[trial],
+                    model_params,
+                    num_boost_round,
+                    training["nfold"],
+                    training["early_stopping_rounds"],
+                )
+                for trial in alive
+            ]
+            results = [_.result() for _ in futures]
+            records.extend(results)
+
+            scores = [_["score"] for _ in results]
+            logger.info(
+                f"Rung {rung}: {len(alive)} trials with {num_boost_round} "
+                f"rounds, best score {min(scores):.6f}"
+            )
+
+            if (
+                len(alive) == 1
+                or num_boost_round >= training["num_boost_round"]
+            ):
+                break
+            alive = [
+                alive[_]
+                for _ in select_survivors(scores, tuning["reduction_factor"])
+            ]
+            rung += 1
+            num_boost_round = min(
+                num_boost_round * tuning["reduction_factor"],
+                training["num_boost_round"],
+            )
+
+    leaderboard = pd.DataFrame(records).sort_values(
+        ["rung", "score"], ascending=[False, True]
+    )
+    leaderboard.to_csv(leaderboard_path, index=False)
+    logger.info(f"Saved leaderboard of {len(records)} evaluations")
+
+    best = leaderboard.iloc[0]
+    best_params = {
+        name: (
+            int(best[name])
+            if tuning["search_space"][name]["distribution"] == "int_uniform"
+            else float(best[name])
+        )
+        for name in tuning["search_space"]
+    }
+    with open(best_params_path, "w") as f:
+        yaml.safe_dump(
+            {
+                "params": best_params,
+                "num_boost_round": int(best["best_iteration"]),
+                "score": float(best["score"]),
+                "n_rungs": rung + 1,
+                "n_trials": len(trials),
+                "pruned_trials": len(trials) - len(alive),
+            },
+            f,
+        )
+    logger.info(f"Best trial {int(best['trial'])} with {best_params}")
+    logger.info("Use the best parameters with `python train_model.py --tuned`")
+
+
+if __name__ == "__main__":
+    logger = setup_logging(logname=__name__, loglevel="INFO")
+
+    main()
@@ -0,0 +1,286 @@
+"""
+A module with the typed project configuration, parsed from params.yaml once
+per process.
+
+The pipeline stages and the API used to parse params.yaml with every
+`load_params()` call, and the feature validation of the data cleaning
+called it for every row. The configuration is now parsed on the first
+`get_config()` call and memoized. The `Config` object keeps the raw
+parameters and precomputed accessors for the values used on the hot paths:
+the feature limits, the feature lists and the artifact paths.
+
+The configuration is validated when it is built: the features must be
+set, the categorical features and the limited features must be features,
+and the limits must be numbers, otherwise `ValueError` is raised and the
+memoized configuration is kept.
+
+`load_params()` returns a copy of the memoized parameters, so callers can
+modify them without affecting each other. A long-running process, like the
+API, picks up a changed params.yaml with an explicit `reload_config()`.
+
+A named profile of the `profiles` section of params.yaml overrides the
+parameters when it is set in the `PARAMS_PROFILE` environment variable.
+The sections of the profile are merged into the parameters recursively,
+so a profile sets only the values it changes. For example, the `smoke`
+profile runs the pipeline on a sample of the data with capped training
+and separate artifact paths.
+
+Classes:
+- Config: The typed project configuration.
+
+Functions:
+- get_config() -> Config: Returns the memoized configuration, parsing
+  params.yaml on the first call.
+- reload_config() -> Config: Parses params.yaml again and replaces the
+  memoized configuration.
+- apply_profile(params: dict, profile: str) -> dict: Merges a profile
+  into the parameters.
+
+Usage:
+    from src.utils.config import get_config
+
+    config = get_config()
+    for feature, limit in config.feature_limits.items():
+        ...
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import yaml
+
+from src.utils.functions import get_abs_path, get_project_dir
+
+PARAMS_FILE = "params.yaml"
+PROFILE_VARIABLE = "PARAMS_PROFILE"
+
+
+@dataclass(frozen=True)
+class Config:
+    """
+    The typed project configuration.
+
+    Attributes:
+        - `params`: the raw parameters of params.yaml, which must not be
+          modified; use `load_params()` for a modifiable copy.
+        - `features`: the model features in training order.
+        - `target`: the target column.
+        - `categorical_columns`: the text columns loaded as categoricals.
+        - `categorical_features`: the features treated as categorical by
+          the model.
+        - `feature_limits`: the upper limits of valid feature values.
+        - `target_limit`: the upper limit of valid target values.
+        - `model_path`, `column_transformer_path`, `feature_profile_path`:
+          the absolute paths to the serving artifacts.
+        - `profile`: the name of the applied profile, if any.
+    """
+
+    params: dict = field(repr=False)
+    features: List[str]
+    target: str
+    categorical_columns: List[str]
+    categorical_features: List[str]
+    feature_limits: Dict[str, float]
+    target_limit: float
+    model_path: str
+    column_transformer_path: str
+    feature_profile_path: str
+    profile: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        """
+        Validates the configuration.
+
+        Raises:
+            ValueError: If no features are set, the categorical features or
+                the limited features aren't features, or a limit isn't
+                a number.
+        """
+
+        errors = []
+        if not self.features:
+            errors.append("no features are set")
+        for name, values in (
+            ("categorical features", self.categorical_features),
+            ("limited features", self.feature_limits),
+        ):
+            unknown = [_ for _ in values if _ not in self.features]
+            if unknown:
+                errors.append(f"{name} {', '.join(unknown)} aren't features")
+        not_numbers = [
+            k for k, v in self.feature_limits.items() if not _is_number(v)
+        ]
+        if not_numbers:
+            errors.append(f"limits of {', '.join(not_numbers)} aren't numbers")
+        if not _is_number(self.target_limit):
+            errors.append("the target limit isn't a number")
+        if errors:
+            raise ValueError(f"Invalid params: {'; '.join(errors)}")
+
+    @classmethod
+    def from_params(
+        cls, params: dict, profile: Optional[str] = None
+    ) -> "Config":
+        """
+        Builds the configuration from the raw parameters.
+
+        Params:
+            params: dict
+                The parameters of params.yaml.
+            profile: str, optional
+                The name of the profile to apply.
+
+        Returns:
+            Config
+                The configuration.
+
+        Raises:
+            ValueError: If the profile doesn't exist or the configuration
+                is invalid.
+        """
+
+        if profile:
+            params = apply_profile(params, profile)
+        model = params["model"]
+        return cls(
+            params=params,
+            features=list(params["data"]["features"] or []),
+            target=params["data"]["target"],
+            categorical_columns=list(params["data"]["schema"]["categorical"]),
+            categorical_features=list(model["categorical_features"] or []),
+            feature_limits=dict(
+                params["data_cleaning"]["feature_limits"] or {}
+            ),
+            target_limit=params["data_cleaning"]["target_limit"],
+            model_path=get_abs_path(model["path"], model["model_file"]),
+            column_transformer_path=get_abs_path(
+                model["path"], model["column_transformer_file"]
+            ),
+            feature_profile_path=get_abs_path(
+                model["path"], model["feature_profile_file"]
+            ),
+            profile=profile or None,
+        )
+
+    @classmethod
+    def load(cls, path: str, profile: Optional[str] = None) -> "Config":
+        """
+        Parses the configuration from a YAML file.
+
+        Params:
+            path: str
+                The path to the parameters file.
+            profile: str, optional
+                The name of the profile to apply, by default it is taken
+                from the `PARAMS_PROFILE` environment variable.
+
+        Returns:
+            Config
+                The configuration.
+        """
+
+        if profile is None:
+            profile = os.environ.get(PROFILE_VARIABLE)
+        with open(path, "r") as f:
+            return cls.from_params(yaml.safe_load(f), profile)
+
+
+def _is_number(value) -> bool:
+    """
+    Checks whether a parameter value is an integer or a float.
+    """
+
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def apply_profile(params: dict, profile: str) -> dict:
+    """
+    Merges a profile of the `profiles` section into the parameters. Nested
+    sections are merged recursively, and the other values are replaced.
+
+    Params:
+        params: dict
+            The parameters of params.yaml.
+        profile: str
+            The name of the profile.
+
+    Returns:
+        dict
+            The new parameters.
+
+    Raises:
+        ValueError: If the profile doesn't exist.
+    """
+
+    profiles = params.get("profiles") or {}
+    if profile not in profiles:
+        raise ValueError(
+            f"Unknown params profile {profile}, "
+            f"expected one of {', '.join(profiles)}"
+        )
+    return _merge(params, profiles[profile])
+
+
+def _merge(base: dict, overrides: dict) -> dict:
+    """
+    Returns a copy of the base dictionary merged with the overrides.
+    """
+
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+_config: Optional[Config] = None
+_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """
+    Returns the memoized configuration, parsing params.yaml in the project
+    root directory on the first call.
+
+    Returns:
+        Config
+            The configuration.
+    """
+
+    if _config is None:
+        with _lock:
+            if _config is None:
+                return _reload()
+    return _config
+
+
+def reload_config() -> Config:
+    """
+    Parses params.yaml again and replaces the memoized configuration.
+
+    Returns:
+        Config
+            The new configuration.
+
+    Raises:
+        ValueError: If the new configuration is invalid, the memoized one
+            is kept then.
+    """
+
+    with _lock:
+        return _reload()
+
+
+def _reload() -> Config:
+    """
+    Parses params.yaml and memoizes the configuration, the lock must be
+    held.
+    """
+
+    global _config
+    _config = Config.load(os.path.join(get_project_dir(), PARAMS_FILE))
+    return _config
@@ -7,9 +7,10 @@ to binary files, get the absolute path to a file in a project directory,
 and set up logging handlers and formats.
 
 Functions:
-- load_params(): Loads parameters from the params.yaml file in the
-  project root directory.
-- setup_logging(): Sets up logging handlers and formats for a logger.
+- load_params(): Returns a copy of the parameters of the params.yaml file in
+  the project root directory, which is parsed once per process.
+- setup_logging(): Sets up non-blocking logging to a JSON lines file and
+  the console for a logger.
 - get_project_dir(): Returns the absolute path to the project root directory.
 - get_abs_path(rel_path: str, filename: str) -> str: Returns the absolute
   path to a file with a given relative path and filename.
@@ -48,29 +49,47 @@ Usage:
 """
 
 
-import yaml
+import atexit
+import copy
 import logging
+import logging.handlers
 from pathlib import Path
 import os
 import pickle
-from typing import Any
+import queue
+import sys
+from typing import Any, Optional
+
+from src.utils.logs import (
+    ContextFilter,
+    DebugSampler,
+    JsonFormatter,
+    TracebackQueueHandler,
+)
 
 
 def load_params() -> dict:
     """
     Load parameters from params.yaml in the project root directory.
 
+    The file is parsed once per process by `src.utils.config.get_config()`,
+    and a copy of the parameters is returned, so callers can modify it.
+
     Returns:
         A dictionary containing the loaded parameters.
     """
-    params_path = os.path.join(get_project_dir(), "params.yaml")
-    with open(params_path, "r") as f:
-        params = yaml.safe_load(f)
-    return params
+    # imported here, as the config module depends on this one
+    from src.utils.config import get_config
+
+    return copy.deepcopy(get_config().params)
 
 
 def setup_logging(
-    logname: str = "", logfile: str = "logs/app.log", loglevel: str = "DEBUG"
+    logname: str = "",
+    logfile: str = "logs/app.log",
+    loglevel: str = "DEBUG",
+    stage: Optional[str] = None,
+    debug_sample_rate: Optional[float] = None,
 ) -> logging.Logger:
     """
     Set up a logger with specified name, file path and log level, and return
@@ -83,38 +102,75 @@ def setup_logging(
             The path to the log file. Default is 'logs/app.log'.
         loglevel: str, optional
             The log level to use. Default is 'DEBUG'.
+        stage: str, optional
+            The stage name added to the log records. Defaults to the name of
+            the running script.
+        debug_sample_rate: float, optional
+            The share of debug records to log. Defaults to the value of the
+            `logging` section of params.yaml.
 
     Returns:
         logging.Logger
             The configured logger object.
 
-    The function sets up a logger with a specified name and log level, and adds
-    two handlers: a file handler and a stream handler. The file handler writes
-    log messages to the specified file, and the stream handler writes log
-    messages to the console. The log messages include the current time, log
-    level, filename, function name, line number, and log message.
+    The function sets up a logger with a specified name and log level, which
+    puts the records on a queue. A background listener thread writes them
+    with two handlers: a file handler, which writes JSON lines with the
+    time, log level, stage, source location, message and the log context
+    fields, and a stream handler, which writes log messages to the console.
+    The console messages include the current time, log level, filename,
+    function name, line number, and log message.
+
+    Calling the function again for the same logger replaces its handlers,
+    so records are not duplicated.
     """
 
     loglevel = getattr(logging, loglevel)
+    if stage is None:
+        stage = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    if debug_sample_rate is None:
+        debug_sample_rate = load_params()["logging"]["debug_sample_rate"]
 
     logger = logging.getLogger(logname)
     logger.setLevel(loglevel)
+    for handler in list(logger.handlers):
+        listener = getattr(handler, "listener", None)
+        if listener is not None:
+            logger.removeHandler(handler)
+            listener.stop()
+            atexit.unregister(listener.stop)
+            for _ in listener.handlers:
+                _.close()
+
     fmt = (
         "%(asctime)s: %(levelname)s: %(filename)s: "
         + "%(funcName)s(): %(lineno)d: %(message)s"
     )
     formatter = logging.Formatter(fmt)
 
+    os.makedirs(os.path.dirname(logfile) or ".", exist_ok=True)
     fh = logging.FileHandler(logfile, encoding="utf-8")
     fh.setLevel(loglevel)
-    fh.setFormatter(formatter)
+    fh.setFormatter(JsonFormatter())
 
     ch = logging.StreamHandler()
     ch.setLevel(loglevel)
     ch.setFormatter(formatter)
 
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    # records are formatted and written by the listener thread
+    log_queue = queue.SimpleQueue()
+    qh = TracebackQueueHandler(log_queue)
+    qh.addFilter(ContextFilter(stage))
+    if debug_sample_rate < 1:
+        qh.addFilter(DebugSampler(debug_sample_rate))
+    qh.listener = logging.handlers.QueueListener(
+        log_queue, fh, ch, respect_handler_level=True
+    )
+    qh.listener.start()
+    # flush the queue on exit
+    atexit.register(qh.listener.stop)
+
+    logger.addHandler(qh)
 
     return logger
 
@@ -0,0 +1,153 @@
+"""
+A module with the building blocks of the structured logging set up by
+`src.utils.functions.setup_logging()`.
+
+Log records are put on a queue by the logging thread and written to the
+log file and the console by a background listener thread, so logging
+doesn't block on file or console I/O. The log file is written as JSON
+lines, one object per record with the time, level, logger, stage, source
+location and message, and the fields of the log context, like the request
+id of the API. Tracebacks are rendered before the records are queued and
+are written to the `exception` field, apart from the message.
+
+Classes:
+- ContextFilter: Adds the stage and the log context fields to records.
+- DebugSampler: Passes a share of the debug records.
+- JsonFormatter: Formats records as JSON lines.
+- TracebackQueueHandler: Queues records with the message and the traceback
+  rendered apart.
+
+Functions:
+- log_context(**fields) -> ContextManager: Adds fields to the records
+  logged in the context, also in the coroutines and threads it starts.
+- get_log_context() -> dict: Returns the fields of the current log context.
+
+Usage:
+    from src.utils.logs import log_context
+
+    with log_context(request_id="4f1c"):
+        logger.info("Predicted")
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[dict]:
+    """
+    Adds fields to the records logged in the context. Nested contexts add
+    their fields to the fields of the outer ones.
+
+    Yields:
+        dict
+            The fields of the context.
+    """
+
+    context = {**_context.get(), **fields}
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+def get_log_context() -> dict:
+    """
+    Returns the fields of the current log context.
+    """
+
+    return _context.get()
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the stage and the fields of the log context to records. It must
+    run in the logging thread, before the records are queued.
+
+    Params:
+        stage: str
+            The name of the pipeline stage or the service.
+    """
+
+    def __init__(self, stage: str) -> None:
+        super().__init__()
+        self.stage = stage
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.stage = self.stage
+        record.context = get_log_context()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Passes all records above the debug level and a random share of the
+    debug records.
+
+    Params:
+        rate: float
+            The share of the debug records to pass.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines with the time, level, logger, stage,
+    source location and message, and the fields of the log context.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "stage": getattr(record, "stage", None),
+            "file": record.filename,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records with the message and the traceback rendered in the
+    logging thread. Unlike `logging.handlers.QueueHandler`, the traceback
+    is kept in `exc_text` of the record instead of being merged into the
+    message, so the formatters of the listener place it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        # the traceback holds the frames, only its text is queued
+        record.exc_info = None
+        return record
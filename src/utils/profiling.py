@@ -0,0 +1,124 @@
+"""
+A module for opt-in profiling of the pipeline stages and the API with
+cProfile.
+
+Profiles are written in the binary `pstats` format to the profiles path
+set in the `profiling` section of params.yaml, one file per profiled run
+named by the stage and the time it started. When profiling is off, the
+profiled code runs without a profiler, so there is no overhead.
+
+Functions:
+- get_profile_path(params: dict, name: str) -> str: Returns a new profile
+  path for a stage and creates the profiles directory.
+- profiled(path: str) -> ContextManager: Profiles the code of the context
+  and saves the profile on exit.
+- profile_option(name: str) -> Callable: A decorator, which adds
+  the `--profile` option to a click command.
+
+Usage:
+    from src.utils.profiling import profile_option
+
+    @click.command()
+    @profile_option("train_model")
+    def main() -> None:
+        ...
+"""
+
+import cProfile
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import click
+
+from src.utils.functions import get_project_dir, load_params
+
+PROFILE_EXTENSION = ".prof"
+
+
+def get_profile_path(params: dict, name: str) -> str:
+    """
+    Returns a new profile path for a stage and creates the profiles
+    directory.
+
+    Params:
+        params: dict
+            The project parameters.
+        name: str
+            The name of the profiled stage.
+
+    Returns:
+        str
+            The absolute path to the profile file.
+    """
+
+    directory = os.path.join(get_project_dir(), params["profiling"]["path"])
+    os.makedirs(directory, exist_ok=True)
+    # nanoseconds keep profiles of concurrent API requests apart
+    now = time.time_ns()
+    timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now // 10**9))
+    filename = f"{name}-{timestamp}-{now % 10**9:09d}{PROFILE_EXTENSION}"
+    return os.path.join(directory, filename)
+
+
+@contextmanager
+def profiled(path: str) -> Iterator[cProfile.Profile]:
+    """
+    Profiles the code of the context and saves the profile on exit, also
+    when the code raises an exception.
+
+    Params:
+        path: str
+            The path to the profile file.
+
+    Yields:
+        cProfile.Profile
+            The enabled profiler.
+    """
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def profile_option(name: str) -> Callable:
+    """
+    A decorator, which adds the `--profile` flag to a click command. With
+    the flag, the command runs under the profiler and the profile is saved
+    to the profiles path. Without it, the command runs as is.
+
+    Params:
+        name: str
+            The name of the stage used in the profile file name.
+
+    Returns:
+        Callable
+            The decorator of the command function.
+    """
+
+    def decorator(command: Callable) -> Callable:
+        @click.option(
+            "--profile",
+            is_flag=True,
+            help=f"profile {name} and save the profile to the profiles path",
+        )
+        @functools.wraps(command)
+        def wrapper(*args, profile: bool, **kwargs):
+            if not profile:
+                return command(*args, **kwargs)
+
+            path = get_profile_path(load_params(), name)
+            with profiled(path):
+                result = command(*args, **kwargs)
+            click.echo(f"Saved profile to {path}")
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,166 @@
+"""
+A module with the CPU thread budget of the API, the batch scoring and the
+training, set in the `threads` section of params.yaml.
+
+LightGBM's OpenMP pool, the BLAS libraries of numpy and the API workers all
+default to one thread per core, so several processes on one host
+oversubscribe the CPU and worsen the tail latency. The budget splits the
+available cores between the worker processes and the threads of each of
+them:
+- the available cores are the cores of the CPU affinity of the process,
+  limited by the cgroup CPU quota of a container, both for cgroup v2 and
+  v1,
+- the number of workers defaults to one per core,
+- the prediction threads of a worker default to its share of the cores,
+- the training threads default to all the available cores,
+- BLAS and OpenMP pools are limited to `blas_threads`, as numpy isn't on
+  the hot paths, and LightGBM gets its threads with `num_threads`.
+
+`apply_thread_limits()` limits the thread pools of the current process and
+sets the `OMP_NUM_THREADS`-like environment variables inherited by the
+worker processes it starts.
+
+Classes:
+- ThreadBudget: The numbers of workers and threads.
+
+Functions:
+- get_available_cpus() -> int: Returns the number of cores available to
+  the process.
+- get_thread_budget(params: dict, workers: Optional[int] = None)
+  -> ThreadBudget: Returns the thread budget of the parameters.
+- apply_thread_limits(budget: ThreadBudget) -> None: Limits the thread
+  pools of the process and its children.
+
+Usage:
+    from src.utils.threads import get_thread_budget, apply_thread_limits
+
+    budget = get_thread_budget(params)
+    apply_thread_limits(budget)
+    model.predict(features, num_threads=budget.predict_threads)
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from threadpoolctl import threadpool_limits
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+# thread pool sizes read by OpenMP and BLAS libraries on load
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    """
+    The numbers of workers and threads.
+
+    Attributes:
+        - `cpus`: the number of available cores.
+        - `workers`: the number of worker processes.
+        - `predict_threads`: the LightGBM prediction threads per worker.
+        - `train_threads`: the LightGBM training threads.
+        - `blas_threads`: the BLAS and OpenMP threads of other libraries.
+    """
+
+    cpus: int
+    workers: int
+    predict_threads: int
+    train_threads: int
+    blas_threads: int
+
+
+def _read_cgroup_quota() -> Optional[float]:
+    """
+    Returns the cgroup CPU quota in cores, or None if it isn't limited.
+    """
+
+    try:
+        with open(CGROUP_V2_CPU_MAX, "r") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(CGROUP_V1_QUOTA, "r") as f:
+            quota = int(f.read())
+        with open(CGROUP_V1_PERIOD, "r") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def get_available_cpus() -> int:
+    """
+    Returns the number of cores available to the process: the cores of its
+    CPU affinity, limited by the cgroup CPU quota rounded up.
+
+    Returns:
+        int
+            The number of cores, at least 1.
+    """
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _read_cgroup_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def get_thread_budget(
+    params: dict, workers: Optional[int] = None
+) -> ThreadBudget:
+    """
+    Returns the thread budget of the `threads` section of the parameters,
+    deriving the unset values from the available cores.
+
+    Params:
+        params: dict
+            The project parameters.
+        workers: int, optional
+            The number of worker processes, which overrides the parameters.
+
+    Returns:
+        ThreadBudget
+            The budget.
+    """
+
+    threads = params["threads"]
+    cpus = threads["cpus"] or get_available_cpus()
+    workers = workers or threads["workers"] or cpus
+    return ThreadBudget(
+        cpus=cpus,
+        workers=workers,
+        predict_threads=threads["predict_threads"] or max(1, cpus // workers),
+        train_threads=threads["train_threads"] or cpus,
+        blas_threads=threads["blas_threads"],
+    )
+
+
+def apply_thread_limits(budget: ThreadBudget) -> None:
+    """
+    Limits the BLAS and OpenMP thread pools of the loaded libraries, and
+    sets the environment variables, which limit them in the child
+    processes.
+
+    Params:
+        budget: ThreadBudget
+            The budget.
+    """
+
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(budget.blas_threads)
+    threadpool_limits(budget.blas_threads)
@@ -0,0 +1,59 @@
+import os
+import pytest
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    from src.utils.config import get_config
+    if not os.path.exists(get_config().model_path):
+        pytest.skip('The model is not trained')
+    from src.api import main
+    from src.models.jobs import JobStore
+    monkeypatch.setattr(main, 'JOBS_DIR', str(tmp_path))
+    monkeypatch.setattr(main, 'JOB_STORE', JobStore(str(tmp_path / 'jobs.sqlite')))
+    return main
+
+
+def test_jobs(api, tmp_path, monkeypatch):
+    import pandas as pd
+    from fastapi.testclient import TestClient
+    from src.utils.config import get_config
+
+    features = get_config().features
+    listings = pd.read_csv(get_config().params['data']['interim_data_path'] + '/test.csv', nrows=20)[features]
+    body = listings.to_csv(index=False).encode()
+    client = TestClient(api.app)
+
+    response = client.post('/jobs', content=body, headers={'content-type': 'text/csv'})
+    assert response.status_code == 202
+    job = response.json()
+    assert job['status'] == 'queued' and job['rows'] == 20 and job['progress'] == 0
+    assert client.get(f"/jobs/{job['id']}").json() == job
+    assert client.get('/jobs/unknown').status_code == 404
+    assert client.get(f"/jobs/{job['id']}/result").status_code == 409
+
+    data = [features] + listings.head(3).astype(object).where(listings.head(3).notna(), None).values.tolist()
+    response = client.post('/jobs', json={'data': data})
+    assert response.status_code == 202 and response.json()['rows'] == 3
+
+    # the job is scored by a runner of another worker
+    store = api.JOB_STORE
+    job = store.claim('runner')
+    with open(job['output_path'], 'w') as f:
+        f.write('predictions\n' + '100.0\n' * 20)
+    assert store.finish(job['id'], 'runner')
+    response = client.get(f"/jobs/{job['id']}/result")
+    assert response.status_code == 200 and response.text.count('100.0') == 20
+
+    files = sorted(os.listdir(tmp_path))
+    response = client.post('/jobs', content=listings.drop(columns=features[0]).to_csv(index=False).encode(),
+                           headers={'content-type': 'text/csv'})
+    assert response.status_code == 422 and features[0] in response.json()['detail']
+    assert client.post('/jobs', json={'data': [features, [1]]}).status_code == 422
+    monkeypatch.setattr(api, 'MAX_JOB_BODY_BYTES', 100)
+    assert client.post('/jobs', content=body, headers={'content-type': 'text/csv'}).status_code == 413
+    # a streamed body without its length is cut off at the limit
+    response = client.post('/jobs', content=iter([body[:64], body[64:]]), headers={'content-type': 'text/csv'})
+    assert response.status_code == 413
+    assert client.post('/jobs', json={'data': data}).status_code == 413
+    assert sorted(os.listdir(tmp_path)) == files
@@ -0,0 +1,35 @@
+from src.benchmarks.run_benchmarks import make_raw_batch, time_calls, compare_results
+import pandas as pd
+
+
+def test_make_raw_batch():
+    data = pd.DataFrame({'room_type': ['Private room', 'Entire home/apt'], 'price': ['$30.00', '$1,200.00']})
+    batch = make_raw_batch(data, 1000, 230213)
+    assert batch.shape == (1000, 2)
+    assert set(batch.room_type) == set(data.room_type)
+    assert batch.equals(make_raw_batch(data, 1000, 230213))
+
+
+def test_time_calls():
+    calls = []
+    timing = time_calls(lambda: calls.append(1), 5, 10.0)
+    assert timing['repeats'] == 5 and len(calls) == 6
+    assert 0 <= timing['min_ms'] <= timing['median_ms'] <= timing['p99_ms']
+
+
+def test_compare_results():
+    baseline = [
+        {'benchmark': 'booster_predict', 'batch_size': 1, 'min_ms': 1.0},
+        {'benchmark': 'booster_predict', 'batch_size': 100, 'min_ms': 10.0},
+        {'benchmark': 'api_predict', 'batch_size': 1, 'min_ms': 5.0},
+        ]
+    results = [
+        {'benchmark': 'booster_predict', 'batch_size': 1, 'min_ms': 1.1},
+        {'benchmark': 'booster_predict', 'batch_size': 100, 'min_ms': 13.0},
+        {'benchmark': 'comparables_query', 'batch_size': 1, 'min_ms': 2.0},
+        ]
+    comparison = compare_results(results, baseline, 0.2).set_index(['benchmark', 'batch_size']).sort_index()
+    assert len(comparison) == 4
+    assert comparison['regressed'].to_list() == [False, False, True, False]
+    assert comparison['missing'].to_list() == [True, False, False, False]
+    assert comparison['new'].to_list() == [False, False, False, True]
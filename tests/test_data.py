@@ -27,4 +27,54 @@ def test_is_features_valid():
                                         "test_split_ratio", "train_data_file", "test_data_file"])
 def test_params(test_input):
     params = load_params()
-    assert "data" in params and params["data"].get(test_input) is not None
\ No newline at end of file
+    assert "data" in params and params["data"].get(test_input) is not None
+
+def test_optimize_dtypes():
+    from src.data.schema import optimize_dtypes
+    df = pd.DataFrame({
+        'room_type': pd.Series(['Private room', 'Shared room', 'Private room'], dtype='category'),
+        'accommodates': [1, 4, 2],
+        'bedrooms': [1.0, 2.0, 1.0],
+        'beds': [1.0, np.nan, 2.0],
+        'number_of_reviews': [0, 300, 12],
+        })
+    optimized = optimize_dtypes(df)
+    assert optimized.dtypes.to_dict() == {
+        'room_type': 'category', 'accommodates': np.int8, 'bedrooms': np.int8,
+        'beds': np.float32, 'number_of_reviews': np.int16}
+    assert np.allclose(optimized.beds, df.beds, equal_nan=True)
+
+def test_synthetic_listings():
+    from src.data.functions import price_to_int
+    from src.data.synthetic import SyntheticListings
+
+    data = pd.read_csv('data/raw/train.csv')
+    generator = SyntheticListings.fit(data, 'price')
+    chunks = list(generator.iter_chunks(25000, 10000, seed=1))
+    synthetic = pd.concat(chunks, ignore_index=True)
+    assert [len(_) for _ in chunks] == [10000, 10000, 5000]
+    assert synthetic.columns.equals(data.columns) and synthetic.dtypes.equals(data.dtypes)
+    assert pd.concat(generator.iter_chunks(25000, 10000, seed=1), ignore_index=True).equals(synthetic)
+
+    # combinations of the joint columns and categories are the observed ones
+    joint = ['accommodates', 'bedrooms', 'beds']
+    observed = set(data[joint].astype(str).agg('-'.join, axis=1))
+    assert set(synthetic[joint].astype(str).agg('-'.join, axis=1)) <= observed
+    assert set(synthetic.property_type) <= set(data.property_type)
+    assert abs(synthetic.room_type.eq('Private room').mean() - data.room_type.eq('Private room').mean()) < 0.02
+
+    prices = synthetic.price.apply(price_to_int)
+    assert prices.between(price_to_int('$8.00'), data.price.apply(price_to_int).max()).all()
+    assert synthetic.number_of_reviews.between(0, data.number_of_reviews.max()).all()
+
+def test_stratified_sample():
+    from src.data.functions import stratified_sample
+
+    data = pd.DataFrame({
+        'room_type': ['Entire home/apt'] * 90 + ['Private room'] * 9 + ['Shared room'],
+        'price': range(100),
+        })
+    sample = stratified_sample(data, ['room_type'], 20, seed=1)
+    assert sample.room_type.value_counts().to_dict() == {'Entire home/apt': 18, 'Private room': 2, 'Shared room': 1}
+    assert sample.index.is_monotonic_increasing and sample.equals(stratified_sample(data, ['room_type'], 20, seed=1))
+    assert stratified_sample(data, ['room_type'], 200, seed=1).equals(data)
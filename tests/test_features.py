@@ -15,4 +15,93 @@ def test_data_params(test_input):
 
 @pytest.mark.parametrize("test_input", np.arange(10, 1000, 100))
 def test_target_transform_restore(test_input):
-    assert np.isclose(restore_target(transform_target(test_input)), test_input)
\ No newline at end of file
+    assert np.isclose(restore_target(transform_target(test_input)), test_input)
+
+def test_column_encoder_matches_column_transformer(tmp_path):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+    from src.features.encoder import ColumnEncoder
+    import pandas as pd
+
+    df = pd.DataFrame({
+        'room_type': ['Private room', 'Entire home/apt', 'Private room', 'Shared room'],
+        'number_of_reviews': [3, 10, 0, 52],
+        'beds': [1.0, 2.0, 1.0, 4.0]
+        })
+    column_transformer = ColumnTransformer([
+        ("categorical", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan), ['room_type']),
+        ("numerical", StandardScaler(), ['number_of_reviews']),
+        ("numerical_as_categorical", "passthrough", ['beds'])
+        ]).fit(df)
+    ColumnEncoder.from_column_transformer(column_transformer).save(tmp_path / "encoder.npz")
+    encoder = ColumnEncoder.load(tmp_path / "encoder.npz")
+
+    df.loc[3, 'room_type'] = 'Hotel room'
+    assert np.array_equal(encoder.transform(df), column_transformer.transform(df), equal_nan=True)
+    assert np.isnan(encoder.transform(df)[3, 0])
+
+
+def test_feature_cache_roundtrip(tmp_path):
+    from src.features.cache import save_feature_cache, load_feature_cache
+
+    features = np.random.rand(10, 3)
+    target = np.random.rand(10)
+    save_feature_cache(str(tmp_path / "train-key"), features, target, ['a', 'b', 'c'])
+    cached_features, cached_target, feature_names = load_feature_cache(str(tmp_path / "train-key"))
+    assert isinstance(cached_features, np.memmap) and cached_features.dtype == np.float32
+    assert np.allclose(cached_features, features) and np.allclose(cached_target, target)
+    assert feature_names == ['a', 'b', 'c']
+    assert load_feature_cache(str(tmp_path / "test-key")) is None
+
+def test_drift_monitor(tmp_path):
+    from src.features.drift import DriftMonitor, FeatureProfile
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    train = pd.DataFrame({
+        'room_type': rng.choice(['Private room', 'Entire home/apt'], 1000),
+        'beds': rng.integers(1, 5, 1000).astype(float),
+        })
+    FeatureProfile.fit(train, ['room_type'], n_bins=4).save(tmp_path / 'profile.json')
+    monitor = DriftMonitor(FeatureProfile.load(tmp_path / 'profile.json'), max_unseen=1)
+
+    monitor.update(train.iloc[:500])
+    scores = monitor.scores()
+    assert scores['rows'] == 500
+    assert all(_['psi'] < 0.01 for _ in scores['features'].values())
+
+    monitor.reset()
+    monitor.update(pd.DataFrame({
+        'room_type': ['Hotel room', 'Hotel room', 'Shared room', 'Private room'],
+        'beds': [8.0, 8.0, np.nan, 1.0],
+        }))
+    scores = monitor.scores()['features']
+    assert scores['beds']['psi'] > 0.25
+    assert scores['room_type']['unseen_share'] == 0.75
+    assert scores['room_type']['unseen'] == {'Hotel room': 2}
+
+def test_comparables_index(tmp_path):
+    from src.features.comparables import ComparablesIndex, brute_force_query
+    from src.features.encoder import ColumnEncoder
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    listings = pd.DataFrame({
+        'room_type': rng.choice(['Private room', 'Entire home/apt'], 300),
+        'beds': rng.integers(1, 5, 300).astype(float),
+        'number_of_reviews': rng.random(300) * 100,
+        })
+    prices = np.where(listings.room_type == 'Private room', 40, 120) + 10 * listings.beds.to_numpy()
+    encoder = ColumnEncoder(['room_type'], [np.array(['Entire home/apt', 'Private room'])],
+                            ['number_of_reviews'], np.array([50.0]), np.array([30.0]), ['beds'])
+    ComparablesIndex.fit(encoder, encoder.transform(listings), listings, prices).save(tmp_path / 'index.npz')
+    index = ComparablesIndex.load(tmp_path / 'index.npz')
+    assert index.listings.room_type.to_list() == listings.room_type.to_list()
+
+    queries = listings.iloc[:20].copy()
+    queries.loc[0, 'room_type'] = 'Hotel room'
+    distances, indices = index.query(encoder.transform(queries), k=5)
+    assert distances.shape == indices.shape == (20, 5)
+    assert (indices[1:, 0] == np.arange(1, 20)).all() and np.allclose(distances[1:, 0], 0, atol=1e-5)
+    expected, _ = brute_force_query(index.points, index.transform(encoder.transform(queries)), 5, chunk_size=7)
+    assert np.allclose(distances, expected, atol=1e-4)
@@ -0,0 +1,454 @@
+from src.models.tune_model import sample_params, select_survivors
+import os
+import pytest
+
+
+def test_sample_params():
+    search_space = {
+        'learning_rate': {'distribution': 'log_uniform', 'low': 0.01, 'high': 0.1},
+        'num_leaves': {'distribution': 'int_uniform', 'low': 8, 'high': 16},
+        }
+    trials = sample_params(search_space, 20, 230213)
+    assert trials == sample_params(search_space, 20, 230213)
+    assert all(0.01 <= _['learning_rate'] <= 0.1 for _ in trials)
+    assert all(isinstance(_['num_leaves'], int) and 8 <= _['num_leaves'] <= 16 for _ in trials)
+    with pytest.raises(ValueError):
+        sample_params({'lambda_l2': {'distribution': 'normal', 'low': 0, 'high': 1}}, 1, 0)
+
+
+@pytest.mark.parametrize("scores,expected", [([0.3, 0.1, 0.2, 0.5, 0.4, 0.6], [1, 2]), ([0.2, 0.1], [1])])
+def test_select_survivors(scores, expected):
+    assert select_survivors(scores, 3) == expected
+
+
+@pytest.mark.parametrize("candidate,expected", [
+    ({'r2': 0.58, 'mae': 33.0}, False),
+    ({'r2': 0.56, 'mae': 33.0}, True),
+    ({'r2': 0.58, 'mae': 34.0}, True),
+    ])
+def test_is_regressed(candidate, expected):
+    from src.models.functions import is_regressed
+    assert is_regressed(candidate, {'r2': 0.57, 'mae': 33.5}, 0.0) == expected
+
+
+def test_time_budget():
+    import lightgbm as lgb
+    import numpy as np
+    from src.models.functions import time_budget
+
+    rng = np.random.default_rng(0)
+    dataset = lgb.Dataset(rng.random((100, 2)), label=rng.random(100))
+    booster = lgb.train({'verbose': -1}, dataset, num_boost_round=1000, callbacks=[time_budget(0)])
+    assert booster.current_iteration() == 1
+
+
+def test_merge_boosters(tmp_path):
+    import lightgbm as lgb
+    import numpy as np
+    from src.models.ensemble import save_ensemble, load_ensemble, merge_boosters
+
+    rng = np.random.default_rng(0)
+    features = rng.random((300, 3))
+    dataset = lgb.Dataset(features, label=features.sum(axis=1) + rng.random(300))
+    cvbooster = lgb.cv({'verbose': -1}, dataset, num_boost_round=20, nfold=3,
+                       stratified=False, return_cvbooster=True)['cvbooster']
+    save_ensemble(cvbooster.boosters, str(tmp_path / "folds.json"), {'best_iteration': 20})
+    boosters, metadata = load_ensemble(str(tmp_path / "folds.json"))
+    assert metadata == {'best_iteration': 20, 'n_folds': 3}
+
+    merged = merge_boosters(boosters)
+    assert merged.num_trees() == 60
+    assert np.allclose(merged.predict(features), np.mean(cvbooster.predict(features), axis=0))
+
+
+def test_select_compact_model():
+    from src.models.compact_model import select_compact_model
+    records = [
+        {'model': 'full', 'num_trees': 1000, 'r2': 0.57, 'per_row_us': 300.0},
+        {'model': 'truncated_0.1', 'num_trees': 100, 'r2': 0.52, 'per_row_us': 40.0},
+        {'model': 'truncated_0.5', 'num_trees': 500, 'r2': 0.568, 'per_row_us': 120.0},
+        {'model': 'distilled_100', 'num_trees': 100, 'r2': 0.566, 'per_row_us': 50.0},
+        ]
+    assert select_compact_model(records, 0.005)['model'] == 'distilled_100'
+    assert select_compact_model(records, 0.001)['model'] == 'full'
+
+
+def test_get_shards():
+    from src.models.distributed import get_shards
+    shards = get_shards(10, 3)
+    assert [(_.start, _.stop) for _ in shards] == [(0, 3), (3, 6), (6, 10)]
+    with pytest.raises(ValueError):
+        get_shards(2, 3)
+
+
+def test_train_distributed():
+    from src.models.distributed import train_distributed
+    from src.models.benchmark_distributed import make_dataset
+    features, target = make_dataset(2000, 3, 230213)
+    params = {'objective': 'regression', 'verbose': -1, 'seed': 230213}
+    booster = train_distributed(features, target, params, 10, 2, ['a', 'b', 'c'], [], 1)
+    assert booster.num_trees() == 10
+    assert booster.predict(features).shape == target.shape
+
+    # the workers evaluate the same validation rows and stop together
+    booster = train_distributed(features[:1500], target[:1500], {**params, 'learning_rate': 0.5}, 1000, 2,
+                                ['a', 'b', 'c'], [], 1, valid_features=features[1500:], valid_target=target[1500:],
+                                early_stopping_rounds=5)
+    assert 5 < booster.num_trees() < 1000
+
+
+
+def test_train_distributed_retries_bind(monkeypatch):
+    import socket
+    from src.models import distributed
+    from src.models.benchmark_distributed import make_dataset
+    features, target = make_dataset(500, 3, 230213)
+    params = {'objective': 'regression', 'verbose': -1, 'seed': 230213}
+    get_free_ports = distributed._get_free_ports
+    with socket.socket(socket.AF_INET) as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        # the first port is taken by another socket before the workers start
+        attempts = iter([[taken.getsockname()[1], get_free_ports(1)[0]]])
+        monkeypatch.setattr(distributed, '_get_free_ports', lambda n: next(attempts, None) or get_free_ports(n))
+        booster = distributed.train_distributed(features, target, params, 5, 2, ['a', 'b', 'c'], [], 1)
+    assert booster.num_trees() == 5
+
+def test_telemetry_logger(tmp_path):
+    import lightgbm as lgb
+    import numpy as np
+    from src.models.telemetry import TelemetryLogger, read_telemetry
+    rng = np.random.default_rng(230213)
+    features = rng.random((200, 3))
+    dataset = lgb.Dataset(features, label=features.sum(axis=1))
+    path = str(tmp_path / 'telemetry.bin')
+    with TelemetryLogger(path, batch_size=3) as telemetry:
+        lgb.train({'objective': 'regression', 'verbose': -1}, dataset, num_boost_round=10,
+                  valid_sets=[dataset], valid_names=['train'], callbacks=[telemetry])
+    records, header = read_telemetry(path)
+    assert records['iteration'].to_list() == list(range(1, 11))
+    assert header['columns'][-1] == 'train l2' and not header['higher_better']['train l2']
+    assert records['train l2'].is_monotonic_decreasing
+    assert (records['cumulative_seconds'].diff().dropna() > 0).all()
+
+
+def test_summarize_metric():
+    import pandas as pd
+    from src.models.report_telemetry import summarize_metric
+    summary = summarize_metric(pd.Series([1.0, 0.5, 0.403, 0.4, 0.41], index=[1, 2, 3, 4, 5]), False)
+    assert summary['best_iteration'] == 4 and summary['last'] == 0.41
+    assert summary['within_0.01'] == 3 and summary['within_0.001'] == 4
+
+
+def test_bootstrap_metrics():
+    import numpy as np
+    from sklearn.metrics import r2_score, mean_absolute_percentage_error
+    from src.models.bootstrap import iter_resample_indices, resample_metrics, bootstrap_metrics, compare_models
+    rng = np.random.default_rng(230213)
+    target = rng.uniform(1, 3, 500)
+    preds = target + rng.normal(0, 0.1, 500)
+    full = resample_metrics(target, preds, np.arange(500)[None, :])
+    assert np.isclose(full['r2'][0], r2_score(target, preds))
+    assert np.isclose(full['mape'][0], mean_absolute_percentage_error(10**target, 10**preds))
+
+    chunks = list(iter_resample_indices(500, 50, 230213, chunk_size=7))
+    assert [len(_) for _ in chunks] == [7] * 7 + [1] and chunks[0].dtype == np.int32
+    samples = bootstrap_metrics(target, preds, 50, 230213, chunk_size=7)
+    assert samples.shape == (50, 4)
+    assert np.allclose(samples, resample_metrics(target, preds, np.vstack(chunks)))
+    comparison = compare_models(target, preds, target, 50, 230213, 0.9, chunk_size=7)
+    assert (comparison['better_share'] == 1.0).all()
+    assert (comparison.loc['mae', ['low', 'high']] < 0).all()
+
+
+def test_grouped_metrics():
+    import numpy as np
+    from sklearn.metrics import r2_score, mean_absolute_error
+    from src.models.evaluate_slices import get_group_ids, grouped_metrics
+    codes = np.array([[0, 1], [1, 0], [0, 1], [np.nan, 0], [1, 0], [0, 1]])
+    group_ids, groups = get_group_ids(codes)
+    assert groups.tolist() == [[-1, 0], [0, 1], [1, 0]]
+    assert group_ids.tolist() == [1, 2, 1, 0, 2, 1]
+    target = np.array([1.0, 2.0, 1.5, 2.5, 2.2, 1.2])
+    preds = np.array([1.1, 2.1, 1.4, 2.0, 2.0, 1.3])
+    report = grouped_metrics(target, preds, group_ids)
+    assert report['count'].tolist() == [1, 3, 2]
+    rows = group_ids == 1
+    assert np.isclose(report.loc[1, 'r2'], r2_score(target[rows], preds[rows]))
+    assert np.isclose(report.loc[1, 'mae'], mean_absolute_error(10**target[rows], 10**preds[rows]))
+    assert np.isnan(report.loc[0, 'r2'])
+
+
+def test_metric_accumulator():
+    import numpy as np
+    from src.models.accumulators import MetricAccumulator
+    from src.models.bootstrap import resample_metrics
+    rng = np.random.default_rng(230213)
+    target = rng.uniform(1, 3, 1000)
+    preds = target + rng.normal(0, 0.1, 1000)
+    accumulator = MetricAccumulator()
+    for start in range(0, 1000, 300):
+        accumulator.update(target[start:start + 300], preds[start:start + 300])
+    expected = resample_metrics(target, preds, np.arange(1000)[None, :]).iloc[0]
+    for metric, value in accumulator.result().items():
+        assert np.isclose(value, expected[metric])
+    with pytest.raises(ValueError):
+        MetricAccumulator().result()
+
+
+def test_evaluate_model_chunked():
+    import lightgbm as lgb
+    import numpy as np
+    from src.models.test_model import evaluate_model, evaluate_model_chunked
+    rng = np.random.default_rng(230213)
+    features = rng.random((1000, 3)).astype(np.float32)
+    target = (1 + features.sum(axis=1) + rng.normal(0, 0.1, 1000)).astype(np.float32)
+    model = lgb.train({'verbose': -1}, lgb.Dataset(features, label=target), num_boost_round=20)
+    # the float32 target of the feature cache gives the same metrics in memory and in chunks
+    chunks = [(features[_:_ + 300], target[_:_ + 300]) for _ in range(0, 1000, 300)]
+    expected = evaluate_model(model, features, target)
+    for metric, value in evaluate_model_chunked(model, chunks).items():
+        assert np.isclose(value, expected[metric], rtol=1e-12, atol=0)
+
+
+def test_artifact_store(tmp_path):
+    import lightgbm as lgb
+    import numpy as np
+    from src.features.encoder import ColumnEncoder
+    from src.models.store import (save_bundle, verify_bundle, promote, get_current, list_bundles, load_bundle,
+                                  get_bundle_path, get_serving_paths)
+
+    rng = np.random.default_rng(0)
+    features = rng.random((100, 2))
+    lgb.train({'verbose': -1}, lgb.Dataset(features, label=features.sum(axis=1)),
+              num_boost_round=5).save_model(str(tmp_path / 'model.txt'))
+    ColumnEncoder([], [], [], np.zeros(0), np.ones(0), ['a', 'b']).save(str(tmp_path / 'encoder.npz'))
+    files = {'model.txt': str(tmp_path / 'model.txt'), 'encoder.npz': str(tmp_path / 'encoder.npz')}
+
+    store_dir = str(tmp_path / 'store')
+    first = save_bundle(store_dir, files, {'metrics': {'r2': 0.5}})
+    assert save_bundle(store_dir, files, {'metrics': {'r2': 0.6}}) == first
+    assert [_['metrics'] for _ in list_bundles(store_dir)] == [{'r2': 0.5}]
+
+    promote(store_dir, first)
+    (tmp_path / 'model.txt').write_text((tmp_path / 'model.txt').read_text().replace('version=v3', 'version=v3\n'))
+    second = save_bundle(store_dir, files, {})
+    promote(store_dir, second)
+    assert second != first and get_current(store_dir)['previous'] == first
+
+    model, encoder, manifest = load_bundle(store_dir, 'model.txt', 'encoder.npz')
+    assert manifest['bundle_id'] == second and model.num_trees() == 5
+    assert encoder.feature_names_out == ['a', 'b']
+
+    # the API and batch scoring serve the files of the current bundle
+    params = {'model': {'path': str(tmp_path), 'model_file': 'model.txt', 'column_transformer_file': 'encoder.npz',
+                        'comparables_file': 'comparables.npz'},
+              'store': {'path': store_dir}}
+    paths = get_serving_paths(params)
+    assert paths['model_file'] == get_bundle_path(store_dir, second, 'model.txt')
+    assert paths['column_transformer_file'] == get_bundle_path(store_dir, second, 'encoder.npz')
+    assert paths['comparables_file'] == str(tmp_path / 'comparables.npz')
+    params['store']['path'] = str(tmp_path / 'empty')
+    assert get_serving_paths(params)['model_file'] == str(tmp_path / 'model.txt')
+
+    with open(tmp_path / 'store' / first / 'model.txt', 'a') as f:
+        f.write('\n')
+    with pytest.raises(ValueError, match='Checksum'):
+        verify_bundle(store_dir, first)
+    with pytest.raises(ValueError, match="doesn't exist"):
+        promote(store_dir, 'missing')
+
+    # a damaged bundle is replaced, when its content is stored again
+    (tmp_path / 'store' / second / 'encoder.npz').write_bytes(b'')
+    assert save_bundle(store_dir, files, {}) == second
+    assert verify_bundle(store_dir, second)['bundle_id'] == second
+    assert not [_ for _ in os.listdir(store_dir) if _.startswith('.tmp')]
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_predict_batch(tmp_path):
+    import lightgbm as lgb
+    import numpy as np
+    import pandas as pd
+    from src.features.encoder import ColumnEncoder
+    from src.models.predict_batch import iter_chunks, init_worker, predict_chunk
+
+    features = ['host_is_superhost', 'accommodates', 'bedrooms', 'beds']
+    rng = np.random.default_rng(0)
+    train = rng.integers(0, 5, (200, 4)).astype(float)
+    lgb.train({'verbose': -1, 'min_data_in_leaf': 5}, lgb.Dataset(train, label=np.log10(50 + 20 * train[:, 1])),
+              num_boost_round=10).save_model(str(tmp_path / 'model.txt'))
+    ColumnEncoder([], [], [], np.zeros(0), np.ones(0), features).save(str(tmp_path / 'encoder.npz'))
+
+    pd.DataFrame({
+        'id': range(5),
+        'host_is_superhost': ['t', 'f', 't', 'f', 't'],
+        'accommodates': [2, 4, 20, 1, 3],
+        'bedrooms': [1, 2, 1, 1, 1],
+        'beds': [1, 2, 1, 1, 2],
+        }).to_csv(tmp_path / 'listings.csv', index=False)
+    chunks = list(iter_chunks(str(tmp_path / 'listings.csv'), features, 2))
+    assert [len(_) for _ in chunks] == [2, 2, 1] and chunks[0].columns.to_list() == features
+
+    init_worker(str(tmp_path / 'model.txt'), str(tmp_path / 'encoder.npz'), features, 1)
+    predictions = np.concatenate([predict_chunk(_) for _ in chunks])
+    assert predictions[2] == -1
+    assert (predictions[[0, 1, 3, 4]] > 0).all() and predictions[1] > predictions[3]
+
+
+def test_predict_grid(tmp_path):
+    import itertools
+    import lightgbm as lgb
+    import numpy as np
+    import pandas as pd
+    from src.data.functions import clean_features
+    from src.features.encoder import ColumnEncoder
+    from src.models.functions import predict_grid, predict_prices
+
+    features = ['host_is_superhost', 'room_type', 'accommodates', 'bedrooms', 'beds']
+    rng = np.random.default_rng(0)
+    train = rng.integers(0, 5, (200, 5)).astype(float)
+    model = lgb.train({'verbose': -1, 'min_data_in_leaf': 5}, lgb.Dataset(train, label=np.log10(50 + 20 * train[:, 2] + 5 * train[:, 1])),
+                      num_boost_round=10)
+    encoder = ColumnEncoder(['room_type'], [np.array(['Entire home/apt', 'Private room'])], [], np.zeros(0), np.ones(0),
+                            ['host_is_superhost', 'accommodates', 'bedrooms', 'beds'])
+
+    base = {'host_is_superhost': 't', 'room_type': 'Private room', 'accommodates': 2, 'bedrooms': 1, 'beds': 1}
+    variations = {'accommodates': [1, 3, 20], 'room_type': ['Entire home/apt', 'Private room'], 'host_is_superhost': ['t', 'f']}
+    predictions = predict_grid(model, encoder, base, variations, features)
+
+    grid = pd.DataFrame([{**base, **dict(zip(variations, _))} for _ in itertools.product(*variations.values())], columns=features)
+    expected = predict_prices(model, encoder, clean_features(grid), features)
+    assert predictions.shape == (12,) and np.allclose(predictions, expected)
+    assert (predictions[8:] == -1).all() and (predictions[:8] > 0).all()
+
+
+def test_job_runner(tmp_path):
+    import lightgbm as lgb
+    import numpy as np
+    import pandas as pd
+    from src.features.encoder import ColumnEncoder
+    from src.models.jobs import DONE, FAILED, QUEUED, JobRunner, JobStore
+    from src.models.predict_batch import init_worker, predict_chunk
+
+    features = ['host_is_superhost', 'accommodates', 'bedrooms', 'beds']
+    rng = np.random.default_rng(0)
+    train = rng.integers(0, 5, (200, 4)).astype(float)
+    lgb.train({'verbose': -1, 'min_data_in_leaf': 5}, lgb.Dataset(train, label=np.log10(50 + 20 * train[:, 1])),
+              num_boost_round=10).save_model(str(tmp_path / 'model.txt'))
+    ColumnEncoder([], [], [], np.zeros(0), np.ones(0), features).save(str(tmp_path / 'encoder.npz'))
+    listings = pd.DataFrame({
+        'host_is_superhost': ['t', 'f', 't', 'f', 't'],
+        'accommodates': [2, 4, 20, 1, 3],
+        'bedrooms': [1, 2, 1, 1, 1],
+        'beds': [1, 2, 1, 1, 2],
+        })
+    listings.to_csv(tmp_path / 'listings.csv', index=False)
+    init_worker(str(tmp_path / 'model.txt'), str(tmp_path / 'encoder.npz'), features, 1)
+    expected = predict_chunk(listings)
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    runner = JobRunner(store, str(tmp_path / 'model.txt'), str(tmp_path / 'encoder.npz'), features, 2, workers=0)
+    job = store.create('a', str(tmp_path / 'listings.csv'), str(tmp_path / 'a.csv'), 5)
+    assert job['status'] == QUEUED and store.get('b') is None
+    assert runner.run_pending() and not runner.run_pending()
+    job = store.get('a')
+    assert job['status'] == DONE and job['rows_done'] == 5
+    assert np.allclose(pd.read_csv(tmp_path / 'a.csv')['predictions'], expected)
+
+    # a job interrupted after the first chunk, with a partly written second one
+    store.create('b', str(tmp_path / 'listings.csv'), str(tmp_path / 'b.csv'), 5)
+    with open(tmp_path / 'a.csv', 'r') as f:
+        lines = f.readlines()
+    with open(tmp_path / 'b.csv', 'w') as f:
+        f.writelines(lines[:3] + [lines[3][:2]])
+    assert store.claim('crashed')['owner'] == 'crashed'
+    assert store.update_progress('b', 'crashed', 2, len(''.join(lines[:3])))
+    assert not runner.run_pending() and store.requeue_stale(0) == 1
+    assert runner.run_pending()
+    assert store.get('b')['status'] == DONE and store.get('b')['owner'] is None
+    assert (tmp_path / 'b.csv').read_text() == ''.join(lines)
+
+    # a slow runner, which lease is taken over, neither writes nor finishes the job
+    store.create('c', str(tmp_path / 'listings.csv'), str(tmp_path / 'c.csv'), 5)
+    job = store.claim(runner.owner)
+    assert store.requeue_stale(0) == 1 and store.claim('other')['id'] == 'c'
+    assert not runner._score(job) and not (tmp_path / 'c.csv').exists()
+    assert not store.finish('c', runner.owner) and not store.release('c', runner.owner)
+    assert not store.update_progress('c', runner.owner, 5, 0) and store.renew('c', 'other')
+    assert store.finish('c', 'other', error='failed') and store.get('c')['status'] == FAILED
+
+
+def test_job_runner_retention(tmp_path):
+    from src.models.jobs import DONE, QUEUED, JobRunner, JobStore
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    runner = JobRunner(store, 'model.txt', 'encoder.npz', [], 2, workers=0, retain_for=0)
+    for job_id in 'abc':
+        (tmp_path / f'{job_id}.csv').write_text('x\n1\n')
+        store.create(job_id, str(tmp_path / f'{job_id}.csv'), str(tmp_path / f'{job_id}.out.csv'), 1)
+    assert store.claim('runner')['id'] == 'a' and store.finish('a', 'runner')
+    assert store.claim('runner')['id'] == 'b' and store.finish('b', 'runner', error='failed')
+    assert runner.delete_expired() == 2 and runner.delete_expired() == 0
+    assert store.get('a') is None and store.get('b') is None and store.get('c')['status'] == QUEUED
+    assert sorted(_.name for _ in tmp_path.glob('*.csv')) == ['c.csv']
+    store.claim('runner')
+    store.finish('c', 'runner')
+    runner.retain_for = 3600
+    assert runner.delete_expired() == 0 and store.get('c')['status'] == DONE
+
+
+def test_job_runner_pool_crash(tmp_path):
+    from concurrent.futures.process import BrokenProcessPool
+    from src.models.jobs import FAILED, MAX_POOL_RESTARTS, QUEUED, JobRunner, JobStore
+
+    class Pool:
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    def crash(job):
+        raise BrokenProcessPool('A worker died')
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    runner = JobRunner(store, 'model.txt', 'encoder.npz', [], 2)
+    starts = []
+    runner._start_pool = lambda: starts.append(1)
+    runner._executor = Pool()
+    runner._score = crash
+    store.create('a', str(tmp_path / 'a.csv'), str(tmp_path / 'a.out.csv'), 1)
+    for _ in range(MAX_POOL_RESTARTS):
+        assert runner.run_pending() and store.get('a')['status'] == QUEUED
+    assert runner.run_pending() and store.get('a')['status'] == FAILED
+    assert len(starts) == MAX_POOL_RESTARTS + 1 and not runner._pool_restarts
+
+
+def test_job_runner_renews_lease(tmp_path):
+    import threading
+    import time
+    import numpy as np
+    from concurrent.futures import Future
+    from src.models.jobs import JobRunner, JobStore
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    runner = JobRunner(store, 'model.txt', 'encoder.npz', [], 2, stale_after=0.03)
+    store.create('a', str(tmp_path / 'a.csv'), str(tmp_path / 'a.out.csv'), 1)
+    job = runner.store.claim(runner.owner)
+    future = Future()
+    threading.Timer(0.1, future.set_result, [np.ones(1)]).start()
+    start = time.time()
+    assert runner._wait(job, future) is not None and store.get('a')['updated_at'] > start
+    # a chunk of a job taken over isn't waited for
+    assert store.requeue_stale(0) == 1 and store.claim('other')
+    assert runner._wait(job, Future()) is None
+
+
+def test_split_validation():
+    import numpy as np
+    from src.models.functions import split_validation
+    features, target = np.arange(20).reshape(10, 2), np.arange(10)
+    train_features, train_target, valid_features, valid_target = split_validation(features, target, 0.3, 230213)
+    assert train_features.shape == (7, 2) and valid_features.shape == (3, 2)
+    assert sorted(np.concatenate([train_target, valid_target])) == list(range(10))
+    assert (np.diff(valid_target) > 0).all() and (train_features[:, 0] == 2 * train_target).all()
+    with pytest.raises(ValueError):
+        split_validation(features, target, 0.01, 230213)
@@ -0,0 +1,150 @@
+from src.utils.profiling import get_profile_path, profiled, profile_option
+from src.benchmarks.report_profiles import summarize_profiles
+from click.testing import CliRunner
+import click
+import os
+
+
+def test_profiled(tmp_path):
+    params = {'profiling': {'path': str(tmp_path / 'profiles')}}
+    paths = [get_profile_path(params, 'stage') for _ in range(2)]
+    assert paths[0] != paths[1] and os.path.basename(paths[0]).startswith('stage-')
+    for path in paths:
+        with profiled(path):
+            sorted(range(1000), key=lambda _: -_)
+    summary = summarize_profiles(paths)
+    assert (summary.function == "<built-in method builtins.sorted>").any()
+    assert summary.loc[summary.function == "<built-in method builtins.sorted>", 'calls'].item() == 2
+
+
+def test_profile_option(monkeypatch, tmp_path):
+    monkeypatch.setattr('src.utils.profiling.load_params', lambda: {'profiling': {'path': str(tmp_path)}})
+
+    @click.command()
+    @click.option('-v', '--value', type=int)
+    @profile_option('stage')
+    def command(value):
+        click.echo(f'value {value}')
+
+    result = CliRunner().invoke(command, ['-v', '1'])
+    assert result.exit_code == 0 and result.output == 'value 1\n' and not os.listdir(tmp_path)
+    result = CliRunner().invoke(command, ['-v', '2', '--profile'])
+    assert result.exit_code == 0 and 'value 2' in result.output and len(os.listdir(tmp_path)) == 1
+
+
+def test_config_parsed_once(monkeypatch):
+    from src.utils import config
+    from src.utils.functions import load_params
+    from src.data.functions import clean_features
+    import pandas as pd
+    import yaml
+
+    calls = []
+    safe_load = yaml.safe_load
+    monkeypatch.setattr(config.yaml, 'safe_load', lambda f: calls.append(f) or safe_load(f))
+    monkeypatch.setattr(config, '_config', None)
+
+    params = load_params()
+    params['data']['features'].clear()
+    assert load_params()['data']['features'] == config.get_config().features
+    clean_features(pd.DataFrame({
+        'host_is_superhost': ['t', 'f', 't'],
+        'accommodates': [2, 4, 20],
+        'beds': [1, 2, 3],
+        'bedrooms': [1, 1, 2],
+        }))
+    assert len(calls) == 1
+    assert config.get_config().feature_limits == {'accommodates': 11, 'beds': 11, 'bedrooms': 6}
+
+    first = config.get_config()
+    assert config.reload_config() is not first and len(calls) == 2
+    assert config.get_config() is not first
+
+
+def test_config_validation():
+    from src.utils.config import Config
+    from src.utils.functions import load_params
+    import pytest
+
+    params = load_params()
+    assert Config.from_params(params).features == params['data']['features']
+    for section, key, value, message in [
+            ('data', 'features', [], 'no features'),
+            ('model', 'categorical_features', ['room_type', 'garden'], 'categorical features garden'),
+            ('data_cleaning', 'feature_limits', {'rooms': 3}, 'limited features rooms'),
+            ('data_cleaning', 'feature_limits', {'beds': '11'}, 'limits of beds'),
+            ('data_cleaning', 'target_limit', None, 'target limit'),
+            ]:
+        invalid = load_params()
+        invalid[section][key] = value
+        with pytest.raises(ValueError, match=message):
+            Config.from_params(invalid)
+
+
+def test_setup_logging(tmp_path):
+    from src.utils.functions import setup_logging
+    from src.utils.logs import log_context
+    import atexit
+    import json
+
+    logfile = str(tmp_path / 'logs' / 'app.log')
+    setup_logging('test_setup_logging', logfile, 'DEBUG', stage='stage', debug_sample_rate=1.0)
+    logger = setup_logging('test_setup_logging', logfile, 'DEBUG', stage='stage', debug_sample_rate=0.0)
+    assert len(logger.handlers) == 1
+
+    logger.debug('dropped')
+    with log_context(request_id='abc'):
+        logger.info('kept')
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception('failed %s', 'once')
+    listener = logger.handlers[0].listener
+    listener.stop()
+    atexit.unregister(listener.stop)
+
+    with open(logfile) as f:
+        records = [json.loads(_) for _ in f]
+    assert [_['message'] for _ in records] == ['kept', 'failed once']
+    assert records[0]['stage'] == 'stage' and records[0]['request_id'] == 'abc'
+    assert 'exception' not in records[0]
+    assert records[1]['exception'].startswith('Traceback') and 'ZeroDivisionError' in records[1]['exception']
+
+
+def test_params_profile(monkeypatch):
+    from src.utils.config import Config, PARAMS_FILE, apply_profile
+    from src.utils.functions import get_project_dir
+    import os
+    import pytest
+
+    base = {'data': {'raw_data_path': 'data/raw', 'target': 'price'}, 'random_seed': 1,
+            'profiles': {'quick': {'data': {'raw_data_path': 'quick/raw'}, 'random_seed': 2}}}
+    merged = apply_profile(base, 'quick')
+    assert merged['data'] == {'raw_data_path': 'quick/raw', 'target': 'price'} and merged['random_seed'] == 2
+    assert base['data']['raw_data_path'] == 'data/raw'
+    with pytest.raises(ValueError):
+        apply_profile(base, 'missing')
+
+    path = os.path.join(get_project_dir(), PARAMS_FILE)
+    monkeypatch.setenv('PARAMS_PROFILE', 'smoke')
+    config = Config.load(path)
+    assert config.profile == 'smoke' and config.model_path.startswith(os.path.join(get_project_dir(), 'smoke'))
+    assert config.params['training']['nfold'] < Config.load(path, profile='').params['training']['nfold']
+
+
+def test_thread_budget(tmp_path, monkeypatch):
+    from src.utils import threads
+
+    monkeypatch.setattr(threads.os, 'sched_getaffinity', lambda pid: set(range(8)))
+    monkeypatch.setattr(threads, 'CGROUP_V1_QUOTA', str(tmp_path / 'missing'))
+    monkeypatch.setattr(threads, 'CGROUP_V2_CPU_MAX', str(tmp_path / 'cpu.max'))
+    (tmp_path / 'cpu.max').write_text('max 100000\n')
+    assert threads.get_available_cpus() == 8
+    (tmp_path / 'cpu.max').write_text('250000 100000\n')
+    assert threads.get_available_cpus() == 3
+
+    params = {'threads': {'cpus': None, 'workers': None, 'predict_threads': None, 'train_threads': None, 'blas_threads': 1}}
+    assert threads.get_thread_budget(params) == threads.ThreadBudget(cpus=3, workers=3, predict_threads=1, train_threads=3, blas_threads=1)
+    assert threads.get_thread_budget(params, workers=1).predict_threads == 3
+    params['threads'].update(cpus=8, workers=3)
+    assert threads.get_thread_budget(params).predict_threads == 2